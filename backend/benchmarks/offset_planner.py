@@ -0,0 +1,108 @@
+"""Offset plan time: per-candidate Python loop vs the vectorized greedy solver.
+
+The solver is timed on synthetic candidates. With --db it also seeds live groups (point
+DATABASE_URL at a scratch database) and times loading the candidates the planner reads.
+Run from the repository root:
+
+    python -m backend.benchmarks.offset_planner --groups 10000
+    DATABASE_URL=postgresql://... python -m backend.benchmarks.offset_planner --groups 10000 --db
+"""
+import argparse
+import math
+import random
+import time
+import uuid
+
+import numpy as np
+
+from backend import models, offset_planner, pnl_engine
+from backend.benchmarks.pnl_batch import CAPITAL, seed
+from backend.database import SessionLocal, engine
+
+STEPS = (0.001, 0.01, 0.1, 1.0)
+
+
+def solve_per_candidate(loss_usd, group_ids, pnl_usd, quantity, unit_profit, steps):
+    # Reference greedy loop over Python objects, one candidate at a time
+    candidates = sorted(
+        (i for i in range(len(group_ids)) if pnl_usd[i] > 0 and unit_profit[i] > 0 and quantity[i] > 0),
+        key=lambda i: (-pnl_usd[i], group_ids[i]),
+    )
+    indices, close = [], []
+    remaining = loss_usd
+    for i in candidates:
+        if remaining <= 0:
+            break
+        step = steps[i]
+        closable = math.floor(quantity[i] / step + offset_planner.STEP_TOLERANCE) * step if step else quantity[i]
+        needed = remaining / unit_profit[i]
+        amount = min(math.ceil(needed / step - offset_planner.STEP_TOLERANCE) * step if step else needed, closable)
+        if amount > 0:
+            indices.append(i)
+            close.append(amount)
+            remaining -= amount * unit_profit[i]
+    return indices, close
+
+
+def synthetic_candidates(groups: int) -> dict:
+    rng = np.random.default_rng(7)
+    quantity = rng.uniform(0.01, 50, groups)
+    unit_profit = rng.normal(0, 2, groups)
+    return {
+        "group_ids": np.arange(1, groups + 1, dtype=np.int64),
+        "pnl_usd": quantity * unit_profit,
+        "quantity": quantity,
+        "unit_profit": unit_profit,
+        "steps": rng.choice(STEPS, groups),
+    }
+
+
+def measure(label: str, solve, candidates: dict, loss_usd: float, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        indices, close = solve(loss_usd, **candidates)
+        timings.append(time.perf_counter() - start)
+    print(f"{label:<8} {len(candidates['group_ids'])} candidates  {len(indices)} closes  "
+          f"best {min(timings) * 1000:8.2f}ms  worst {max(timings) * 1000:8.2f}ms")
+    return indices, close
+
+
+def measure_load(groups: int, pairs: int, repeats: int):
+    models.Base.metadata.create_all(bind=engine)
+    pair_names = [f"OFS{i}-{uuid.uuid4().hex[:4]}/USDT" for i in range(pairs)]
+    owner_id = seed(groups, pair_names)
+    db = SessionLocal()
+    try:
+        pnl_engine.update_pnl(db, set(pair_names), {pair: random.uniform(95, 105) for pair in pair_names}, CAPITAL)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            offset_planner.load_candidates(db, owner_id, CAPITAL)
+            timings.append(time.perf_counter() - start)
+    finally:
+        db.close()
+    print(f"{'load':<8} {groups} live groups  best {min(timings) * 1000:8.2f}ms  worst {max(timings) * 1000:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=10000)
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--db", action="store_true", help="also time the candidate load from the database")
+    args = parser.parse_args()
+
+    candidates = synthetic_candidates(args.groups)
+    # A loss large enough to need a good share of the winners
+    loss_usd = float(candidates["pnl_usd"][candidates["pnl_usd"] > 0].sum() / 2)
+    expected = measure("before", solve_per_candidate, candidates, loss_usd, args.repeats)
+    actual = measure("after", offset_planner.solve, candidates, loss_usd, args.repeats)
+    assert list(actual[0]) == expected[0] and np.allclose(actual[1], expected[1]), "plans differ"
+
+    if args.db:
+        measure_load(args.groups, args.pairs, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Pyramid order placement time: legs sent one by one vs concurrently within the rate budget.
+
+Runs against the in-process mock exchange with a fixed per-call latency, so no exchange
+account or database is needed. Run from the repository root:
+
+    python -m backend.benchmarks.order_placement --pyramids 20 --latency 0.15
+"""
+import argparse
+import asyncio
+import time
+
+from backend import mock_exchange, order_executor
+
+LEGS_PER_PYRAMID = 5
+
+
+def pyramid_legs(pyramid: int) -> list[tuple]:
+    return [
+        (pyramid * LEGS_PER_PYRAMID + i, 100 * (1 - 0.005 * i), 200 / (100 * (1 - 0.005 * i)))
+        for i in range(LEGS_PER_PYRAMID)
+    ]
+
+
+async def place_sequential(client, pyramids: int):
+    # One blocking-style call per leg, as a straightforward port of the placeholder would do
+    for pyramid in range(pyramids):
+        for leg_id, price, amount in pyramid_legs(pyramid):
+            await client.create_order(
+                "BENCH/USDT", "limit", "buy",
+                float(client.amount_to_precision("BENCH/USDT", amount)),
+                float(client.price_to_precision("BENCH/USDT", price)),
+            )
+
+
+async def place_concurrent(client, pyramids: int, rate: float, burst: float):
+    executor = order_executor.OrderExecutor()
+    session = order_executor.ExchangeSession(client, order_executor.TokenBucket(rate, burst))
+    await asyncio.gather(*(
+        executor._place_leg(session, "BENCH/USDT", leg)
+        for pyramid in range(pyramids)
+        for leg in pyramid_legs(pyramid)
+    ))
+
+
+async def measure(label: str, place, latency: float, *args):
+    client = mock_exchange.MockExchange({"latency": latency, "symbols": ["BENCH/USDT"]})
+    start = time.perf_counter()
+    await place(client, *args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} {len(client.orders)} orders  {elapsed * 1000:9.1f}ms  {len(client.orders) / elapsed:8.1f} orders/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pyramids", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per exchange call")
+    parser.add_argument("--rate", type=float, default=20, help="token bucket refill per second")
+    parser.add_argument("--burst", type=float, default=10, help="token bucket capacity")
+    args = parser.parse_args()
+
+    asyncio.run(measure("before", place_sequential, args.latency, args.pyramids))
+    asyncio.run(measure("after", place_concurrent, args.latency, args.pyramids, args.rate, args.burst))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""PnL cycle time: per-group ORM loop vs the vectorized batch engine.
+
+Writes real rows, so point DATABASE_URL at a scratch database. Run from the repository root:
+
+    DATABASE_URL=postgresql://... python -m backend.benchmarks.pnl_batch --groups 10000
+"""
+import argparse
+import random
+import time
+import uuid
+
+from sqlalchemy import insert
+
+from backend import crud, models, pnl_engine, schemas
+from backend.database import SessionLocal, engine
+
+LEGS_PER_GROUP = 5
+FILLED_LEGS_PER_GROUP = 3
+CAPITAL = 1000
+
+
+def update_pnl_per_group(db, pairs: set, prices: dict) -> int:
+    # The previous implementation: lazy-loaded pyramids and legs, one commit per group
+    live_position_groups = db.query(models.PositionGroup).filter(
+        models.PositionGroup.status == "Live",
+        models.PositionGroup.pair.in_(pairs),
+    ).all()
+    for pg in live_position_groups:
+        total_capital_allocated = 0.0
+        weighted_entry_sum = 0.0
+        for pyramid in pg.pyramids:
+            for leg in pyramid.dca_legs:
+                if leg.status == "Filled" and leg.fill_price and leg.capital_weight:
+                    total_capital_allocated += leg.capital_weight
+                    weighted_entry_sum += leg.fill_price * leg.capital_weight
+        pg.avg_entry_price = weighted_entry_sum / total_capital_allocated if total_capital_allocated > 0 else None
+        current_price = prices.get(pg.pair)
+        if current_price and pg.avg_entry_price:
+            pg.unrealized_pnl_percent = ((current_price - pg.avg_entry_price) / pg.avg_entry_price) * 100
+        else:
+            pg.unrealized_pnl_percent = None
+        pg.unrealized_pnl_usd = None
+        db.commit()
+    return len(live_position_groups)
+
+
+def seed(groups: int, pairs: list[str]) -> int:
+    db = SessionLocal()
+    try:
+        user = crud.create_user(db, schemas.UserCreate(username=f"bench-{uuid.uuid4().hex[:8]}", password="bench"))
+        group_ids = db.execute(insert(models.PositionGroup).returning(models.PositionGroup.id), [
+            {"pair": pairs[i % len(pairs)], "timeframe": "15", "status": "Live", "owner_id": user.id}
+            for i in range(groups)
+        ]).scalars().all()
+        pyramid_ids = db.execute(insert(models.Pyramid).returning(models.Pyramid.id), [
+            {"position_group_id": group_id, "entry_price": 100.0} for group_id in group_ids
+        ]).scalars().all()
+        db.execute(insert(models.DCALeg), [
+            {
+                "pyramid_id": pyramid_id,
+                "price_gap": -0.005 * leg,
+                "capital_weight": 0.2,
+                "tp_target": 0.01,
+                "fill_price": 100.0 * (1 - 0.005 * leg) if leg < FILLED_LEGS_PER_GROUP else None,
+                "status": "Filled" if leg < FILLED_LEGS_PER_GROUP else "Pending",
+            }
+            for pyramid_id in pyramid_ids
+            for leg in range(LEGS_PER_GROUP)
+        ])
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def measure(label: str, update, pairs: list[str], cycles: int, **kwargs):
+    timings = []
+    for _ in range(cycles):
+        prices = {pair: random.uniform(90, 110) for pair in pairs}
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            groups = update(db, set(pairs), prices, **kwargs)
+            timings.append(time.perf_counter() - start)
+        finally:
+            db.close()
+    print(f"{label:<8} {groups} live groups  best {min(timings):7.3f}s  worst {max(timings):7.3f}s per cycle")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=10000)
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--cycles", type=int, default=3)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    pairs = [f"PNL{i}-{uuid.uuid4().hex[:4]}/USDT" for i in range(args.pairs)]
+    seed(args.groups, pairs)
+
+    measure("before", update_pnl_per_group, pairs, args.cycles)
+    measure("after", pnl_engine.update_pnl, pairs, args.cycles, capital=CAPITAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Query plan regression check for the hot queries.
+
+Seeds a large dataset, calls the app's own query functions, runs EXPLAIN on every SELECT they
+send and exits non-zero if any of them falls back to a sequential scan of the tables it must
+reach through an index. Each SELECT is explained twice: with its values inlined, as psycopg2
+sends it, and as a prepared statement under its generic plan, which is what asyncpg's statement
+cache can end up running, with every value a bind parameter the planner cannot see. Needs Postgres: point DATABASE_URL at a scratch database. Run from the repository root:
+
+    DATABASE_URL=postgresql://... python -m backend.benchmarks.query_plans --groups 100000
+"""
+import argparse
+import json
+import re
+import sys
+
+from sqlalchemy import event, text
+
+from backend import crud, dashboard_metrics, models, pnl_engine, signal_processor, tp_index
+from backend.database import SessionLocal, engine, run_migrations
+
+SEED_SQL = [
+    """
+    INSERT INTO users (username, hashed_password)
+    SELECT 'plan-user-' || u, 'x' FROM generate_series(1, :users) AS u
+    ON CONFLICT (username) DO NOTHING
+    """,
+    # Most groups are closed, as in a long-running deployment
+    """
+    INSERT INTO position_groups (pair, timeframe, status, owner_id, created_at)
+    SELECT 'PAIR' || (g % 500) || '/USDT', (ARRAY['15', '60', '240'])[1 + g % 3],
+           CASE WHEN g % 20 = 0 THEN 'Live' ELSE 'Closed' END,
+           (SELECT min(id) FROM users WHERE username LIKE 'plan-user-%') + g % :users,
+           now() - g * interval '1 minute'
+    FROM generate_series(1, :groups) AS g
+    """,
+    """
+    INSERT INTO pyramids (position_group_id, entry_price)
+    SELECT id, 100 FROM position_groups
+    """,
+    """
+    INSERT INTO dca_legs (pyramid_id, price_gap, capital_weight, tp_target, fill_price, status)
+    SELECT p.id, -0.005 * l, 0.2, 0.01, 100,
+           CASE WHEN pg.status = 'Live' AND l = 0 THEN 'Filled' WHEN pg.status = 'Live' THEN 'Pending' ELSE 'Hit TP' END
+    FROM pyramids p JOIN position_groups pg ON pg.id = p.position_group_id, generate_series(0, 4) AS l
+    """,
+    """
+    INSERT INTO queued_signals (pair, timeframe, payload, status, owner_id, created_at)
+    SELECT 'PAIR' || (q % 500) || '/USDT', '60', '{}'::jsonb,
+           CASE WHEN q % 10 = 0 THEN 'Queued' ELSE 'Processed' END,
+           (SELECT min(id) FROM users WHERE username LIKE 'plan-user-%') + q % :users,
+           now() - q * interval '1 minute'
+    FROM generate_series(1, :groups) AS q
+    """,
+    """
+    INSERT INTO webhook_logs (payload, status, timestamp)
+    SELECT '{}'::jsonb, CASE WHEN w % 10 = 0 THEN 'rejected' ELSE 'Webhook received and validated' END,
+           now() - w * interval '1 second'
+    FROM generate_series(1, :groups * 5) AS w
+    """,
+]
+
+
+def hot_queries(db, user_id: int):
+    # (name, call into the app, tables that must not be sequentially scanned)
+    cursor = crud.get_webhook_logs(db, limit=1000)["next_cursor"]
+    yield "open group lookup", lambda: signal_processor.find_open_group(db, user_id, "PAIR7/USDT", "60"), {"position_groups"}
+    yield "live group count", lambda: signal_processor.count_live_groups(db, user_id), {"position_groups"}
+    yield "position groups page", lambda: crud.position_groups_query(db, user_id).limit(101).all(), {"position_groups", "pyramids", "dca_legs"}
+    yield "live position groups page", lambda: crud.position_groups_query(db, user_id, ["Live"]).limit(101).all(), {"position_groups", "pyramids", "dca_legs"}
+    yield "filled legs (take-profit index)", lambda: tp_index.filled_legs_query(db).all(), {"dca_legs"}
+    yield "PnL live groups of a pair", lambda: pnl_engine.load_live_groups(db, {"PAIR7/USDT"}), set()
+    yield "PnL filled legs of a pair", lambda: pnl_engine.load_filled_legs(db, {"PAIR7/USDT"}), {"dca_legs"}
+    yield "PnL live groups of an owner", lambda: pnl_engine.load_live_groups(db, owner_id=user_id), {"position_groups"}
+    yield "dashboard recompute", lambda: dashboard_metrics.compute(db, [user_id]), {"position_groups", "queued_signals"}
+    yield "webhook logs page", lambda: crud.get_webhook_logs(db, limit=10), {"webhook_logs"}
+    yield "webhook logs by status", lambda: crud.get_webhook_logs(db, limit=10, status="rejected"), {"webhook_logs"}
+    yield "webhook logs cursor page", lambda: crud.get_webhook_logs(db, limit=10, cursor=cursor), {"webhook_logs"}
+
+
+def executed_selects(call) -> list[tuple]:
+    # The SELECT statements (with their parameters) the app sends while running `call`
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        found += seq_scans(child)
+    return found
+
+
+def explain(db, statement: str, parameters) -> dict:
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def explain_generic(db, statement: str, parameters) -> dict:
+    # The psycopg2 %(name)s placeholders become $n of a prepared statement, planned without its values
+    names = list(dict.fromkeys(re.findall(r"%\((\w+)\)s", statement)))
+    prepared = re.sub(r"%\((\w+)\)s", lambda match: f"${names.index(match.group(1)) + 1}", statement).replace("%%", "%")
+    connection = db.connection()
+    connection.exec_driver_sql("SET plan_cache_mode = force_generic_plan")
+    connection.exec_driver_sql(f"PREPARE hot_query AS {prepared}")
+    try:
+        arguments = ", ".join(f"%({name})s" for name in names)
+        return explain(db, f"EXECUTE hot_query({arguments})" if names else "EXECUTE hot_query", parameters)
+    finally:
+        connection.exec_driver_sql("DEALLOCATE hot_query")
+        connection.exec_driver_sql("RESET plan_cache_mode")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse data from a previous run")
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        sys.exit("query_plans needs a Postgres DATABASE_URL")
+
+    run_migrations()
+    with engine.begin() as connection:
+        if not args.skip_seed:
+            for sql in SEED_SQL:
+                connection.execute(text(sql), {"users": args.users, "groups": args.groups})
+        connection.execute(text("ANALYZE"))
+
+    failures = 0
+    db = SessionLocal()
+    try:
+        user_id = db.query(models.User.id).filter(models.User.username == "plan-user-1").scalar()
+        for name, call, guarded in hot_queries(db, user_id):
+            for statement, parameters in executed_selects(call):
+                for mode, plan in (("inlined", explain(db, statement, parameters)), ("generic", explain_generic(db, statement, parameters))):
+                    scanned = sorted(set(seq_scans(plan)) & guarded)
+                    status = f"FAIL seq scan on {', '.join(scanned)}" if scanned else "ok"
+                    failures += bool(scanned)
+                    print(f"{name:<34} {mode:<8} cost {plan['Total Cost']:>12.1f}  {status}")
+                    if args.verbose or scanned:
+                        print(json.dumps(plan, indent=2))
+    finally:
+        db.close()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Signal storm: webhook throughput and latency percentiles under stepped load.
+
+Sends HMAC-signed TradingView signals at each of the --rates (signals per second) for --duration
+seconds, spread over --users x --pairs x --timeframes. A --pyramid-ratio share of the signals
+repeats a key already sent (a new pyramid on its group); the rest open new groups until the
+execution pool is full and then queue. Latency is measured from each signal's scheduled send
+time, so a saturated server shows up as latency rather than as a lower send rate. After the last
+stage it waits for the signal queue to drain and reports the processed rate and the rows added.
+
+In-process (default) the real FastAPI app runs here with its signal workers, the simulated
+"mock" exchange and the fake price feed; it needs Redis at REDIS_URL and writes to DATABASE_URL,
+so point both at scratch instances. With --url it drives a running deployment instead: users are
+created through DATABASE_URL and tokens signed with SECRET_KEY, so both must match the server's,
+and the server needs the "mock" exchange listing the pairs (or real ones) and no webhook rate
+limit for the load to get through. Install backend/requirements-dev.txt, then run from the
+repository root:
+
+    python -m backend.benchmarks.signal_storm --rates 50,100,200,400 --duration 10
+    python -m backend.benchmarks.signal_storm --url http://localhost:8000 --rates 100,200
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+os.environ.setdefault("PRICE_FEED", "fake")
+
+import httpx
+from sqlalchemy import func
+
+from backend import config, crud, models, schemas, security
+from backend.database import SessionLocal
+
+COUNTED_TABLES = {
+    "position_groups": models.PositionGroup,
+    "pyramids": models.Pyramid,
+    "dca_legs": models.DCALeg,
+    "queued_signals": models.QueuedSignal,
+    "webhook_logs": models.WebhookLog,
+}
+DRAIN_POLL_SECONDS = 0.5
+TOKEN_LIFETIME = timedelta(hours=12)
+
+
+def percentile(samples: list[float], q: float) -> float:
+    # Nearest rank on sorted samples
+    return samples[min(len(samples) - 1, max(0, round(q / 100 * len(samples)) - 1))] if samples else float("nan")
+
+
+def count_rows() -> dict:
+    db = SessionLocal()
+    try:
+        return {table: db.query(func.count()).select_from(model).scalar() for table, model in COUNTED_TABLES.items()}
+    finally:
+        db.close()
+
+
+def create_users(count: int) -> list[tuple[int, str]]:
+    db = SessionLocal()
+    try:
+        users = [crud.create_user(db, schemas.UserCreate(username=f"storm-{uuid.uuid4().hex[:8]}", password="storm")) for _ in range(count)]
+        return [(user.id, security.create_access_token({"sub": user.username}, TOKEN_LIFETIME)) for user in users]
+    finally:
+        db.close()
+
+
+class SignalMix:
+    # Picks (user, pair, timeframe) keys: repeats of sent keys become pyramids, unsent keys new
+    # groups (or queued signals once the user's pool is full)
+
+    def __init__(self, users: list, pairs: list[str], timeframes: list[str], pyramid_ratio: float, exchange: str, secret: str, seed: int):
+        self.random = random.Random(seed)
+        self.unsent = [(user, pair, timeframe) for user in users for pair in pairs for timeframe in timeframes]
+        self.random.shuffle(self.unsent)
+        self.sent = []
+        self.pyramid_ratio = pyramid_ratio
+        self.exchange = exchange
+        self.secret = secret
+
+    def next(self) -> tuple[bytes, dict, str]:
+        if self.sent and (not self.unsent or self.random.random() < self.pyramid_ratio):
+            kind, key = "pyramid", self.random.choice(self.sent)
+        else:
+            kind, key = "new", self.unsent.pop()
+            self.sent.append(key)
+        (user_id, token), pair, timeframe = key
+        raw_payload = json.dumps({
+            "tv.exchange": self.exchange,
+            "tv.symbol": pair,
+            "tv.timeframe": timeframe,
+            "tv.entry_price": round(self.random.uniform(95, 105), 2),
+        }).encode()
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "X-Signature": hmac.new(self.secret.encode(), raw_payload, hashlib.sha256).hexdigest(),
+            "Content-Type": "application/json",
+        }
+        return raw_payload, headers, kind
+
+
+async def run_stage(client: httpx.AsyncClient, mix: SignalMix, rate: float, duration: float, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses, kinds = [], {}, {}
+    total = int(rate * duration)
+    started = time.perf_counter()
+
+    async def send(scheduled: float, raw_payload: bytes, headers: dict):
+        async with semaphore:
+            try:
+                response = await client.post("/webhooks/", content=raw_payload, headers=headers)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    pending = []
+    for i in range(total):
+        scheduled = started + i / rate
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        raw_payload, headers, kind = mix.next()
+        kinds[kind] = kinds.get(kind, 0) + 1
+        pending.append(asyncio.create_task(send(scheduled, raw_payload, headers)))
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "target_rate": rate,
+        "sent": total,
+        "signals": kinds,
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "throughput": total / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else float("nan"),
+    }
+
+
+async def wait_for_drain(client: httpx.AsyncClient, token: str, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        response = await client.get("/webhooks/queue/", headers={"Authorization": f"Bearer {token}"})
+        if response.status_code == 200 and response.json()["depth"] == 0:
+            return True
+        await asyncio.sleep(DRAIN_POLL_SECONDS)
+    return False
+
+
+def use_storm_config(pairs: list[str], max_open_groups: int):
+    # In-process settings live in a temporary file; backend/config.json is not touched
+    from backend import config_manager, mock_exchange
+
+    settings = config_manager.get_snapshot().as_dict()
+    settings["exchange"] = {"name": mock_exchange.NAME, "testnet": True, "mock": {"symbols": pairs}}
+    settings["execution_pool"] = {**settings.get("execution_pool", {}), "max_open_groups": max_open_groups}
+    config_manager.CONFIG_FILE_PATH = Path(tempfile.mkdtemp(prefix="ex-engine-storm-")) / "config.json"
+    config_manager.save_config(settings)
+    mock_exchange.reset_shared_market()
+
+
+def disable_rate_limits(app):
+    # The per-client limiter needs Redis-backed init and would throttle the load itself
+    from fastapi_limiter.depends import RateLimiter
+
+    for route in app.routes:
+        for dependency in route.dependant.dependencies if hasattr(route, "dependant") else []:
+            if isinstance(dependency.call, RateLimiter):
+                app.dependency_overrides[dependency.call] = lambda: None
+
+
+async def run(args) -> dict:
+    pairs = [f"STORM{i}/USDT" for i in range(args.pairs)]
+    timeframes = args.timeframes.split(",")
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from backend import signal_queue
+        from backend.main import app
+
+        use_storm_config(pairs, args.max_open_groups)
+        disable_rate_limits(app)
+        workers = signal_queue.start_workers()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://storm", timeout=args.timeout)
+
+    users = create_users(args.users)
+    mix = SignalMix(users, pairs, timeframes, args.pyramid_ratio, args.exchange, args.secret, args.seed)
+    rows_before = count_rows()
+    started = time.perf_counter()
+    stages = []
+    try:
+        for rate in args.rates:
+            stage = await run_stage(client, mix, rate, args.duration, args.concurrency)
+            stages.append(stage)
+            print(
+                f"{rate:>7.0f}/s target  {stage['throughput']:8.1f}/s sent  p50 {stage['p50_ms']:8.2f}ms  "
+                f"p95 {stage['p95_ms']:8.2f}ms  p99 {stage['p99_ms']:8.2f}ms  max {stage['max_ms']:8.2f}ms  "
+                f"{stage['statuses']}  {stage['signals']}"
+            )
+        drained = await wait_for_drain(client, users[0][1], args.drain_timeout)
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.aclose()
+        if not args.url:
+            from backend import price_feed
+            from backend.database import async_engine
+
+            for worker in workers:
+                worker.cancel()
+            await price_feed.feed.close()
+            await async_engine.dispose()
+
+    rows_after = count_rows()
+    sent = sum(stage["sent"] for stage in stages)
+    growth = {table: rows_after[table] - rows_before[table] for table in COUNTED_TABLES}
+    print(f"\n{sent} signals {'processed' if drained else 'sent (queue not drained)'} in {elapsed:.1f}s: {sent / elapsed:.1f}/s end to end")
+    print("rows added: " + ", ".join(f"{table} +{count}" for table, count in growth.items()))
+    return {"stages": stages, "drained": drained, "end_to_end_rate": sent / elapsed, "rows_added": growth}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="drive a running deployment instead of the in-process app")
+    parser.add_argument("--rates", type=lambda value: [float(rate) for rate in value.split(",")], default=[50, 100, 200])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per rate")
+    parser.add_argument("--concurrency", type=int, default=200, help="requests in flight at most")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--pairs", type=int, default=20)
+    parser.add_argument("--timeframes", default="15,60,240")
+    parser.add_argument("--pyramid-ratio", type=float, default=0.5)
+    parser.add_argument("--max-open-groups", type=int, default=10, help="pool size, in-process only")
+    parser.add_argument("--exchange", default="mock", help="tv.exchange of the signals")
+    parser.add_argument("--secret", default=config.WEBHOOK_SECRET)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--drain-timeout", type=float, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Micro-benchmarks of the engine hot paths, saved as JSON and compared against a baseline.
+
+Cases: webhook signature check, precision validation, webhook payload parsing, DCA leg
+generation, one take-profit cycle (PnL, TP index, queue reprice) at several leg counts and one
+risk engine run. Prices and precision rules come from the simulated "mock" exchange; the
+database cases seed and write real rows, so point DATABASE_URL at a scratch database (or pass
+--no-db to run only the in-memory cases). Run from the repository root:
+
+    python -m backend.benchmarks.suite --output bench.json
+    python -m backend.benchmarks.suite --update-baseline
+    python -m backend.benchmarks.suite --baseline backend/benchmarks/baseline.json --threshold 0.2
+
+A case whose median time per call exceeds the baseline by more than the threshold is reported
+as a regression and the run exits with status 1. Medians are only comparable on the machine that
+recorded them, so no baseline is committed: store one on the benchmark host with
+--update-baseline and have CI pass --baseline explicitly, which makes a missing file an error
+(status 2) instead of a skipped comparison.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import math
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from backend import config_manager, mock_exchange, security, signal_processor, utils
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+WEBHOOK_SECRET = "bench_secret"
+LEG_COUNTS = (100, 1000, 10000)
+RISK_GROUPS = 1000
+# Below every seeded take-profit trigger, so cycles recompute PnL without closing anything
+CYCLE_PRICES = (98.0, 99.0)
+
+
+def webhook_payload(symbol: str = "BTC/USDT") -> dict:
+    return {
+        "tv.exchange": mock_exchange.NAME,
+        "tv.symbol": symbol,
+        "tv.timeframe": "15",
+        "tv.entry_price": 100.0,
+        "trade_price": 100.25,
+        "trade_quantity": 0.015,
+    }
+
+
+def sign(raw_payload: bytes) -> str:
+    return hmac.new(WEBHOOK_SECRET.encode(), raw_payload, hashlib.sha256).hexdigest()
+
+
+def use_benchmark_config():
+    # Engine settings for the run live in a temporary file; backend/config.json is not touched
+    config = config_manager.get_snapshot().as_dict()
+    config["exchange"] = {"name": mock_exchange.NAME, "testnet": True}
+    config["execution_pool"] = {**config.get("execution_pool", {}), "max_open_groups": 1_000_000}
+    config["grid_strategy"] = {**config.get("grid_strategy", {}), "capital": 1000}
+    config["risk_management"] = {**config.get("risk_management", {}), "risk_engine_enabled": True, "max_loss_per_trade": 1}
+    config_manager.CONFIG_FILE_PATH = Path(tempfile.mkdtemp(prefix="ex-engine-bench-")) / "config.json"
+    config_manager.save_config(config)
+
+
+def memory_cases() -> dict:
+    raw_payload = json.dumps(webhook_payload()).encode()
+    signature = sign(raw_payload)
+    # Precision rules are cached by the registry after the first lookup, as in the app
+    signal_processor.get_precision_rules(webhook_payload())
+
+    def parse_webhook():
+        # receive_webhook's checks followed by the signal worker's decode and rules lookup
+        payload = json.loads(raw_payload)
+        if not isinstance(payload, dict):
+            raise ValueError("not an object")
+        return signal_processor.get_precision_rules(payload)
+
+    return {
+        "verify_webhook_signature": lambda: security.verify_webhook_signature(raw_payload, signature, WEBHOOK_SECRET),
+        "validate_precision": lambda: (
+            utils.validate_precision(100.25, 0.01),
+            utils.validate_precision(0.015, 0.001),
+            utils.validate_precision(12345, 1),
+        ),
+        "parse_webhook_payload": parse_webhook,
+    }
+
+
+def database_cases(leg_counts) -> dict:
+    from backend import crud, models, risk_engine, schemas, tasks, tp_index
+    from backend.benchmarks.pnl_batch import FILLED_LEGS_PER_GROUP, seed
+    from backend.database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    cases = {}
+
+    # DCA leg generation for a signal that adds a pyramid to an existing group; rolled back
+    user = crud.create_user(db, schemas.UserCreate(username=f"bench-{uuid.uuid4().hex[:8]}", password="bench"))
+    leg_payload = webhook_payload(f"LEGS-{uuid.uuid4().hex[:4]}/USDT")
+    crud.create_position_group(db, schemas.PositionGroupCreate(pair=leg_payload["tv.symbol"], timeframe="15", status="Live"), user.id)
+
+    def generate_legs():
+        signal_processor.open_position(db, leg_payload, user.id)
+        db.rollback()
+
+    cases["dca_leg_generation"] = generate_legs
+
+    for legs in leg_counts:
+        pairs = [f"TP{i}-{uuid.uuid4().hex[:4]}/USDT" for i in range(10)]
+        seed(math.ceil(legs / FILLED_LEGS_PER_GROUP), pairs)
+        prices = [{pair: price for pair in pairs} for price in CYCLE_PRICES]
+        cycle = iter(range(sys.maxsize))
+
+        def take_profit_cycle(pairs=set(pairs), prices=prices, cycle=cycle):
+            # Alternating prices so every cycle has PnL to write
+            tasks.process_price_updates(db, pairs, prices[next(cycle) % len(prices)])
+
+        cases[f"take_profit_cycle[legs={legs}]"] = take_profit_cycle
+
+    # Risk engine run for an owner whose worst loser is past the threshold
+    risk_pairs = [f"RISK{i}-{uuid.uuid4().hex[:4]}/USDT" for i in range(10)]
+    risk_owner = seed(RISK_GROUPS, risk_pairs)
+    tasks.process_price_updates(db, set(risk_pairs), {pair: 100.0 + (i - 5) * 0.5 for i, pair in enumerate(risk_pairs)})
+    cases["run_risk_engine"] = lambda: risk_engine.run_risk_engine(db, [risk_owner])
+
+    tp_index.index.rebuild(db)
+    risk_engine.book.rebuild(db)
+    risk_engine.evaluate([risk_owner])
+    return cases
+
+
+def measure(cases: dict, repeats: int) -> dict:
+    results = {}
+    for name, case in cases.items():
+        timer = timeit.Timer(case)
+        number, _ = timer.autorange()
+        samples = [elapsed / number for elapsed in timer.repeat(repeat=repeats, number=number)]
+        results[name] = {
+            "median_s": statistics.median(samples),
+            "min_s": min(samples),
+            "number": number,
+            "repeats": repeats,
+        }
+        print(f"{name:<32} {results[name]['median_s'] * 1e6:12.2f}us median  {results[name]['min_s'] * 1e6:12.2f}us best  ({number} x {repeats})")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    for key in ("machine", "python"):
+        if baseline.get(key) != results[key]:
+            print(f"WARNING: baseline was recorded with {key} {baseline.get(key)!r}, this run has {results[key]!r}; timings may not be comparable")
+    regressions = []
+    print(f"\n{'case':<32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results["cases"].items():
+        previous = baseline["cases"].get(name)
+        if previous is None:
+            print(f"{name:<32} {'-':>12} {result['median_s'] * 1e6:10.2f}us {'new':>8}")
+            continue
+        change = result["median_s"] / previous["median_s"] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<32} {previous['median_s'] * 1e6:10.2f}us {result['median_s'] * 1e6:10.2f}us {change:+7.1%}{'  REGRESSED' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help=f"compare against this file, which must exist (default {DEFAULT_BASELINE}, skipped if missing)")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown of the median, 0.2 = 20%%")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--legs", type=lambda value: [int(n) for n in value.split(",")], default=LEG_COUNTS)
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--no-db", action="store_true", help="skip the cases that need a database")
+    args = parser.parse_args()
+
+    use_benchmark_config()
+    mock_exchange.reset_shared_market({"seed": 1})
+    cases = memory_cases()
+    if not args.no_db:
+        cases.update(database_cases(args.legs))
+    results = measure({name: case for name, case in cases.items() if args.filter in name}, args.repeats)
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "cases": results,
+    }
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    baseline = args.baseline or DEFAULT_BASELINE
+    if args.update_baseline:
+        baseline.write_text(json.dumps(report, indent=2))
+        print(f"\nBaseline written to {baseline}")
+        return
+    if not baseline.exists():
+        if args.baseline:
+            print(f"\nERROR: no baseline at {baseline}")
+            sys.exit(2)
+        print(f"\nNo baseline at {baseline}; run with --update-baseline to store one")
+        return
+    regressions = compare(report, json.loads(baseline.read_text()), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
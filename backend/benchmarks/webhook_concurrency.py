@@ -0,0 +1,159 @@
+"""Webhook latency percentiles with the take-profit loop idle and then busy.
+
+Drives the real FastAPI app in-process with its signal workers, a stubbed exchange for
+precision rules and the fake price feed. Each signal is timed twice: until /webhooks/ accepts
+it (202, queued) and until a worker has processed it against the database. Needs Redis at
+REDIS_URL for the signal queue and writes real rows to DATABASE_URL, so point both at scratch
+instances. Install backend/requirements-dev.txt, then run from the repository root:
+
+    DATABASE_URL=postgresql://... python -m backend.benchmarks.webhook_concurrency --groups 2000
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+import uuid
+
+os.environ["PRICE_FEED"] = "fake"
+
+import ccxt
+import httpx
+
+from backend import config, crud, models, price_feed, schemas, security, signal_queue, tasks, tp_index
+from backend.benchmarks.signal_storm import disable_rate_limits, percentile
+from backend.benchmarks.webhook_latency import STUB_EXCHANGE, StubExchange
+from backend.database import AsyncSessionLocal, SessionLocal, async_engine
+from backend.main import app
+
+PROCESS_POLL_SECONDS = 0.05
+
+
+def seed(groups: int, pairs: int) -> str:
+    db = SessionLocal()
+    try:
+        user = crud.create_user(db, schemas.UserCreate(username=f"bench-{uuid.uuid4().hex[:8]}", password="bench"))
+        for i in range(groups):
+            position_group = models.PositionGroup(pair=f"BENCH{i % pairs}/USDT", timeframe=str(i), status="Live", owner_id=user.id)
+            db.add(position_group)
+            db.flush()
+            pyramid = models.Pyramid(position_group_id=position_group.id, entry_price=100.0)
+            db.add(pyramid)
+            db.flush()
+            for j in range(5):
+                db.add(models.DCALeg(
+                    pyramid_id=pyramid.id, price_gap=-0.005 * j, capital_weight=0.2,
+                    tp_target=0.5, fill_price=100.0 * (1 - 0.005 * j), status="Filled",
+                ))
+        db.commit()
+        return user.username
+    finally:
+        db.close()
+
+
+def track_processed(processed: dict):
+    # Records when the workers finish each queued entry, rejected ones included
+    process_entry = signal_queue.process_entry
+
+    async def timed(message_id: str, fields: dict):
+        await process_entry(message_id, fields)
+        processed[message_id] = time.perf_counter()
+
+    signal_queue.process_entry = timed
+
+
+async def send_webhooks(client: httpx.AsyncClient, token: str, requests: int, concurrency: int, processed: dict, timeout: float):
+    semaphore = asyncio.Semaphore(concurrency)
+    accepted, sent = [], {}
+
+    async def send(i: int):
+        raw_payload = json.dumps({
+            "tv.exchange": STUB_EXCHANGE,
+            "tv.symbol": "BTC/USDT",
+            "tv.timeframe": "15",
+            "tv.entry_price": 65000.5 + i,
+        }).encode()
+        signature = hmac.new(config.WEBHOOK_SECRET.encode(), raw_payload, hashlib.sha256).hexdigest()
+        headers = {"Authorization": f"Bearer {token}", "X-Signature": signature, "Content-Type": "application/json"}
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/webhooks/", content=raw_payload, headers=headers)
+            accepted.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+            sent[response.json()["id"]] = start
+
+    await asyncio.gather(*(send(i) for i in range(requests)))
+    deadline = time.perf_counter() + timeout
+    while not sent.keys() <= processed.keys() and time.perf_counter() < deadline:
+        await asyncio.sleep(PROCESS_POLL_SECONDS)
+    done = [(processed[message_id] - start) * 1000 for message_id, start in sent.items() if message_id in processed]
+    return sorted(accepted), sorted(done), len(sent) - len(done)
+
+
+async def drive_prices(pairs: int, interval: float):
+    # Keeps every seeded pair ticking below its TP triggers so each batch recomputes PnL
+    while True:
+        for i in range(pairs):
+            price_feed.feed.push(STUB_EXCHANGE, f"BENCH{i}/USDT", 100.0 + random.random())
+        await asyncio.sleep(interval)
+
+
+def report(label: str, results):
+    accepted, done, unprocessed = results
+    for stage, latencies in (("accepted", accepted), ("processed", done)):
+        print(
+            f"{label:<8} {stage:<10} p50={percentile(latencies, 50):8.2f}ms  p99={percentile(latencies, 99):8.2f}ms  "
+            f"max={latencies[-1] if latencies else float('nan'):8.2f}ms"
+        )
+    if unprocessed:
+        print(f"{label:<8} {unprocessed} signals not processed within the timeout")
+
+
+async def run(args):
+    username = seed(args.groups, args.pairs)
+    token = security.create_access_token({"sub": username})
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(tp_index.index.rebuild)
+
+    processed = {}
+    track_processed(processed)
+    workers = signal_queue.start_workers()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        report("idle", await send_webhooks(client, token, args.requests, args.concurrency, processed, args.timeout))
+
+        tasks.get_exchange_name = lambda: STUB_EXCHANGE
+        background = [
+            asyncio.create_task(tasks.check_take_profits()),
+            asyncio.create_task(tasks.run_risk_engine_task()),
+            asyncio.create_task(drive_prices(args.pairs, args.tick_interval)),
+        ]
+        await asyncio.sleep(1)
+        report("tp busy", await send_webhooks(client, token, args.requests, args.concurrency, processed, args.timeout))
+        for task in background + workers:
+            task.cancel()
+
+    await price_feed.feed.close()
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=2000)
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--tick-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for each batch to be processed")
+    args = parser.parse_args()
+
+    setattr(ccxt, STUB_EXCHANGE, StubExchange)
+    disable_rate_limits(app)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Webhook validation latency with a per-request ccxt client vs the shared exchange registry.
+
+Run from the repository root:
+
+    python -m backend.benchmarks.webhook_latency --requests 50 --markets-latency 0.25
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import statistics
+import time
+
+import ccxt
+
+from backend import exchange_registry, security, utils
+
+STUB_EXCHANGE = "benchstub"
+WEBHOOK_SECRET = "bench_secret"
+
+
+class StubExchange:
+    # Mimics the parts of a ccxt exchange used for precision checks
+    markets_latency = 0.0
+    markets_count = 2000
+
+    def __init__(self, config=None):
+        self.markets = None
+
+    def load_markets(self, reload=False):
+        if self.markets is not None and not reload:
+            return self.markets
+        time.sleep(self.markets_latency)
+        self.markets = {
+            f"COIN{i}/USDT": {"precision": {"price": 0.01, "amount": 0.001}}
+            for i in range(self.markets_count)
+        }
+        self.markets["BTC/USDT"] = {"precision": {"price": 0.01, "amount": 0.00001}}
+        return self.markets
+
+
+def legacy_get_precision_rules(exchange_name: str, symbol: str):
+    # The pre-registry implementation: a fresh client and market download per call
+    exchange = getattr(ccxt, exchange_name.lower())()
+    market = exchange.load_markets().get(symbol)
+    if not market:
+        return None
+    return {"price": market["precision"]["price"], "amount": market["precision"]["amount"]}
+
+
+def handle_webhook(raw_payload: bytes, signature: str, get_precision_rules):
+    # The validation stage of receive_webhook, up to the database writes
+    if not security.verify_webhook_signature(raw_payload, signature, WEBHOOK_SECRET):
+        raise ValueError("Invalid X-Signature")
+    payload = json.loads(raw_payload)
+    precision_rules = get_precision_rules(payload["tv.exchange"], payload["tv.symbol"])
+    return (
+        utils.validate_precision(payload["trade_price"], precision_rules["price"])
+        and utils.validate_precision(payload["trade_quantity"], precision_rules["amount"])
+    )
+
+
+def measure(requests: int, get_precision_rules):
+    raw_payload = json.dumps({
+        "tv.exchange": STUB_EXCHANGE,
+        "tv.symbol": "BTC/USDT",
+        "tv.timeframe": "15",
+        "tv.entry_price": 65000.5,
+        "trade_price": 65000.5,
+        "trade_quantity": 0.0015,
+    }).encode()
+    signature = hmac.new(WEBHOOK_SECRET.encode(), raw_payload, hashlib.sha256).hexdigest()
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        handle_webhook(raw_payload, signature, get_precision_rules)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<10} mean={statistics.mean(samples):9.3f}ms  p50={statistics.median(samples):9.3f}ms  p95={p95:9.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--markets-latency", type=float, default=0.25, help="Seconds a stubbed load_markets() takes")
+    parser.add_argument("--markets-count", type=int, default=2000)
+    args = parser.parse_args()
+
+    StubExchange.markets_latency = args.markets_latency
+    StubExchange.markets_count = args.markets_count
+    setattr(ccxt, STUB_EXCHANGE, StubExchange)
+
+    report("before", measure(args.requests, legacy_get_precision_rules))
+    # The first call warms the registry, as the first webhook after startup would
+    exchange_registry.load_markets(STUB_EXCHANGE)
+    report("after", measure(args.requests, utils.get_precision_rules))
+
+
+if __name__ == "__main__":
+    main()
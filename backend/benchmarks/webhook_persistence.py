@@ -0,0 +1,72 @@
+"""Webhook persistence throughput: per-row commits vs one unit of work per signal.
+
+Writes real rows, so point DATABASE_URL at a scratch database. Run from the repository root:
+
+    DATABASE_URL=postgresql://... python -m backend.benchmarks.webhook_persistence --signals 500
+"""
+import argparse
+import time
+import uuid
+
+from backend import crud, models, schemas
+from backend.database import SessionLocal, engine
+
+DCA_CONFIG = [
+    {"price_gap": 0, "capital_weight": 0.2, "tp_target": 0.01},
+    {"price_gap": -0.005, "capital_weight": 0.2, "tp_target": 0.005},
+    {"price_gap": -0.01, "capital_weight": 0.2, "tp_target": 0.02},
+    {"price_gap": -0.015, "capital_weight": 0.2, "tp_target": 0.015},
+    {"price_gap": -0.02, "capital_weight": 0.2, "tp_target": 0.01},
+]
+
+
+def persist_per_row(db, user_id: int, payload: dict):
+    # The previous write path: a commit and refresh for every row
+    crud.create_webhook_log(db, payload, "Webhook received and validated")
+    group_schema = schemas.PositionGroupCreate(pair=payload["tv.symbol"], timeframe=payload["tv.timeframe"])
+    position_group = crud.create_position_group(db, group_schema, user_id)
+    pyramid = crud.create_pyramid(db, schemas.PyramidCreate(position_group_id=position_group.id, entry_price=payload["tv.entry_price"]))
+    for leg_config in DCA_CONFIG:
+        crud.create_dca_leg(db, schemas.DCALegCreate(pyramid_id=pyramid.id, **leg_config))
+
+
+def persist_unit_of_work(db, user_id: int, payload: dict):
+    crud.create_webhook_log(db, payload, "Webhook received and validated", commit=False)
+    group_schema = schemas.PositionGroupCreate(pair=payload["tv.symbol"], timeframe=payload["tv.timeframe"])
+    position_group = crud.create_position_group(db, group_schema, user_id, commit=False)
+    crud.create_pyramid_with_legs(db, schemas.PyramidCreate(position_group_id=position_group.id, entry_price=payload["tv.entry_price"]), DCA_CONFIG)
+    db.commit()
+
+
+def measure(label: str, persist, signals: int, user_id: int):
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        for i in range(signals):
+            payload = {"tv.symbol": f"BENCH{i}/USDT", "tv.timeframe": "15", "tv.entry_price": 100.0 + i}
+            persist(db, user_id, payload)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+    print(f"{label:<8} {signals} signals in {elapsed:7.3f}s  {signals / elapsed:9.1f} webhooks/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--signals", type=int, default=500)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = crud.create_user(db, schemas.UserCreate(username=f"bench-{uuid.uuid4().hex[:8]}", password="bench"))
+        user_id = user.id
+    finally:
+        db.close()
+
+    measure("before", persist_per_row, args.signals, user_id)
+    measure("after", persist_unit_of_work, args.signals, user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,220 @@
+import asyncio
+import hashlib
+import itertools
 import json
+import os
+import stat
+import tempfile
+import threading
+import time
+import uuid
 from pathlib import Path
+from types import MappingProxyType
+from typing import NamedTuple
+
+import redis
+import redis.asyncio as aioredis
+from watchfiles import awatch
+
+from . import config, schemas
 from .logging_config import logger
 
 CONFIG_FILE_PATH = Path("backend/config.json")
+BROADCAST_CHANNEL = "ex_engine:config"
+BROADCAST_RETRY_SECONDS = 5
+WATCH_RETRY_SECONDS = 5
+WORKER_ID = uuid.uuid4().hex
 
-def load_config():
+DEFAULT_CONFIG = {
+    "exchange": {
+        "name": "binance",
+        "testnet": True,
+    },
+    "execution_pool": {
+        "max_open_groups": 10,
+    },
+    "grid_strategy": {
+        "capital": 1000,
+        "dca_config": [
+            {"price_gap": 0, "capital_weight": 0.2, "tp_target": 0.01},
+            {"price_gap": -0.005, "capital_weight": 0.2, "tp_target": 0.005},
+            {"price_gap": -0.01, "capital_weight": 0.2, "tp_target": 0.02},
+            {"price_gap": -0.015, "capital_weight": 0.2, "tp_target": 0.015},
+            {"price_gap": -0.02, "capital_weight": 0.2, "tp_target": 0.01},
+        ]
+    }
+}
+
+
+class ConfigSnapshot(NamedTuple):
+    # An immutable, validated view of config.json. Readers hold on to a snapshot; writers
+    # build a new one and swap the module reference.
+    version: int
+    checksum: str
+    config: MappingProxyType
+    loaded_at: float
+
+    def as_dict(self) -> dict:
+        return _thaw(self.config)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+_snapshot = None
+_versions = itertools.count(1)
+_swap_lock = threading.Lock()
+_write_lock = threading.Lock()
+_publisher = redis.Redis.from_url(config.REDIS_URL, decode_responses=True, socket_connect_timeout=1) if config.CONFIG_BROADCAST else None
+
+
+def validate(raw: dict) -> dict:
+    # Raises pydantic.ValidationError (a ValueError) when the config does not match the schema
+    return schemas.EngineConfig.model_validate(raw).model_dump(exclude_unset=True)
+
+
+def checksum(config_dict: dict) -> str:
+    canonical = json.dumps(config_dict, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def _swap(config_dict: dict, source: str) -> ConfigSnapshot:
+    global _snapshot
+    digest = checksum(config_dict)
+    with _swap_lock:
+        if _snapshot is not None and _snapshot.checksum == digest:
+            return _snapshot
+        _snapshot = ConfigSnapshot(next(_versions), digest, _freeze(config_dict), time.time())
+        snapshot = _snapshot
+    logger.info(f"Config version {snapshot.version} ({digest}) loaded from {source}")
+    return snapshot
+
+
+def _write_file(config_dict: dict):
+    # Written next to the target and renamed over it, so readers see the old file or the new one
+    fd, temp_path = tempfile.mkstemp(dir=CONFIG_FILE_PATH.parent, prefix=f".{CONFIG_FILE_PATH.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(config_dict, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        mode = stat.S_IMODE(CONFIG_FILE_PATH.stat().st_mode) if CONFIG_FILE_PATH.exists() else 0o644
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, CONFIG_FILE_PATH)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def reload(source: str = "file") -> ConfigSnapshot | None:
+    # An unreadable or invalid file keeps the current snapshot in place
     if not CONFIG_FILE_PATH.exists():
         logger.warning(f"Config file not found at {CONFIG_FILE_PATH}. Creating with default values.")
-        # TODO: Define a proper default config structure
-        default_config = {
-            "exchange": {
-                "name": "binance",
-                "testnet": True,
-            },
-            "execution_pool": {
-                "max_open_groups": 10,
-            },
-            "grid_strategy": {
-                "dca_config": [
-                    {"price_gap": 0, "capital_weight": 0.2, "tp_target": 0.01},
-                    {"price_gap": -0.005, "capital_weight": 0.2, "tp_target": 0.005},
-                    {"price_gap": -0.01, "capital_weight": 0.2, "tp_target": 0.02},
-                    {"price_gap": -0.015, "capital_weight": 0.2, "tp_target": 0.015},
-                    {"price_gap": -0.02, "capital_weight": 0.2, "tp_target": 0.01},
-                ]
-            }
-        }
-        save_config(default_config)
-        return default_config
-    with open(CONFIG_FILE_PATH, 'r') as f:
-        return json.load(f)
-
-def save_config(config: dict):
-    with open(CONFIG_FILE_PATH, 'w') as f:
-        json.dump(config, f, indent=4)
+        with _write_lock:
+            _write_file(DEFAULT_CONFIG)
+    try:
+        with open(CONFIG_FILE_PATH, 'r') as f:
+            config_dict = validate(json.load(f))
+    except (OSError, ValueError) as e:
+        logger.error(f"Ignoring invalid config file {CONFIG_FILE_PATH}: {e}")
+        return _snapshot
+    return _swap(config_dict, source)
+
+
+def get_snapshot() -> ConfigSnapshot:
+    snapshot = _snapshot
+    if snapshot is None:
+        snapshot = reload() or _swap(validate(DEFAULT_CONFIG), "defaults")
+    return snapshot
+
+
+def load_config():
+    # Read-only mapping; use get_snapshot().as_dict() for a mutable copy
+    return get_snapshot().config
+
+
+def save_config(new_config: dict) -> ConfigSnapshot:
+    config_dict = validate(new_config)
+    with _write_lock:
+        _write_file(config_dict)
+        snapshot = _swap(config_dict, "save")
     logger.info(f"Config saved to {CONFIG_FILE_PATH}")
+    publish(snapshot)
+    return snapshot
+
+
+def publish(snapshot: ConfigSnapshot):
+    if _publisher is None:
+        return
+    try:
+        _publisher.publish(BROADCAST_CHANNEL, json.dumps({
+            "worker": WORKER_ID,
+            "checksum": snapshot.checksum,
+            "config": snapshot.as_dict(),
+        }))
+    except redis.RedisError as e:
+        logger.warning(f"Config change broadcast failed: {e}")
+
+
+def apply_broadcast(data: str):
+    # A malformed message is logged and skipped; it must not end the subscription
+    try:
+        message = json.loads(data)
+        worker, digest, raw = message["worker"], message["checksum"], message["config"]
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error(f"Ignoring malformed config broadcast: {e!r}")
+        return
+    if worker == WORKER_ID or digest == get_snapshot().checksum:
+        return
+    try:
+        config_dict = validate(raw)
+    except ValueError as e:
+        logger.error(f"Ignoring invalid config broadcast from worker {worker}: {e}")
+        return
+    _swap(config_dict, f"worker {worker}")
+
+
+async def watch_task():
+    # Picks up edits made to the file directly and saves made by workers sharing it. Only the
+    # file's own directory is watched, and a watcher failure restarts the watch.
+    path = CONFIG_FILE_PATH.resolve()
+    while True:
+        try:
+            async for _ in awatch(path.parent, watch_filter=lambda change, changed_path: Path(changed_path) == path, recursive=False):
+                await asyncio.to_thread(reload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Config file watch failed: {e}")
+        await asyncio.sleep(WATCH_RETRY_SECONDS)
+
+
+async def broadcast_task():
+    # Applies saves made by workers that do not share this file
+    if not config.CONFIG_BROADCAST:
+        return
+    client = aioredis.from_url(config.REDIS_URL, decode_responses=True)
+    while True:
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(BROADCAST_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        apply_broadcast(message["data"])
+        except Exception as e:
+            logger.warning(f"Config broadcast subscription failed: {e}")
+        await asyncio.sleep(BROADCAST_RETRY_SECONDS)
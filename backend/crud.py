@@ -1,7 +1,32 @@
-from sqlalchemy.orm import Session, joinedload
-from . import models, schemas, security
+import base64
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session, selectinload
+from . import dashboard_metrics, event_bus, models, order_executor, risk_engine, schemas, security, tp_index, user_cache
 from .logging_config import logger
 
+def _save(db: Session, instance, commit: bool):
+    # Either commit right away or only flush so the caller can commit a larger unit of work
+    if commit:
+        db.commit()
+        db.refresh(instance)
+    else:
+        db.flush()
+
+def _stage_position(db: Session, position_group: models.PositionGroup):
+    event_bus.stage(db, position_group.owner_id, "position", position_group.id, {
+        "id": position_group.id,
+        "pair": position_group.pair,
+        "timeframe": position_group.timeframe,
+        "status": position_group.status,
+        "avg_entry_price": position_group.avg_entry_price,
+        "unrealized_pnl_percent": position_group.unrealized_pnl_percent,
+        "unrealized_pnl_usd": position_group.unrealized_pnl_usd,
+        "closed_at": position_group.closed_at.isoformat() if position_group.closed_at else None,
+    })
+
 # User CRUD
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
@@ -10,8 +35,11 @@ def create_user(db: Session, user: schemas.UserCreate):
     hashed_password = security.get_password_hash(user.password)
     db_user = models.User(username=user.username, hashed_password=hashed_password)
     db.add(db_user)
+    db.flush()
+    db.add(models.DashboardMetrics(owner_id=db_user.id))
     db.commit()
     db.refresh(db_user)
+    user_cache.cache.invalidate(db_user.username)
     return db_user
 
 # API Key CRUD
@@ -36,6 +64,7 @@ def delete_api_key(db: Session, api_key_id: int, user_id: int):
     if db_api_key:
         db.delete(db_api_key)
         db.commit()
+        order_executor.executor.sessions.evict(api_key_id)
     return db_api_key
 
 def update_api_key(db: Session, api_key_id: int, name: str, user_id: int):
@@ -44,55 +73,207 @@ def update_api_key(db: Session, api_key_id: int, name: str, user_id: int):
         db_api_key.name = name
         db.commit()
         db.refresh(db_api_key)
+        order_executor.executor.sessions.evict(api_key_id)
     return db_api_key
 
 # Webhook Log CRUD
-def create_webhook_log(db: Session, payload: dict, status: str):
+def create_webhook_log(db: Session, payload: dict, status: str, commit: bool = True):
     logger.info(f"Attempting to create webhook log with status: {status} and payload: {payload}")
     db_log = models.WebhookLog(payload=payload, status=status)
     db.add(db_log)
-    db.commit()
-    db.refresh(db_log)
+    _save(db, db_log, commit)
     logger.info(f"Successfully created webhook log with id: {db_log.id}")
+    event_bus.stage(db, None, "webhook_log", db_log.id, {"id": db_log.id, "status": status})
     return db_log
 
-def get_webhook_logs(db: Session, skip: int = 0, limit: int = 100):
-    logs = db.query(models.WebhookLog).order_by(models.WebhookLog.timestamp.desc()).offset(skip).limit(limit).all()
-    total = db.query(models.WebhookLog).count()
-    return {"logs": logs, "total": total}
+def encode_webhook_log_cursor(log: models.WebhookLog) -> str:
+    return base64.urlsafe_b64encode(f"{log.timestamp.isoformat()}|{log.id}".encode()).decode()
+
+def decode_webhook_log_cursor(cursor: str):
+    # Raises ValueError for anything that is not a cursor we handed out
+    timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(timestamp), int(log_id)
+
+def estimate_row_count(db: Session, query) -> tuple[int, bool]:
+    # The planner's row estimate is O(1) regardless of table size; other dialects fall back to an exact count
+    if db.bind.dialect.name != "postgresql":
+        return query.order_by(None).count(), False
+    statement = query.statement.compile(dialect=db.bind.dialect)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", statement.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"]), True
+
+def get_webhook_logs(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    status: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    query = db.query(models.WebhookLog)
+    if status is not None:
+        query = query.filter(models.WebhookLog.status == status)
+    if start is not None:
+        query = query.filter(models.WebhookLog.timestamp >= start)
+    if end is not None:
+        query = query.filter(models.WebhookLog.timestamp < end)
+    total, total_is_estimate = estimate_row_count(db, query)
+
+    query = query.order_by(models.WebhookLog.timestamp.desc(), models.WebhookLog.id.desc())
+    if cursor is not None:
+        timestamp, log_id = decode_webhook_log_cursor(cursor)
+        query = query.filter(tuple_(models.WebhookLog.timestamp, models.WebhookLog.id) < tuple_(timestamp, log_id))
+    elif skip:
+        # Offset paging is kept for existing clients; cursors stay fast on deep pages
+        query = query.offset(skip)
+
+    logs = query.limit(limit + 1).all()
+    next_cursor = encode_webhook_log_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return {
+        "logs": logs[:limit],
+        "total": total,
+        "total_is_estimate": total_is_estimate,
+        "next_cursor": next_cursor,
+    }
 
 # Position Group CRUD
-def create_position_group(db: Session, position_group: schemas.PositionGroupCreate, user_id: int):
+def create_position_group(db: Session, position_group: schemas.PositionGroupCreate, user_id: int, commit: bool = True):
     db_position_group = models.PositionGroup(**position_group.dict(), owner_id=user_id, status="Live")
     db.add(db_position_group)
-    db.commit()
-    db.refresh(db_position_group)
+    dashboard_metrics.record_group_change(db, user_id, False, None, True, db_position_group.unrealized_pnl_usd)
+    _save(db, db_position_group, commit)
+    _stage_position(db, db_position_group)
     return db_position_group
 
 def get_position_group(db: Session, position_group_id: int):
     return db.query(models.PositionGroup).filter(models.PositionGroup.id == position_group_id).first()
 
-def get_position_groups_by_user(db: Session, user_id: int):
-    position_groups = db.query(models.PositionGroup).options(
-        joinedload(models.PositionGroup.pyramids).joinedload(models.Pyramid.dca_legs)
-    ).filter(models.PositionGroup.owner_id == user_id).all()
+def encode_position_group_cursor(position_group: models.PositionGroup) -> str:
+    return base64.urlsafe_b64encode(str(position_group.id).encode()).decode()
 
-    for pg in position_groups:
-        pg.pyramids_count = len(pg.pyramids)
-        pg.dca_legs_count = sum(len(p.dca_legs) for p in pg.pyramids)
+def decode_position_group_cursor(cursor: str) -> int:
+    # Raises ValueError for anything that is not a cursor we handed out
+    return int(base64.urlsafe_b64decode(cursor.encode()).decode())
 
-    return position_groups
+def position_groups_query(db: Session, user_id: int, statuses: list[str] | None = None, before_id: int | None = None):
+    # Newest first; child counts are correlated aggregates evaluated only for the returned rows
+    PositionGroup, Pyramid, DCALeg = models.PositionGroup, models.Pyramid, models.DCALeg
+    pyramids_count = select(func.count(Pyramid.id)).where(
+        Pyramid.position_group_id == PositionGroup.id
+    ).scalar_subquery()
+    dca_legs_count = select(func.count(DCALeg.id)).join(Pyramid, DCALeg.pyramid_id == Pyramid.id).where(
+        Pyramid.position_group_id == PositionGroup.id
+    ).scalar_subquery()
+    query = db.query(PositionGroup, pyramids_count, dca_legs_count).filter(PositionGroup.owner_id == user_id)
+    if statuses:
+        query = query.filter(PositionGroup.status.in_(statuses))
+    if before_id is not None:
+        query = query.filter(PositionGroup.id < before_id)
+    return query.order_by(PositionGroup.id.desc())
+
+def get_position_groups_by_user(
+    db: Session,
+    user_id: int,
+    statuses: list[str] | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+    include_legs: bool = True,
+):
+    query = position_groups_query(db, user_id, statuses, decode_position_group_cursor(cursor) if cursor else None)
+    if include_legs:
+        # One IN query per level for the whole page instead of a pyramids x legs join
+        query = query.options(selectinload(models.PositionGroup.pyramids).selectinload(models.Pyramid.dca_legs))
+    rows = query.limit(limit + 1).all()
+
+    position_groups = []
+    for pg, pyramids_count, dca_legs_count in rows[:limit]:
+        pg.pyramids_count = pyramids_count
+        pg.dca_legs_count = dca_legs_count
+        position_groups.append(pg)
+    return {
+        "position_groups": position_groups,
+        "next_cursor": encode_position_group_cursor(position_groups[-1]) if len(rows) > limit else None,
+    }
+
+def get_pyramids_with_legs(db: Session, position_group_id: int):
+    return db.query(models.Pyramid).options(selectinload(models.Pyramid.dca_legs)).filter(
+        models.Pyramid.position_group_id == position_group_id
+    ).order_by(models.Pyramid.id).all()
 
 def update_position_group(db: Session, position_group_id: int, position_group: schemas.PositionGroupUpdate):
     db_position_group = get_position_group(db, position_group_id)
     if db_position_group:
+        was_live, old_pnl = db_position_group.status == "Live", db_position_group.unrealized_pnl_usd
         update_data = position_group.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_position_group, key, value)
+        dashboard_metrics.record_group_change(
+            db, db_position_group.owner_id, was_live, old_pnl,
+            db_position_group.status == "Live", db_position_group.unrealized_pnl_usd,
+        )
+        _stage_position(db, db_position_group)
         db.commit()
         db.refresh(db_position_group)
+        if db_position_group.status == "Live":
+            risk_engine.book.update([(
+                db_position_group.id, db_position_group.owner_id,
+                db_position_group.unrealized_pnl_percent, db_position_group.unrealized_pnl_usd,
+            )])
+        else:
+            risk_engine.book.remove([db_position_group.id])
     return db_position_group
 
+def close_finished_position_groups(db: Session, leg_ids: list[int]) -> list[models.PositionGroup]:
+    # Closes the Live groups of these legs that have no Filled leg left; their Pending legs are cancelled.
+    # Part of the caller's unit of work.
+    group_ids = {group_id for group_id, in db.query(models.Pyramid.position_group_id).join(
+        models.DCALeg, models.DCALeg.pyramid_id == models.Pyramid.id
+    ).filter(models.DCALeg.id.in_(leg_ids)).distinct()}
+    still_open = {group_id for group_id, in db.query(models.Pyramid.position_group_id).join(
+        models.DCALeg, models.DCALeg.pyramid_id == models.Pyramid.id
+    ).filter(
+        models.Pyramid.position_group_id.in_(group_ids),
+        models.FILLED_LEG,
+    ).distinct()}
+    finished = db.query(models.PositionGroup).filter(
+        models.PositionGroup.id.in_(group_ids - still_open),
+        models.PositionGroup.status == "Live",
+    ).all()
+    if not finished:
+        return []
+    groups = {pg.id: pg for pg in finished}
+    resting = {}
+    for leg_id, group_id, order_id in db.query(models.DCALeg.id, models.Pyramid.position_group_id, models.DCALeg.order_id).join(
+        models.Pyramid, models.DCALeg.pyramid_id == models.Pyramid.id
+    ).filter(
+        models.Pyramid.position_group_id.in_(list(groups)),
+        models.DCALeg.status == "Pending",
+    ):
+        if order_id is not None:
+            resting.setdefault(group_id, []).append(order_id)
+        event_bus.stage(db, groups[group_id].owner_id, "leg", leg_id, {"id": leg_id, "position_group_id": group_id, "status": "Cancelled"})
+    # The legs' resting orders are cancelled on the exchange once the caller has committed
+    for group_id, order_ids in resting.items():
+        order_executor.cancel_after_commit(db, groups[group_id].owner_id, groups[group_id].pair, order_ids)
+    db.query(models.DCALeg).filter(
+        models.DCALeg.pyramid_id.in_(
+            db.query(models.Pyramid.id).filter(models.Pyramid.position_group_id.in_([pg.id for pg in finished]))
+        ),
+        models.DCALeg.status == "Pending",
+    ).update({"status": "Cancelled"}, synchronize_session=False)
+    closed_at = datetime.now(timezone.utc)
+    for pg in finished:
+        dashboard_metrics.record_group_change(db, pg.owner_id, True, pg.unrealized_pnl_usd, False, None)
+        pg.status = "Closed"
+        pg.closed_at = closed_at
+        _stage_position(db, pg)
+    db.flush()
+    risk_engine.book.remove([pg.id for pg in finished])
+    return finished
+
 # Pyramid CRUD
 def create_pyramid(db: Session, pyramid: schemas.PyramidCreate):
     db_pyramid = models.Pyramid(**pyramid.dict())
@@ -101,6 +282,22 @@ def create_pyramid(db: Session, pyramid: schemas.PyramidCreate):
     db.refresh(db_pyramid)
     return db_pyramid
 
+def create_pyramid_with_legs(db: Session, pyramid: schemas.PyramidCreate, dca_config: list[dict]):
+    # Part of the caller's unit of work: flush for the pyramid id, bulk-insert the legs, leave the commit to the caller
+    db_pyramid = models.Pyramid(**pyramid.dict())
+    db.add(db_pyramid)
+    db.flush()
+    db.execute(insert(models.DCALeg), [
+        {
+            "pyramid_id": db_pyramid.id,
+            "price_gap": leg_config["price_gap"],
+            "capital_weight": leg_config["capital_weight"],
+            "tp_target": leg_config["tp_target"],
+        }
+        for leg_config in dca_config
+    ])
+    return db_pyramid
+
 # DCA Leg CRUD
 def create_dca_leg(db: Session, dca_leg: schemas.DCALegCreate):
     db_dca_leg = models.DCALeg(**dca_leg.dict())
@@ -115,17 +312,34 @@ def update_dca_leg(db: Session, dca_leg_id: int, dca_leg: schemas.DCALegUpdate):
         update_data = dca_leg.dict(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_dca_leg, key, value)
+        if event_bus.bus.wants(None):
+            position_group = db_dca_leg.pyramid.position_group
+            event_bus.stage(db, position_group.owner_id, "leg", db_dca_leg.id, {
+                "id": db_dca_leg.id,
+                "position_group_id": position_group.id,
+                "status": db_dca_leg.status,
+                "fill_price": db_dca_leg.fill_price,
+            })
         db.commit()
         db.refresh(db_dca_leg)
+        # Keep the in-memory TP trigger index in step with leg fills and closes
+        if db_dca_leg.status == "Filled" and db_dca_leg.fill_price:
+            pair = db_dca_leg.pyramid.position_group.pair
+            tp_index.index.add(db_dca_leg.id, pair, db_dca_leg.fill_price, db_dca_leg.tp_target)
+        else:
+            tp_index.index.remove([db_dca_leg.id])
     return db_dca_leg
 
 # Queued Signal CRUD
-def create_queued_signal(db: Session, queued_signal: schemas.QueuedSignalCreate, user_id: int):
+def create_queued_signal(db: Session, queued_signal: schemas.QueuedSignalCreate, user_id: int, commit: bool = True):
     db_queued_signal = models.QueuedSignal(**queued_signal.dict(), owner_id=user_id)
     db.add(db_queued_signal)
-    db.commit()
-    db.refresh(db_queued_signal)
+    dashboard_metrics.record_queued_signals(db, user_id, 1)
+    _save(db, db_queued_signal, commit)
     return db_queued_signal
 
 def get_queued_signals_by_user(db: Session, user_id: int):
     return db.query(models.QueuedSignal).filter(models.QueuedSignal.owner_id == user_id).all()
+
+def get_queued_signals_by_ids(db: Session, signal_ids: list[int]):
+    return db.query(models.QueuedSignal).filter(models.QueuedSignal.id.in_(signal_ids)).all()
@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import config, event_bus, metrics, models
+from .database import AsyncSessionLocal
+from .logging_config import logger
+
+# Writers call the record_* helpers inside their own transaction, so the snapshot commits
+# (or rolls back) together with the change it describes
+PNL_TOLERANCE = 1e-6
+# Snapshot columns recomputed from the source tables by reconcile
+COUNTERS = ("active_position_groups", "queued_signals", "unrealized_pnl_usd")
+
+Snapshot = models.DashboardMetrics
+
+
+def _apply(db: Session, owner_id: int, values: dict):
+    updated = db.query(Snapshot).filter(Snapshot.owner_id == owner_id).update(values, synchronize_session=False)
+    if not updated:
+        # No snapshot yet: build it from the source tables, which already include the pending change
+        # to the counters, then set the values reconcile does not derive (the last webhook time)
+        db.flush()
+        snapshot = reconcile_user(db, owner_id)
+        for column, value in values.items():
+            if column.key not in COUNTERS:
+                setattr(snapshot, column.key, value)
+    # Clients re-read the snapshot (a primary-key lookup) when told it changed
+    event_bus.stage(db, owner_id, "dashboard", owner_id, {"owner_id": owner_id})
+
+
+def record_group_change(db: Session, owner_id: int, was_live: bool, old_pnl, is_live: bool, new_pnl):
+    values = {}
+    if was_live != is_live:
+        values[Snapshot.active_position_groups] = Snapshot.active_position_groups + (1 if is_live else -1)
+    pnl_delta = ((new_pnl or 0.0) if is_live else 0.0) - ((old_pnl or 0.0) if was_live else 0.0)
+    if pnl_delta:
+        values[Snapshot.unrealized_pnl_usd] = Snapshot.unrealized_pnl_usd + pnl_delta
+    if values:
+        _apply(db, owner_id, values)
+
+
+def record_pnl_deltas(db: Session, deltas: dict):
+    # deltas: owner_id -> change in unrealized PnL of their Live groups
+    for owner_id, delta in deltas.items():
+        if delta:
+            _apply(db, owner_id, {Snapshot.unrealized_pnl_usd: Snapshot.unrealized_pnl_usd + delta})
+
+
+def record_queued_signals(db: Session, owner_id: int, delta: int):
+    _apply(db, owner_id, {Snapshot.queued_signals: Snapshot.queued_signals + delta})
+
+
+def record_webhook(db: Session, owner_id: int, received_at: datetime | None = None):
+    _apply(db, owner_id, {Snapshot.last_webhook_at: received_at or datetime.now(timezone.utc)})
+
+
+def compute(db: Session, owner_ids: list[int]) -> dict:
+    # Recomputes the counters from the source tables with two grouped aggregates
+    values = {owner_id: {"active_position_groups": 0, "queued_signals": 0, "unrealized_pnl_usd": 0.0} for owner_id in owner_ids}
+    groups = db.query(
+        models.PositionGroup.owner_id,
+        func.count(models.PositionGroup.id),
+        func.coalesce(func.sum(models.PositionGroup.unrealized_pnl_usd), 0.0),
+    ).filter(
+        models.PositionGroup.owner_id.in_(owner_ids),
+        models.PositionGroup.status == "Live",
+    ).group_by(models.PositionGroup.owner_id)
+    for owner_id, active, pnl in groups:
+        values[owner_id]["active_position_groups"] = active
+        values[owner_id]["unrealized_pnl_usd"] = float(pnl)
+    queued = db.query(models.QueuedSignal.owner_id, func.count(models.QueuedSignal.id)).filter(
+        models.QueuedSignal.owner_id.in_(owner_ids),
+        models.QueuedSignal.status == "Queued",
+    ).group_by(models.QueuedSignal.owner_id)
+    for owner_id, count in queued:
+        values[owner_id]["queued_signals"] = count
+    return values
+
+
+def _drifted(snapshot: Snapshot, expected: dict) -> bool:
+    return (
+        snapshot.active_position_groups != expected["active_position_groups"]
+        or snapshot.queued_signals != expected["queued_signals"]
+        or abs(snapshot.unrealized_pnl_usd - expected["unrealized_pnl_usd"]) > PNL_TOLERANCE
+    )
+
+
+def reconcile_user(db: Session, owner_id: int) -> Snapshot:
+    return reconcile(db, [owner_id])[owner_id]
+
+
+def reconcile(db: Session, owner_ids: list[int] | None = None) -> dict:
+    # Overwrites drifted snapshots with the recomputed values; the caller commits
+    if owner_ids is None:
+        owner_ids = [user_id for user_id, in db.query(models.User.id)]
+    # Snapshot rows are locked before the source tables are read: a writer's increment either
+    # commits first (and is counted) or waits for this transaction, so none is overwritten
+    snapshots = {
+        s.owner_id: s
+        for s in db.query(Snapshot).filter(Snapshot.owner_id.in_(owner_ids)).order_by(Snapshot.owner_id).with_for_update().populate_existing()
+    }
+    expected = compute(db, owner_ids)
+    now = datetime.now(timezone.utc)
+    for owner_id in owner_ids:
+        snapshot = snapshots.get(owner_id)
+        if snapshot is None:
+            snapshot = Snapshot(owner_id=owner_id, **expected[owner_id])
+            db.add(snapshot)
+            snapshots[owner_id] = snapshot
+        elif _drifted(snapshot, expected[owner_id]):
+            logger.warning(f"Dashboard metrics for user {owner_id} drifted, resetting to {expected[owner_id]}")
+            metrics.increment("dashboard_metrics.drift")
+            for key, value in expected[owner_id].items():
+                setattr(snapshot, key, value)
+        snapshot.reconciled_at = now
+    db.flush()
+    return snapshots
+
+
+def get_snapshot(db: Session, owner_id: int) -> Snapshot:
+    snapshot = db.get(Snapshot, owner_id)
+    if snapshot is None:
+        snapshot = reconcile_user(db, owner_id)
+        db.commit()
+    return snapshot
+
+
+def _reconcile_all(db: Session):
+    reconcile(db)
+    db.commit()
+
+
+async def reconcile_task():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(_reconcile_all)
+        except Exception:
+            logger.exception("Dashboard metrics reconciliation failed")
+        await asyncio.sleep(config.DASHBOARD_RECONCILE_SECONDS)
@@ -1,4 +1,7 @@
+import os
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -6,7 +9,29 @@ from . import config
 
 SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+# Request handlers and background loops share this pool without blocking the event loop
+async_engine = create_async_engine(
+    config.ASYNC_DATABASE_URL,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+MIGRATIONS_CONFIG = os.path.join(os.path.dirname(__file__), "alembic.ini")
+
+def run_migrations():
+    # Brings the schema up to the latest Alembic revision
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_config = Config(MIGRATIONS_CONFIG)
+    alembic_config.attributes["configure_logger"] = False
+    command.upgrade(alembic_config, "head")
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import config
+
+TOPICS = ("position", "leg", "queue", "webhook_log", "risk", "dashboard")
+HEARTBEAT_SECONDS = 30
+
+# Events staged on a session are delivered after its commit and dropped on rollback
+_PENDING_KEY = "event_bus.pending"
+
+
+class Subscription:
+    # Pending events of one connection keyed by (topic, key). A newer event for a pending key is
+    # merged into it, so a slow client gets the latest state instead of every intermediate step
+    # and publishing never waits on a client. Past max_pending keys the buffer is dropped and
+    # the client is told to resync from the REST endpoints.
+
+    def __init__(self, owner_id: int, topics: set, max_pending: int, loop: asyncio.AbstractEventLoop):
+        self.owner_id = owner_id
+        self.topics = topics
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._overflowed = False
+        self._ready = asyncio.Event()
+        self._loop = loop
+        self._lock = threading.Lock()
+
+    def push(self, topic: str, key, data: dict):
+        with self._lock:
+            if self._overflowed:
+                return
+            previous = self._pending.pop((topic, key), None)
+            self._pending[(topic, key)] = {**previous, **data} if previous else data
+            if len(self._pending) > self.max_pending:
+                self._pending.clear()
+                self._overflowed = True
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # The connection's loop is gone; the subscription is about to be dropped
+            pass
+
+    async def next_batch(self) -> list[dict]:
+        while True:
+            await self._ready.wait()
+            with self._lock:
+                self._ready.clear()
+                if self._overflowed:
+                    self._overflowed = False
+                    return [{"topic": "resync"}]
+                batch = [{"topic": topic, "key": key, "data": data} for (topic, key), data in self._pending.items()]
+                self._pending.clear()
+            if batch:
+                return batch
+
+
+class EventBus:
+    # In-process fan-out of engine events to the connections of each owner. Events without an
+    # owner (webhook logs) go to every connection.
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, owner_id: int, topics: set) -> Subscription:
+        subscription = Subscription(owner_id, topics, self.max_pending, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(owner_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.owner_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.owner_id, None)
+
+    def wants(self, owner_id: int | None) -> bool:
+        # Lets publishers skip building payloads nobody is listening for
+        return bool(self._subscriptions) if owner_id is None else owner_id in self._subscriptions
+
+    def publish(self, owner_id: int | None, topic: str, key, data: dict):
+        with self._lock:
+            if owner_id is None:
+                subscriptions = [s for owner_subscriptions in self._subscriptions.values() for s in owner_subscriptions]
+            else:
+                subscriptions = list(self._subscriptions.get(owner_id, ()))
+        for subscription in subscriptions:
+            if topic in subscription.topics:
+                subscription.push(topic, key, data)
+
+
+bus = EventBus(config.EVENT_STREAM_MAX_PENDING)
+
+
+def stage(db: Session, owner_id: int | None, topic: str, key, data: dict):
+    if bus.wants(owner_id):
+        db.info.setdefault(_PENDING_KEY, []).append((owner_id, topic, key, data))
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver(session: Session):
+    for owner_id, topic, key, data in session.info.pop(_PENDING_KEY, ()):
+        bus.publish(owner_id, topic, key, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session: Session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+import ccxt
+from ccxt.base import errors
+
+from . import config, mock_exchange
+from .logging_config import logger
+
+# One ccxt client per exchange, shared by the whole process
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Precision rules indexed by (exchange, symbol), swapped wholesale on refresh
+_precision_rules = {}
+_markets_loaded_at = {}
+_markets_lock = threading.Lock()
+
+
+def get_client(exchange_name: str):
+    name = exchange_name.lower()
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                if name == mock_exchange.NAME:
+                    client = mock_exchange.SyncMockExchange(market=mock_exchange.shared_market())
+                else:
+                    exchange_class = getattr(ccxt, name, None)
+                    if not isinstance(exchange_class, type):
+                        # An ExchangeError, so signals naming an unknown exchange are rejected rather than retried
+                        raise errors.NotSupported(f"Unknown exchange {exchange_name}")
+                    client = exchange_class({"enableRateLimit": True})
+                _clients[name] = client
+    return client
+
+
+def load_markets(exchange_name: str, reload: bool = False):
+    global _precision_rules
+    name = exchange_name.lower()
+    with _markets_lock:
+        if not reload and name in _markets_loaded_at:
+            return
+        markets = get_client(name).load_markets(reload=reload)
+        rules = {key: value for key, value in _precision_rules.items() if key[0] != name}
+        for symbol, market in markets.items():
+            rules[(name, symbol)] = {
+                "price": market["precision"]["price"],
+                "amount": market["precision"]["amount"],
+            }
+        _precision_rules = rules
+        _markets_loaded_at[name] = time.monotonic()
+    logger.info(f"Loaded {len(markets)} markets for {name}")
+
+
+def get_precision_rules(exchange_name: str, symbol: str):
+    name = exchange_name.lower()
+    if name not in _markets_loaded_at:
+        load_markets(name)
+    return _precision_rules.get((name, symbol))
+
+
+async def refresh_markets_task():
+    while True:
+        await asyncio.sleep(min(config.MARKETS_REFRESH_SECONDS, 60))
+        for name, loaded_at in list(_markets_loaded_at.items()):
+            if time.monotonic() - loaded_at < config.MARKETS_REFRESH_SECONDS:
+                continue
+            try:
+                await asyncio.to_thread(load_markets, name, True)
+            except (errors.ExchangeError, errors.NetworkError) as e:
+                # Keep serving the previous snapshot until the next refresh succeeds
+                logger.warning(f"Failed to refresh markets for {name}: {e}")
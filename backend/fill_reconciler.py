@@ -0,0 +1,222 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import config, event_bus, metrics, models, order_executor, tp_index
+from .database import AsyncSessionLocal
+from .logging_config import logger
+
+# Trades requested per account and symbol in one cycle; a full page is continued next cycle
+TRADES_PAGE_LIMIT = 1000
+
+
+def _to_ms(value: datetime) -> int:
+    # SQLite hands back naive UTC timestamps
+    return int((value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp() * 1000)
+
+
+def _oldest_order_ms(orders: dict) -> int | None:
+    # Without a cursor, trades before the oldest resting leg cannot belong to any of them
+    created = [_to_ms(leg["created_at"]) for leg in orders.values() if leg["created_at"]]
+    return min(created) if created else None
+
+
+def load_accounts(db: Session, exchange_name: str) -> list[dict]:
+    # Every leg with a resting order, grouped by the exchange account that placed it and the
+    # symbol, with the trade cursor to resume from
+    rows = db.query(
+        models.DCALeg.id, models.DCALeg.order_id, models.DCALeg.created_at,
+        models.PositionGroup.id, models.PositionGroup.owner_id, models.PositionGroup.pair,
+    ).join(models.Pyramid, models.DCALeg.pyramid_id == models.Pyramid.id).join(
+        models.PositionGroup, models.Pyramid.position_group_id == models.PositionGroup.id
+    ).filter(
+        models.RESTING_LEG,
+        models.DCALeg.order_id.isnot(None),
+    )
+    legs = defaultdict(lambda: defaultdict(dict))
+    for leg_id, order_id, created_at, group_id, owner_id, pair in rows:
+        legs[owner_id][pair][order_id] = {"id": leg_id, "position_group_id": group_id, "created_at": created_at}
+
+    accounts = []
+    for owner_id, pairs in legs.items():
+        api_key = order_executor.select_api_key(db, owner_id, exchange_name)
+        if api_key is None:
+            continue
+        cursors = {
+            cursor.symbol: cursor.since
+            for cursor in db.query(models.FillCursor).filter(
+                models.FillCursor.api_key_id == api_key.id,
+                models.FillCursor.exchange == exchange_name,
+            )
+        }
+        accounts.append({
+            "owner_id": owner_id,
+            "api_key": (api_key.id, api_key.encrypted_key),
+            "symbols": {
+                pair: {
+                    "since": cursors[pair] if pair in cursors else _oldest_order_ms(orders),
+                    "orders": orders,
+                }
+                for pair, orders in pairs.items()
+            },
+        })
+    return accounts
+
+
+def match_fills(orders: dict, trades: list[dict], open_order_ids: set, since: int | None) -> tuple[list[dict], int | None]:
+    # Trades are summed per order; an order that is no longer open is filled at its average price.
+    # The cursor stays at the first trade of an order that is still partly open, so its earlier
+    # trades are seen again once it completes, unless a full page forces it forward.
+    executed = {}
+    for trade in trades:
+        order_id = str(trade.get("order"))
+        if order_id not in orders:
+            continue
+        amount = trade["amount"] or 0.0
+        cost = trade.get("cost") or (trade["price"] or 0.0) * amount
+        total = executed.setdefault(order_id, {"amount": 0.0, "cost": 0.0, "first": trade["timestamp"], "last": trade["timestamp"]})
+        total["amount"] += amount
+        total["cost"] += cost
+        total["first"] = min(total["first"], trade["timestamp"])
+        total["last"] = max(total["last"], trade["timestamp"])
+
+    fills = []
+    for order_id, total in executed.items():
+        if order_id in open_order_ids or not total["amount"]:
+            continue
+        leg = orders[order_id]
+        fills.append({
+            "id": leg["id"],
+            "position_group_id": leg["position_group_id"],
+            "fill_price": total["cost"] / total["amount"],
+            "filled_at": datetime.fromtimestamp(total["last"] / 1000, tz=timezone.utc),
+        })
+
+    if not trades:
+        return fills, since
+    # Resuming at the last timestamp re-reads its trades; legs they filled are no longer Pending
+    cursor = max(trade["timestamp"] for trade in trades)
+    if len(trades) < TRADES_PAGE_LIMIT:
+        partial = [total["first"] for order_id, total in executed.items() if order_id in open_order_ids]
+        cursor = min([cursor, *partial])
+    return fills, cursor
+
+
+async def reconcile_account(account: dict, exchange_name: str, testnet: bool) -> tuple[list[dict], dict]:
+    # Two calls per symbol regardless of how many orders rest on it, all within the account's budget
+    session = await order_executor.executor.sessions.get(*account["api_key"], exchange_name, testnet)
+    symbols = list(account["symbols"])
+    responses = await asyncio.gather(*(
+        asyncio.gather(
+            session.call("fetch_my_trades", symbol, account["symbols"][symbol]["since"], TRADES_PAGE_LIMIT),
+            session.call("fetch_open_orders", symbol),
+        )
+        for symbol in symbols
+    ))
+    fills, cursors = [], {}
+    for symbol, (trades, open_orders) in zip(symbols, responses):
+        state = account["symbols"][symbol]
+        symbol_fills, cursor = match_fills(state["orders"], trades, {str(order["id"]) for order in open_orders}, state["since"])
+        fills += [{**fill, "owner_id": account["owner_id"]} for fill in symbol_fills]
+        if cursor is not None and cursor != state["since"]:
+            cursors[symbol] = cursor
+    return fills, cursors
+
+
+def apply_fills(db: Session, exchange_name: str, fills: list[dict], cursors: dict) -> list[dict]:
+    # One bulk UPDATE for every leg filled this cycle, committed together with the advanced cursors.
+    # Legs that left Pending in the meantime (e.g. cancelled) are not touched.
+    if fills:
+        pending = {leg_id for leg_id, in db.query(models.DCALeg.id).filter(
+            models.DCALeg.id.in_([fill["id"] for fill in fills]),
+            models.DCALeg.status == "Pending",
+        )}
+        fills = [fill for fill in fills if fill["id"] in pending]
+    if fills:
+        db.execute(update(models.DCALeg), [
+            {"id": fill["id"], "status": "Filled", "fill_price": fill["fill_price"], "filled_at": fill["filled_at"]}
+            for fill in fills
+        ])
+        for fill in fills:
+            event_bus.stage(db, fill["owner_id"], "leg", fill["id"], {
+                "id": fill["id"],
+                "position_group_id": fill["position_group_id"],
+                "status": "Filled",
+                "fill_price": fill["fill_price"],
+            })
+
+    if cursors:
+        existing = {
+            (cursor.api_key_id, cursor.symbol): cursor
+            for cursor in db.query(models.FillCursor).filter(
+                models.FillCursor.api_key_id.in_({api_key_id for api_key_id, _ in cursors}),
+                models.FillCursor.exchange == exchange_name,
+            )
+        }
+        for (api_key_id, symbol), since in cursors.items():
+            cursor = existing.get((api_key_id, symbol))
+            if cursor is None:
+                db.add(models.FillCursor(api_key_id=api_key_id, exchange=exchange_name, symbol=symbol, since=since))
+            else:
+                cursor.since = since
+    db.commit()
+
+    if fills:
+        # Filled legs are now watched for take-profit
+        targets = dict(db.query(models.DCALeg.id, models.DCALeg.tp_target).filter(
+            models.DCALeg.id.in_([fill["id"] for fill in fills])
+        ))
+        pairs = dict(db.query(models.PositionGroup.id, models.PositionGroup.pair).filter(
+            models.PositionGroup.id.in_({fill["position_group_id"] for fill in fills})
+        ))
+        for fill in fills:
+            tp_index.index.add(fill["id"], pairs[fill["position_group_id"]], fill["fill_price"], targets[fill["id"]])
+    return fills
+
+
+async def reconcile_fills() -> dict:
+    exchange_name, testnet = order_executor.exchange_settings()
+    async with AsyncSessionLocal() as db:
+        accounts = await db.run_sync(load_accounts, exchange_name)
+    results = await asyncio.gather(
+        *(reconcile_account(account, exchange_name, testnet) for account in accounts),
+        return_exceptions=True,
+    )
+    fills, cursors, failed = [], {}, 0
+    for account, result in zip(accounts, results):
+        if isinstance(result, Exception):
+            # The account is retried next cycle from its unchanged cursors
+            logger.warning(f"Fill reconciliation failed for API key {account['api_key'][0]}: {result}")
+            failed += 1
+            continue
+        account_fills, account_cursors = result
+        fills += account_fills
+        cursors.update({(account["api_key"][0], symbol): since for symbol, since in account_cursors.items()})
+    async with AsyncSessionLocal() as db:
+        applied = await db.run_sync(apply_fills, exchange_name, fills, cursors)
+    for fill in applied:
+        logger.info(f"DCALeg {fill['id']} filled at {fill['fill_price']}")
+    return {
+        "accounts": len(accounts),
+        "accounts_failed": failed,
+        "symbols": sum(len(account["symbols"]) for account in accounts),
+        "legs_filled": len(applied),
+    }
+
+
+async def reconcile_task():
+    # Only orders placed by the order executor can fill
+    if not config.ORDER_EXECUTION:
+        return
+    while True:
+        await asyncio.sleep(config.FILL_RECONCILE_SECONDS)
+        try:
+            started = time.perf_counter()
+            stats = await reconcile_fills()
+            metrics.record_cycle("fill_reconcile", time.perf_counter() - started, **stats)
+        except Exception:
+            logger.exception("Fill reconciliation failed")
@@ -0,0 +1,96 @@
+import asyncio
+import os
+from pathlib import Path
+
+BLOCK_SIZE = 64 * 1024
+FOLLOW_POLL_SECONDS = 0.5
+
+
+def rotated_files(path: str) -> list[str]:
+    # TimedRotatingFileHandler renames old logs to <name>.<date>; newest first
+    log_path = Path(path)
+    return sorted(
+        (p.name for p in log_path.parent.glob(f"{log_path.name}.*") if p.is_file()),
+        reverse=True,
+    )
+
+
+def resolve_log_file(path: str, name: str | None) -> str:
+    # Only the live log and its rotations can be read
+    if name is None or name == Path(path).name:
+        return path
+    if name not in rotated_files(path):
+        raise FileNotFoundError(name)
+    return str(Path(path).parent / name)
+
+
+def read_tail(path: str, lines: int, before: int | None = None) -> dict:
+    # Reads the last `lines` lines ending at byte offset `before` (end of file by default) by
+    # seeking backwards in blocks, so memory stays proportional to the lines returned
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if before is None else max(0, min(before, size))
+        position = end
+        buffer = b""
+        while position > 0 and buffer.count(b"\n") <= lines:
+            read_size = min(BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            buffer = f.read(read_size) + buffer
+
+    chunk = buffer.splitlines(keepends=True)
+    if position > 0 and chunk:
+        # The first line in the buffer started before the block we read
+        chunk = chunk[1:]
+    selected = chunk[-lines:] if lines else []
+    start = end - sum(len(line) for line in selected)
+    return {
+        "logs": [line.decode("utf-8", errors="replace") for line in selected],
+        "start_offset": start,
+        "end_offset": end,
+        "size": size,
+    }
+
+
+async def follow(path: str, offset: int | None = None):
+    # Yields (line, byte offset after the line) as lines are appended, reopening the file when it is rotated.
+    # Reads happen in BLOCK_SIZE blocks on a worker thread so a large backlog neither loads at once
+    # nor blocks the event loop
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        if offset is None:
+            f.seek(0, os.SEEK_END)
+        else:
+            f.seek(offset)
+        position = f.tell()
+        partial = b""
+        while True:
+            data = await asyncio.to_thread(f.read, BLOCK_SIZE)
+            if data:
+                *complete, partial = (partial + data).split(b"\n")
+                for line in complete:
+                    position += len(line) + 1
+                    yield line.decode("utf-8", errors="replace"), position
+                await asyncio.sleep(0)
+                continue
+            await asyncio.sleep(FOLLOW_POLL_SECONDS)
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if current.st_ino != os.fstat(f.fileno()).st_ino or current.st_size < f.tell():
+                if current.st_ino != os.fstat(f.fileno()).st_ino:
+                    # Lines written to the old file after the last read, before it was rotated
+                    while data := await asyncio.to_thread(f.read, BLOCK_SIZE):
+                        *complete, partial = (partial + data).split(b"\n")
+                        for line in complete:
+                            position += len(line) + 1
+                            yield line.decode("utf-8", errors="replace"), position
+                    if partial:
+                        yield partial.decode("utf-8", errors="replace"), position + len(partial)
+                f.close()
+                f = await asyncio.to_thread(open, path, "rb")
+                position = 0
+                partial = b""
+    finally:
+        f.close()
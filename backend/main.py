@@ -1,34 +1,59 @@
+import json
+import os
 from jose import JWTError, jwt
 from datetime import timedelta, datetime
-from typing import List
+from typing import List, Optional
 
-from .logging_config import logger
+from .logging_config import LOG_FILE_PATH, logger
 
-from fastapi import Depends, FastAPI, HTTPException, status, Request, Header
+from fastapi import Depends, FastAPI, HTTPException, status, Request, Response, Header, Query, WebSocket, WebSocketDisconnect
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from . import crud, models, schemas, security, utils, config, config_manager
-from .database import SessionLocal, engine
+from . import crud, models, schemas, security, config, config_manager, exchange_registry, metrics, user_cache, log_tail, dashboard_metrics, pnl_history
+from .database import AsyncSessionLocal, SessionLocal, async_engine, run_migrations
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
 import redis.asyncio as redis
 
-models.Base.metadata.create_all(bind=engine)
+run_migrations()
 
 app = FastAPI()
 
-from . import tasks
+from . import tasks, tp_index, price_feed, signal_queue, queue_engine, signal_processor, risk_engine, offset_planner, event_bus, order_executor, fill_reconciler
 import asyncio
 
 @app.on_event("startup")
 async def startup():
     r = redis.from_url(config.REDIS_URL, encoding="utf-8", decode_responses=True)
     await FastAPILimiter.init(r)
+    # Validated once here; later reads come from the in-memory snapshot
+    config_manager.get_snapshot()
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(tp_index.index.rebuild)
+        await db.run_sync(queue_engine.engine.rebuild)
+        await db.run_sync(risk_engine.book.rebuild)
     asyncio.create_task(tasks.check_take_profits())
     asyncio.create_task(tasks.run_risk_engine_task())
+    asyncio.create_task(exchange_registry.refresh_markets_task())
+    asyncio.create_task(dashboard_metrics.reconcile_task())
+    asyncio.create_task(pnl_history.downsample_task())
+    asyncio.create_task(config_manager.watch_task())
+    asyncio.create_task(config_manager.broadcast_task())
+    asyncio.create_task(fill_reconciler.reconcile_task())
+    signal_queue.start_workers()
+    order_executor.executor.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await price_feed.feed.close()
+    await order_executor.executor.close()
+    await signal_queue.redis_client.aclose()
+    await async_engine.dispose()
 
 origins = [
     "http://localhost:5173",
@@ -69,9 +94,14 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_username(db, username=token_data.username)
+    # Cache hits never touch the database; the session above is only opened on a miss
+    user = user_cache.cache.get(token_data.username)
     if user is None:
-        raise credentials_exception
+        db_user = crud.get_user_by_username(db, username=token_data.username)
+        if db_user is None:
+            raise credentials_exception
+        user = schemas.AuthenticatedUser.model_validate(db_user)
+        user_cache.cache.set(token_data.username, user, payload.get("exp"))
     return user
 
 
@@ -111,13 +141,13 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/users/me/", response_model=schemas.User)
-def read_users_me(current_user: schemas.User = Depends(get_current_user)):
-    return current_user
+def read_users_me(current_user: schemas.AuthenticatedUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    return crud.get_user_by_username(db, username=current_user.username)
 
 @app.post("/api-keys/", response_model=schemas.ApiKey)
 def create_api_key_for_user(
     api_key: schemas.ApiKeyCreate,
-    current_user: schemas.User = Depends(get_current_user),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     db_api_key = crud.create_user_api_key(db=db, api_key=api_key, user_id=current_user.id)
@@ -128,7 +158,7 @@ def create_api_key_for_user(
 
 @app.get("/api-keys/", response_model=List[schemas.ApiKey])
 def read_api_keys_for_user(
-    current_user: schemas.User = Depends(get_current_user),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     return crud.get_user_api_keys(db=db, user_id=current_user.id)
@@ -136,7 +166,7 @@ def read_api_keys_for_user(
 @app.delete("/api-keys/{api_key_id}", response_model=schemas.ApiKey)
 def delete_api_key_for_user(
     api_key_id: int,
-    current_user: schemas.User = Depends(get_current_user),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     db_api_key = crud.delete_api_key(db=db, api_key_id=api_key_id, user_id=current_user.id)
@@ -148,7 +178,7 @@ def delete_api_key_for_user(
 def update_api_key_for_user(
     api_key_id: int,
     api_key: schemas.ApiKeyUpdate,
-    current_user: schemas.User = Depends(get_current_user),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     db_api_key = crud.update_api_key(db=db, api_key_id=api_key_id, name=api_key.name, user_id=current_user.id)
@@ -160,45 +190,22 @@ def update_api_key_for_user(
 @app.get("/api-keys/check-name/")
 def check_api_key_name_exists(
     name: str,
-    current_user: schemas.User = Depends(get_current_user),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     existing_key = crud.get_user_api_key_by_name(db, name, current_user.id)
     return {"exists": existing_key is not None}
 
 
-webhook_logs = []
-
-def process_queue(db: Session, user_id: int):
-    # Simple FIFO for now
-    # TODO: Implement priority logic
-    queued_signal = db.query(models.QueuedSignal).filter(
-        models.QueuedSignal.owner_id == user_id,
-        models.QueuedSignal.status == "Queued"
-    ).order_by(models.QueuedSignal.created_at).first()
-
-    if queued_signal:
-        logger.info(f"Processing queued signal {queued_signal.id}")
-        # TODO: Dequeue and create a new PositionGroup from the queued signal
-        # This will involve re-running the webhook logic for the queued payload
-        queued_signal.status = "Processed"
-        db.commit()
-
-@app.post("/webhooks/")
+@app.post("/webhooks/", status_code=status.HTTP_202_ACCEPTED)
 async def receive_webhook(
     request: Request,
-    db: Session = Depends(get_db),
     limiter: RateLimiter = Depends(RateLimiter(times=2, seconds=5)),
     x_signature: str = Header(None),
-    current_user: schemas.User = Depends(get_current_user),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
 ):
-    # ... (webhook processing logic) ...
-
-    # Example of how to call process_queue when a position is closed
-    # This would be called from the take-profit task or an exit signal
-    # if position_group.status == "Closed":
-    #     process_queue(db, current_user.id)
-
+    # Fast path: verify, append to the durable queue and acknowledge. The signal workers
+    # run the position/pyramid/DCA logic in order per (owner, pair, timeframe).
     if not x_signature:
         raise HTTPException(status_code=401, detail="X-Signature header missing")
 
@@ -207,146 +214,60 @@ async def receive_webhook(
     if not security.verify_webhook_signature(raw_payload, x_signature, config.WEBHOOK_SECRET):
         raise HTTPException(status_code=401, detail="Invalid X-Signature")
 
-    payload = await request.json()
-    logger.info(f"Received webhook payload: {payload}")
-    status_message = "Webhook received and validated"
-    status_code = 200
-
-    exchange_name = payload.get("tv.exchange", "binance") # Default to binance for now
-    symbol = payload.get("tv.symbol", "BTC/USDT") # Default to BTC/USDT for now
-
-    precision_rules = utils.get_precision_rules(exchange_name, symbol)
-
-    if not precision_rules:
-        status_message = f"Could not fetch precision rules for {exchange_name} and {symbol}"
-        status_code = 400
-    else:
-        if "trade_price" in payload and not utils.validate_precision(payload["trade_price"], precision_rules["price"]):
-            status_message = "Invalid precision for trade_price"
-            status_code = 400
-        
-        if "trade_quantity" in payload and not utils.validate_precision(payload["trade_quantity"], precision_rules["amount"]):
-            status_message = "Invalid precision for trade_quantity"
-            status_code = 400
-
-    crud.create_webhook_log(db, payload, status_message)
-
-    if status_code != 200:
-        raise HTTPException(status_code=status_code, detail=status_message)
-
-    # Milestone 2 Logic: Position and Pyramid Handling
-    pair = payload.get("tv.symbol")
-    timeframe = payload.get("tv.timeframe")
-    entry_price = payload.get("tv.entry_price")
-
-    if not all([pair, timeframe, entry_price]):
-        raise HTTPException(status_code=400, detail="Missing required fields in webhook payload")
-
-    # Check for existing PositionGroup
-    position_group = db.query(models.PositionGroup).filter(
-        models.PositionGroup.pair == pair,
-        models.PositionGroup.timeframe == timeframe,
-        models.PositionGroup.owner_id == current_user.id,
-        models.PositionGroup.status != "Closed"
-    ).first()
-
-    if not position_group:
-        # Check execution pool
-        # TODO: Get max_open_groups from config
-        max_open_groups = 10 
-        open_groups_count = db.query(models.PositionGroup).filter(
-            models.PositionGroup.owner_id == current_user.id,
-            models.PositionGroup.status == "Live"
-        ).count()
-
-        if open_groups_count >= max_open_groups:
-            logger.info(f"Execution pool is full. Queuing signal for {pair} {timeframe}")
-            queued_signal_schema = schemas.QueuedSignalCreate(
-                pair=pair,
-                timeframe=timeframe,
-                payload=payload
-            )
-            crud.create_queued_signal(db, queued_signal_schema, current_user.id)
-            return {"message": "Signal queued due to full execution pool"}
-
-        # Create a new PositionGroup
-        logger.info(f"Creating new PositionGroup for {pair} {timeframe}")
-        position_group_schema = schemas.PositionGroupCreate(pair=pair, timeframe=timeframe, status="Live")
-        position_group = crud.create_position_group(db, position_group_schema, current_user.id)
-    
-    # Create a new Pyramid for this signal
-    logger.info(f"Creating new Pyramid for PositionGroup {position_group.id}")
-    pyramid_schema = schemas.PyramidCreate(position_group_id=position_group.id, entry_price=entry_price)
-    pyramid = crud.create_pyramid(db, pyramid_schema)
-
-    # Calculate and create DCA legs based on a hardcoded config
-    # TODO: Move this to a proper configuration file
-    dca_config = [
-        {"price_gap": 0, "capital_weight": 0.2, "tp_target": 0.01},
-        {"price_gap": -0.005, "capital_weight": 0.2, "tp_target": 0.005},
-        {"price_gap": -0.01, "capital_weight": 0.2, "tp_target": 0.02},
-        {"price_gap": -0.015, "capital_weight": 0.2, "tp_target": 0.015},
-        {"price_gap": -0.02, "capital_weight": 0.2, "tp_target": 0.01},
-    ]
-
-    for leg_config in dca_config:
-        dca_leg_schema = schemas.DCALegCreate(
-            pyramid_id=pyramid.id,
-            price_gap=leg_config["price_gap"],
-            capital_weight=leg_config["capital_weight"],
-            tp_target=leg_config["tp_target"],
-        )
-        crud.create_dca_leg(db, dca_leg_schema)
+    try:
+        payload = json.loads(raw_payload)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook payload is not valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Webhook payload must be a JSON object")
 
-    # TODO: Placeholder for order placement logic
-    logger.info(f"Simulating order placement for Pyramid {pyramid.id}")
+    message_id = await signal_queue.enqueue(raw_payload, payload, current_user.id)
+    logger.info(f"Queued webhook payload as {message_id}: {payload}")
+    return {"message": "Webhook accepted for processing", "id": message_id}
 
-    return {"message": "Webhook processed and position updated"}
+@app.get("/webhooks/queue/")
+async def get_webhook_queue_stats(current_user: schemas.AuthenticatedUser = Depends(get_current_user)):
+    return await signal_queue.get_queue_stats()
 
 @app.get("/config/")
-def get_config(current_user: schemas.User = Depends(get_current_user)):
+def get_config(response: Response, current_user: schemas.AuthenticatedUser = Depends(get_current_user)):
     # For now, config is global, not per-user. User dependency is for auth.
-    return config_manager.load_config()
+    snapshot = config_manager.get_snapshot()
+    response.headers["X-Config-Version"] = str(snapshot.version)
+    return snapshot.as_dict()
 
 @app.post("/config/")
-def update_config(new_config: dict, current_user: schemas.User = Depends(get_current_user)):
+def update_config(new_config: dict, current_user: schemas.AuthenticatedUser = Depends(get_current_user)):
     # For now, config is global, not per-user. User dependency is for auth.
-    config_manager.save_config(new_config)
-    return {"message": "Configuration updated successfully"}
+    try:
+        snapshot = config_manager.save_config(new_config)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    return {"message": "Configuration updated successfully", "version": snapshot.version}
 
 @app.get("/dashboard-metrics/")
-def get_dashboard_metrics(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    # Total Active Position Groups
-    active_position_groups = db.query(models.PositionGroup).filter(
-        models.PositionGroup.owner_id == current_user.id,
-        models.PositionGroup.status == "Live"
-    ).all()
-    total_active_position_groups = len(active_position_groups)
+def get_dashboard_metrics(db: Session = Depends(get_db), current_user: schemas.AuthenticatedUser = Depends(get_current_user)):
+    # Single primary-key read of the incrementally maintained snapshot
+    snapshot = dashboard_metrics.get_snapshot(db, current_user.id)
+    total_active_position_groups = snapshot.active_position_groups
 
     # Execution Pool Usage
-    # TODO: Get max_open_groups from config_manager
-    max_open_groups = 10 # Hardcoded for now
+    max_open_groups = signal_processor.max_open_groups()
     execution_pool_usage = f"{total_active_position_groups} / {max_open_groups}"
 
-    # Queued Signals Count
-    queued_signals_count = db.query(models.QueuedSignal).filter(
-        models.QueuedSignal.owner_id == current_user.id,
-        models.QueuedSignal.status == "Queued"
-    ).count()
+    queued_signals_count = snapshot.queued_signals
 
     # Total PnL (Realized + Unrealized)
-    total_unrealized_pnl_usd = sum(pg.unrealized_pnl_usd for pg in active_position_groups if pg.unrealized_pnl_usd is not None)
+    total_unrealized_pnl_usd = snapshot.unrealized_pnl_usd
     # TODO: Add realized PnL once implemented
     total_pnl_usd = total_unrealized_pnl_usd
     total_pnl_percent = None # TODO: Calculate total PnL percent
 
-    # Last Webhook Timestamp
-    last_webhook_log = db.query(models.WebhookLog).order_by(models.WebhookLog.timestamp.desc()).first()
-    last_webhook_timestamp = last_webhook_log.timestamp.isoformat() if last_webhook_log else "N/A"
+    last_webhook_timestamp = snapshot.last_webhook_at.isoformat() if snapshot.last_webhook_at else "N/A"
 
     # Placeholder for Engine Status Banner, Risk Engine Status, Error & Warning Alerts
     engine_status = "Running"
-    risk_engine_status = "Idle"
+    risk_engine_status = risk_engine.get_status(current_user.id)["state"]
     error_alerts = []
 
     return {
@@ -361,23 +282,178 @@ def get_dashboard_metrics(db: Session = Depends(get_db), current_user: schemas.U
         "error_alerts": error_alerts,
     }
 
-@app.get("/position-groups/", response_model=List[schemas.PositionGroup])
+@app.get("/pnl-history/")
+def get_pnl_history(
+    start: datetime,
+    end: Optional[datetime] = None,
+    position_group_id: Optional[int] = None,
+    points: int = Query(500, ge=10, le=pnl_history.MAX_POINTS),
+    db: Session = Depends(get_db),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
+):
+    # PnL curve of one position group, or of the user's total when no group is given
+    end_timestamp = int(end.timestamp()) if end else int(datetime.now().timestamp())
+    return pnl_history.get_series(db, current_user.id, position_group_id, int(start.timestamp()), end_timestamp, points)
+
+@app.get("/risk-engine/")
+def get_risk_engine_status(
+    top: int = Query(5, ge=1, le=100),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
+):
+    def ranked(rows, by):
+        return [{"position_group_id": group_id, f"unrealized_pnl_{by}": value} for group_id, value in rows]
+
+    return {
+        **risk_engine.get_status(current_user.id),
+        "top_losers": ranked(risk_engine.book.top_losers(current_user.id, top), "percent"),
+        "top_winners": ranked(risk_engine.book.top_winners(current_user.id, top), "percent"),
+        "top_winners_usd": ranked(risk_engine.book.top_winners(current_user.id, top, risk_engine.BY_USD), "usd"),
+    }
+
+@app.get("/risk-engine/offset-plan/")
+def get_offset_plan(
+    position_group_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
+):
+    # Preview of the partial closes that would offset a losing group, the worst loser by default
+    if position_group_id is None:
+        worst = risk_engine.book.worst_loser(current_user.id)
+        if worst is None:
+            raise HTTPException(status_code=404, detail="No losing position groups")
+        position_group_id = worst[0]
+    position_group = db.get(models.PositionGroup, position_group_id)
+    if position_group is None or position_group.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Position group not found")
+    return offset_planner.build_plan(db, position_group)
+
+@app.get("/metrics/")
+def get_engine_metrics(current_user: schemas.AuthenticatedUser = Depends(get_current_user)):
+    return metrics.snapshot()
+
+@app.get("/position-groups/", response_model=schemas.PositionGroupPaginated)
 def read_position_groups_for_user(
-    current_user: schemas.User = Depends(get_current_user),
+    status: Optional[List[str]] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    # Summary pages skip pyramids and legs; fetch them per group from /position-groups/{id}/pyramids/
+    try:
+        page = crud.get_position_groups_by_user(
+            db=db, user_id=current_user.id, statuses=status, limit=limit, cursor=cursor, include_legs=not summary
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    item_schema = schemas.PositionGroupSummary if summary else schemas.PositionGroup
+    return {**page, "position_groups": [item_schema.model_validate(pg) for pg in page["position_groups"]]}
+
+@app.get("/position-groups/{position_group_id}/pyramids/", response_model=List[schemas.Pyramid])
+def read_position_group_pyramids(
+    position_group_id: int,
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    return crud.get_position_groups_by_user(db=db, user_id=current_user.id)
+    position_group = crud.get_position_group(db, position_group_id)
+    if position_group is None or position_group.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Position group not found")
+    return crud.get_pyramids_with_legs(db, position_group_id)
+
+@app.get("/queued-signals/", response_model=List[schemas.QueuedSignal])
+def read_queued_signals_for_user(
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    # Waiting queue in promotion order
+    ranked_ids = queue_engine.engine.ranked(current_user.id)
+    signals = {signal.id: signal for signal in crud.get_queued_signals_by_ids(db, ranked_ids)}
+    return [
+        schemas.QueuedSignal.model_validate(signals[signal_id]).model_copy(update={"priority_rank": rank})
+        for rank, signal_id in enumerate((signal_id for signal_id in ranked_ids if signal_id in signals), start=1)
+    ]
 
 @app.get("/webhooks/logs/", response_model=schemas.WebhookLogPaginated)
-def get_webhook_logs(db: Session = Depends(get_db), skip: int = 0, limit: int = 10):
-    return crud.get_webhook_logs(db, skip=skip, limit=limit)
+def get_webhook_logs(
+    db: Session = Depends(get_db),
+    skip: int = 0,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    try:
+        return crud.get_webhook_logs(db, skip=skip, limit=limit, cursor=cursor, status=status, start=start, end=end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.get("/logs/")
-def get_logs(current_user: schemas.User = Depends(get_current_user)):
-    log_file_path = "ex_engine.log" # Assuming log file is in the root directory
+def get_logs(
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
+    lines: int = Query(500, ge=1, le=10000),
+    before: Optional[int] = Query(None, ge=0),
+    file: Optional[str] = None,
+):
+    # Returns the last `lines` lines; pass start_offset back as `before` to page further back,
+    # then continue into previous_file once the start of this file is reached
     try:
-        with open(log_file_path, 'r') as f:
-            logs = f.readlines()
-        return {"logs": logs}
+        log_file_path = log_tail.resolve_log_file(LOG_FILE_PATH, file)
+        tail = log_tail.read_tail(log_file_path, lines, before)
     except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="Log file not found")
\ No newline at end of file
+        raise HTTPException(status_code=404, detail="Log file not found")
+    rotations = log_tail.rotated_files(LOG_FILE_PATH)
+    current_name = os.path.basename(log_file_path)
+    older = [name for name in rotations if current_name not in rotations or name < current_name]
+    return {**tail, "file": current_name, "previous_file": older[0] if older else None}
+
+@app.get("/logs/stream/")
+async def stream_logs(
+    request: Request,
+    current_user: schemas.AuthenticatedUser = Depends(get_current_user),
+    offset: Optional[int] = Query(None, ge=0),
+):
+    # Server-sent events with new log lines; each event id is the byte offset to resume from
+    if not os.path.exists(LOG_FILE_PATH):
+        raise HTTPException(status_code=404, detail="Log file not found")
+
+    async def events():
+        async for line, position in log_tail.follow(LOG_FILE_PATH, offset):
+            if await request.is_disconnected():
+                break
+            yield f"id: {position}\ndata: {line}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def authenticate_token(token: str) -> schemas.AuthenticatedUser:
+    db = SessionLocal()
+    try:
+        return get_current_user(token, db)
+    finally:
+        db.close()
+
+@app.websocket("/ws/events/")
+async def stream_events(websocket: WebSocket, token: str, topics: Optional[str] = None):
+    # Browsers cannot set headers on a WebSocket, so the access token comes as a query parameter.
+    # Frames are {"events": [{"topic", "key", "data"}]}; a "resync" event means updates were
+    # dropped and the client should reload from the REST endpoints.
+    try:
+        user = await asyncio.to_thread(authenticate_token, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    wanted = set(topics.split(",")) & set(event_bus.TOPICS) if topics else set(event_bus.TOPICS)
+    await websocket.accept()
+    subscription = event_bus.bus.subscribe(user.id, wanted)
+    try:
+        while True:
+            try:
+                batch = await asyncio.wait_for(subscription.next_batch(), timeout=event_bus.HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                batch = []
+            await websocket.send_json({"events": batch})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        event_bus.bus.unsubscribe(subscription)
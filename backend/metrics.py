@@ -0,0 +1,33 @@
+import threading
+import time
+from collections import defaultdict
+
+from .logging_config import logger
+
+# Process-local counters and the latest stats of each background cycle
+_counters = defaultdict(int)
+_cycles = {}
+_lock = threading.Lock()
+
+
+def increment(name: str, value: int = 1):
+    with _lock:
+        _counters[name] += value
+
+
+def get(name: str) -> int:
+    return _counters.get(name, 0)
+
+
+def record_cycle(name: str, duration: float, **fields):
+    stats = {"duration_ms": round(duration * 1000, 2), "finished_at": time.time(), **fields}
+    with _lock:
+        _cycles[name] = stats
+        _counters[f"{name}.cycles"] += 1
+    details = ", ".join(f"{key}={value}" for key, value in fields.items())
+    logger.debug(f"Cycle {name} finished in {stats['duration_ms']}ms ({details})")
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {"counters": dict(_counters), "cycles": dict(_cycles)}
@@ -0,0 +1,122 @@
+"""Baseline schema as previously created by Base.metadata.create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+Databases created before migrations existed already have these tables, so each one is
+only created when missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String()),
+            sa.Column("hashed_password", sa.String()),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    if "api_keys" not in existing:
+        op.create_table(
+            "api_keys",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String()),
+            sa.Column("encrypted_key", sa.String()),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id")),
+        )
+        op.create_index("ix_api_keys_id", "api_keys", ["id"])
+        op.create_index("ix_api_keys_name", "api_keys", ["name"])
+
+    if "webhook_logs" not in existing:
+        op.create_table(
+            "webhook_logs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("payload", JSONB()),
+            sa.Column("status", sa.String()),
+        )
+        op.create_index("ix_webhook_logs_id", "webhook_logs", ["id"])
+
+    if "position_groups" not in existing:
+        op.create_table(
+            "position_groups",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("pair", sa.String()),
+            sa.Column("timeframe", sa.String()),
+            sa.Column("status", sa.String()),
+            sa.Column("avg_entry_price", sa.Float(), nullable=True),
+            sa.Column("unrealized_pnl_percent", sa.Float(), nullable=True),
+            sa.Column("unrealized_pnl_usd", sa.Float(), nullable=True),
+            sa.Column("tp_mode", sa.String()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("closed_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id")),
+        )
+        op.create_index("ix_position_groups_id", "position_groups", ["id"])
+        op.create_index("ix_position_groups_pair", "position_groups", ["pair"])
+        op.create_index("ix_position_groups_timeframe", "position_groups", ["timeframe"])
+
+    if "pyramids" not in existing:
+        op.create_table(
+            "pyramids",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("position_group_id", sa.Integer(), sa.ForeignKey("position_groups.id")),
+            sa.Column("entry_price", sa.Float()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_pyramids_id", "pyramids", ["id"])
+
+    if "dca_legs" not in existing:
+        op.create_table(
+            "dca_legs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("pyramid_id", sa.Integer(), sa.ForeignKey("pyramids.id")),
+            sa.Column("price_gap", sa.Float()),
+            sa.Column("capital_weight", sa.Float()),
+            sa.Column("tp_target", sa.Float()),
+            sa.Column("fill_price", sa.Float(), nullable=True),
+            sa.Column("status", sa.String()),
+            sa.Column("order_id", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("filled_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_dca_legs_id", "dca_legs", ["id"])
+
+    if "queued_signals" not in existing:
+        op.create_table(
+            "queued_signals",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("pair", sa.String()),
+            sa.Column("timeframe", sa.String()),
+            sa.Column("payload", JSONB()),
+            sa.Column("status", sa.String()),
+            sa.Column("loss_percentage", sa.Float(), nullable=True),
+            sa.Column("replacement_count", sa.Integer()),
+            sa.Column("expected_profit", sa.Float(), nullable=True),
+            sa.Column("time_in_queue", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("priority_rank", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id")),
+        )
+        op.create_index("ix_queued_signals_id", "queued_signals", ["id"])
+        op.create_index("ix_queued_signals_pair", "queued_signals", ["pair"])
+        op.create_index("ix_queued_signals_timeframe", "queued_signals", ["timeframe"])
+
+
+def downgrade():
+    for table in ("queued_signals", "dca_legs", "pyramids", "position_groups", "webhook_logs", "api_keys", "users"):
+        op.drop_table(table)
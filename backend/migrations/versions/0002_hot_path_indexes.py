@@ -0,0 +1,83 @@
+"""Dashboard metrics snapshot and indexes for the hot query paths
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+The snapshot table and the webhook log keyset indexes may already exist on databases that
+ran create_all after they were added to the models.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+OPEN_GROUPS = sa.text("status != 'Closed'")
+FILLED_LEGS = sa.text("status = 'Filled'")
+
+
+def upgrade():
+    if "dashboard_metrics" not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            "dashboard_metrics",
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("active_position_groups", sa.Integer(), nullable=False),
+            sa.Column("queued_signals", sa.Integer(), nullable=False),
+            sa.Column("unrealized_pnl_usd", sa.Float(), nullable=False),
+            sa.Column("last_webhook_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("reconciled_at", sa.DateTime(timezone=True), nullable=True),
+        )
+
+    # Built concurrently so large tables keep taking writes meanwhile (the app itself still waits,
+    # as run_migrations() runs at import); Postgres does not allow that inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_position_groups_open_lookup", "position_groups", ["owner_id", "pair", "timeframe"],
+            postgresql_where=OPEN_GROUPS, sqlite_where=OPEN_GROUPS,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_position_groups_owner_status", "position_groups", ["owner_id", "status"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_pyramids_position_group_id", "pyramids", ["position_group_id"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_dca_legs_pyramid_id", "dca_legs", ["pyramid_id"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_dca_legs_filled", "dca_legs", ["pyramid_id"],
+            postgresql_where=FILLED_LEGS, sqlite_where=FILLED_LEGS,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_queued_signals_owner_status_created", "queued_signals", ["owner_id", "status", "created_at"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_webhook_logs_timestamp_id", "webhook_logs", ["timestamp", "id"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_webhook_logs_status_timestamp_id", "webhook_logs", ["status", "timestamp", "id"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_webhook_logs_status_timestamp_id", table_name="webhook_logs")
+    op.drop_index("ix_webhook_logs_timestamp_id", table_name="webhook_logs")
+    op.drop_index("ix_queued_signals_owner_status_created", table_name="queued_signals")
+    op.drop_index("ix_dca_legs_filled", table_name="dca_legs")
+    op.drop_index("ix_dca_legs_pyramid_id", table_name="dca_legs")
+    op.drop_index("ix_pyramids_position_group_id", table_name="pyramids")
+    op.drop_index("ix_position_groups_owner_status", table_name="position_groups")
+    op.drop_index("ix_position_groups_open_lookup", table_name="position_groups")
+    op.drop_table("dashboard_metrics")
@@ -0,0 +1,34 @@
+"""PnL history snapshots
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "pnl_snapshots",
+        sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True),
+        sa.Column("resolution", sa.Integer(), nullable=False),
+        sa.Column("bucket", sa.BigInteger(), nullable=False),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("position_group_id", sa.Integer(), sa.ForeignKey("position_groups.id"), nullable=True),
+        sa.Column("unrealized_pnl_usd", sa.Float(), nullable=True),
+        sa.Column("unrealized_pnl_percent", sa.Float(), nullable=True),
+    )
+    op.create_index("ix_pnl_snapshots_series", "pnl_snapshots", ["owner_id", "position_group_id", "bucket"])
+    op.create_index("ix_pnl_snapshots_resolution_bucket", "pnl_snapshots", ["resolution", "bucket"])
+
+
+def downgrade():
+    op.drop_index("ix_pnl_snapshots_resolution_bucket", table_name="pnl_snapshots")
+    op.drop_index("ix_pnl_snapshots_series", table_name="pnl_snapshots")
+    op.drop_table("pnl_snapshots")
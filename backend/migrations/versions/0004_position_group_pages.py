@@ -0,0 +1,25 @@
+"""Position group pages per owner
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Concurrently, as in 0002, so position_groups keeps taking writes while it builds
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_position_groups_owner_id", "position_groups", ["owner_id", "id"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_position_groups_owner_id", table_name="position_groups", if_exists=True)
@@ -0,0 +1,39 @@
+"""Fill reconciliation cursors and resting order lookup
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+RESTING_LEGS = sa.text("status = 'Pending' AND order_id IS NOT NULL")
+
+
+def upgrade():
+    if "fill_cursors" not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            "fill_cursors",
+            sa.Column("api_key_id", sa.Integer(), sa.ForeignKey("api_keys.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("exchange", sa.String(), primary_key=True),
+            sa.Column("symbol", sa.String(), primary_key=True),
+            sa.Column("since", sa.BigInteger(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+    # Concurrently, as in 0002, so dca_legs keeps taking writes while it builds
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_dca_legs_resting_order_id", "dca_legs", ["order_id"],
+            postgresql_where=RESTING_LEGS, sqlite_where=RESTING_LEGS,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_dca_legs_resting_order_id", table_name="dca_legs", if_exists=True)
+    op.drop_table("fill_cursors")
@@ -0,0 +1,374 @@
+import asyncio
+import bisect
+import itertools
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+import ccxt
+
+from . import config_manager
+
+NAME = "mock"
+
+DEFAULT_PRECISION = {"price": 0.01, "amount": 0.001}
+DEFAULT_SYMBOLS = ("BTC/USDT", "ETH/USDT", "SOL/USDT")
+DEFAULT_PRICE = 100.0
+
+HAS = {
+    "fetchTicker": True,
+    "fetchTickers": True,
+    "createOrder": True,
+    "cancelOrder": True,
+    "fetchOpenOrders": True,
+    "fetchMyTrades": True,
+    "watchTicker": True,
+}
+
+
+class SimulatedMarket:
+    # State of one simulated venue shared by every client pointed at it: markets, scripted prices,
+    # resting orders and trades. Limit orders fill at their own price once the scripted price
+    # crosses them; market orders fill immediately. Settings (all optional):
+    #   symbols         markets to list besides the ones with a price path
+    #   precision       {"price": tick, "amount": step} for every market
+    #   default_price   price of symbols without a path
+    #   price_paths     {symbol: [[seconds, price], ...]}, interpolated linearly from the market's start
+    #   loop            restart the paths after their last point instead of holding it
+    #   latency         seconds added to every call, plus up to latency_jitter more
+    #   error_rate      chance of any call raising error_class; errors overrides it per method
+    #   error_class     ccxt exception name, NetworkError by default
+    #   tick_seconds    interval of watch_ticker updates
+    #   seed            makes jitter and injected errors reproducible
+
+    def __init__(self, settings: dict | None = None):
+        settings = settings or {}
+        self.precision = dict(settings.get("precision") or DEFAULT_PRECISION)
+        self.default_price = settings.get("default_price", DEFAULT_PRICE)
+        self.paths = {symbol: sorted(map(tuple, points)) for symbol, points in settings.get("price_paths", {}).items()}
+        self.loop = settings.get("loop", False)
+        self.latency = settings.get("latency", 0.0)
+        self.latency_jitter = settings.get("latency_jitter", 0.0)
+        self.error_rate = settings.get("error_rate", 0.0)
+        self.errors = dict(settings.get("errors", {}))
+        self.error_class = getattr(ccxt, settings.get("error_class", "NetworkError"))
+        self.tick_seconds = settings.get("tick_seconds", 1.0)
+        self.symbols = set(settings.get("symbols") or DEFAULT_SYMBOLS) | set(self.paths)
+        self.started_at = time.time()
+        self.orders = {}
+        self.trades = []
+        # Open orders per symbol, so matching a price only visits that symbol's book
+        self._resting = defaultdict(dict)
+        self._failures = {}
+        self._random = random.Random(settings.get("seed"))
+        self._order_ids = itertools.count(1)
+        self._trade_ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    # Scripted prices
+
+    def price(self, symbol: str, at: float | None = None) -> float:
+        points = self.paths.get(symbol)
+        if not points:
+            return self.default_price
+        elapsed = (at or time.time()) - self.started_at
+        if self.loop and points[-1][0] > 0:
+            elapsed %= points[-1][0]
+        index = bisect.bisect_right(points, (elapsed, math.inf))
+        if index == 0:
+            return points[0][1]
+        if index == len(points):
+            return points[-1][1]
+        (t0, p0), (t1, p1) = points[index - 1], points[index]
+        return p0 + (p1 - p0) * (elapsed - t0) / (t1 - t0)
+
+    def set_price(self, symbol: str, price: float):
+        # Holds the symbol at this price from now on
+        with self._lock:
+            self.symbols.add(symbol)
+            self.paths[symbol] = [(0.0, price)]
+        self.match(symbol)
+
+    # Fault injection
+
+    def fail_next(self, method: str, error: Exception | None = None, times: int = 1):
+        with self._lock:
+            self._failures.setdefault(method, []).extend([error or self.error_class(f"Injected {method} failure")] * times)
+
+    def delay(self) -> float:
+        return self.latency + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0.0)
+
+    def check_failure(self, method: str):
+        with self._lock:
+            scripted = self._failures.get(method)
+            if scripted:
+                raise scripted.pop(0)
+            rate = self.errors.get(method, self.error_rate)
+            if rate and self._random.random() < rate:
+                raise self.error_class(f"Injected {method} failure")
+
+    # Markets
+
+    def market(self, symbol: str) -> dict:
+        base, _, quote = symbol.partition("/")
+        return {"id": symbol.replace("/", ""), "symbol": symbol, "base": base, "quote": quote, "active": True, "precision": dict(self.precision)}
+
+    def markets(self) -> dict:
+        return {symbol: self.market(symbol) for symbol in sorted(self.symbols)}
+
+    def ticker(self, symbol: str) -> dict:
+        if symbol not in self.symbols:
+            raise ccxt.BadSymbol(f"{NAME} does not have market symbol {symbol}")
+        self.match(symbol)
+        now = time.time()
+        price = self.price(symbol, now)
+        return {"symbol": symbol, "last": price, "bid": price, "ask": price, "close": price, "timestamp": int(now * 1000)}
+
+    # Orders and trades
+
+    def create_order(self, symbol: str, type: str, side: str, amount: float, price: float | None, params: dict | None) -> dict:
+        if symbol not in self.symbols:
+            raise ccxt.BadSymbol(f"{NAME} does not have market symbol {symbol}")
+        with self._lock:
+            order_id = str(next(self._order_ids))
+            self.orders[order_id] = {
+                "id": order_id,
+                "clientOrderId": (params or {}).get("clientOrderId"),
+                "symbol": symbol,
+                "type": type,
+                "side": side,
+                "amount": float(amount),
+                "price": float(price) if price is not None else None,
+                "filled": 0.0,
+                "status": "open",
+                "timestamp": int(time.time() * 1000),
+            }
+            self._resting[symbol][order_id] = self.orders[order_id]
+            if type == "market":
+                self.fill(order_id, self.price(symbol))
+            else:
+                self.match(symbol)
+            return dict(self.orders[order_id])
+
+    def cancel_order(self, order_id: str) -> dict:
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None or order["status"] != "open":
+                raise ccxt.OrderNotFound(f"{NAME} order {order_id} is not open")
+            order["status"] = "canceled"
+            self._resting[order["symbol"]].pop(order_id, None)
+            return dict(order)
+
+    def open_orders(self, symbol: str | None) -> list[dict]:
+        if symbol is not None:
+            self.match(symbol)
+        with self._lock:
+            books = [self._resting[symbol]] if symbol is not None else list(self._resting.values())
+            return [dict(order) for book in books for order in book.values()]
+
+    def my_trades(self, symbol: str | None, since: int | None) -> list[dict]:
+        if symbol is not None:
+            self.match(symbol)
+        with self._lock:
+            return [
+                dict(trade) for trade in self.trades
+                if (symbol is None or trade["symbol"] == symbol) and (since is None or trade["timestamp"] >= since)
+            ]
+
+    def match(self, symbol: str):
+        # Fills the resting limit orders the current price has crossed
+        price = self.price(symbol)
+        with self._lock:
+            for order_id, order in list(self._resting[symbol].items()):
+                if order["price"] is None:
+                    continue
+                if (order["side"] == "buy" and price <= order["price"]) or (order["side"] == "sell" and price >= order["price"]):
+                    self.fill(order_id)
+
+    def fill(self, order_id: str, price: float | None = None, amount: float | None = None) -> dict:
+        # Executes (part of) a resting order as one trade; the order closes once fully filled
+        with self._lock:
+            order = self.orders[order_id]
+            price = order["price"] if price is None else price
+            amount = order["amount"] - order["filled"] if amount is None else amount
+            trade = {
+                "id": str(next(self._trade_ids)),
+                "order": order_id,
+                "symbol": order["symbol"],
+                "side": order["side"],
+                "price": price,
+                "amount": amount,
+                "cost": price * amount,
+                "timestamp": int(time.time() * 1000),
+            }
+            self.trades.append(trade)
+            order["filled"] += amount
+            if order["filled"] >= order["amount"] - 1e-12:
+                order["status"] = "closed"
+                self._resting[order["symbol"]].pop(order_id, None)
+            return dict(trade)
+
+
+class _MockClient:
+    # ccxt-shaped surface over a SimulatedMarket. Without a market each client gets a private one
+    # built from its config, so independent instances do not share orders.
+    id = NAME
+    has = HAS
+
+    def __init__(self, config: dict | None = None, market: SimulatedMarket | None = None):
+        config = config or {}
+        self.apiKey = config.get("apiKey")
+        self.secret = config.get("secret")
+        self.rateLimit = config.get("rateLimit", 10)
+        self.simulator = market or SimulatedMarket(config)
+        self.sandbox = False
+        self.markets = {}
+        self.calls = 0
+
+    @property
+    def orders(self) -> dict:
+        return self.simulator.orders
+
+    @property
+    def trades(self) -> list:
+        return self.simulator.trades
+
+    def fill(self, order_id: str, price: float | None = None, amount: float | None = None) -> dict:
+        return self.simulator.fill(order_id, price, amount)
+
+    def set_sandbox_mode(self, enabled: bool):
+        self.sandbox = enabled
+
+    def market(self, symbol: str) -> dict:
+        return self.markets.get(symbol) or self.simulator.market(symbol)
+
+    def price_to_precision(self, symbol: str, price: float) -> str:
+        tick = self.market(symbol)["precision"]["price"]
+        return _format(round(price / tick) * tick, tick)
+
+    def amount_to_precision(self, symbol: str, amount: float) -> str:
+        step = self.market(symbol)["precision"]["amount"]
+        return _format(math.floor(amount / step + 1e-9) * step, step)
+
+    def _tickers(self, symbols) -> dict:
+        return {symbol: self.simulator.ticker(symbol) for symbol in (symbols or sorted(self.simulator.symbols))}
+
+
+class MockExchange(_MockClient):
+    # Async client, standing in for ccxt.async_support and ccxt.pro
+
+    async def _call(self, method: str):
+        self.calls += 1
+        delay = self.simulator.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        self.simulator.check_failure(method)
+
+    async def load_markets(self, reload: bool = False) -> dict:
+        await self._call("load_markets")
+        self.markets = self.simulator.markets()
+        return self.markets
+
+    async def fetch_ticker(self, symbol: str, params: dict | None = None) -> dict:
+        await self._call("fetch_ticker")
+        return self.simulator.ticker(symbol)
+
+    async def fetch_tickers(self, symbols: list[str] | None = None, params: dict | None = None) -> dict:
+        await self._call("fetch_tickers")
+        return self._tickers(symbols)
+
+    async def watch_ticker(self, symbol: str, params: dict | None = None) -> dict:
+        await asyncio.sleep(self.simulator.tick_seconds)
+        await self._call("watch_ticker")
+        return self.simulator.ticker(symbol)
+
+    async def create_order(self, symbol: str, type: str, side: str, amount: float, price: float | None = None, params: dict | None = None) -> dict:
+        await self._call("create_order")
+        return self.simulator.create_order(symbol, type, side, amount, price, params)
+
+    async def cancel_order(self, id: str, symbol: str | None = None, params: dict | None = None) -> dict:
+        await self._call("cancel_order")
+        return self.simulator.cancel_order(id)
+
+    async def fetch_open_orders(self, symbol: str | None = None, since: int | None = None, limit: int | None = None, params: dict | None = None) -> list[dict]:
+        await self._call("fetch_open_orders")
+        return self.simulator.open_orders(symbol)[:limit]
+
+    async def fetch_my_trades(self, symbol: str | None = None, since: int | None = None, limit: int | None = None, params: dict | None = None) -> list[dict]:
+        await self._call("fetch_my_trades")
+        return self.simulator.my_trades(symbol, since)[:limit]
+
+    async def close(self):
+        pass
+
+
+class SyncMockExchange(_MockClient):
+    # Blocking client, standing in for the ccxt clients of exchange_registry
+
+    def _call(self, method: str):
+        self.calls += 1
+        delay = self.simulator.delay()
+        if delay:
+            time.sleep(delay)
+        self.simulator.check_failure(method)
+
+    def load_markets(self, reload: bool = False) -> dict:
+        if self.markets and not reload:
+            return self.markets
+        self._call("load_markets")
+        self.markets = self.simulator.markets()
+        return self.markets
+
+    def fetch_ticker(self, symbol: str, params: dict | None = None) -> dict:
+        self._call("fetch_ticker")
+        return self.simulator.ticker(symbol)
+
+    def fetch_tickers(self, symbols: list[str] | None = None, params: dict | None = None) -> dict:
+        self._call("fetch_tickers")
+        return self._tickers(symbols)
+
+    def create_order(self, symbol: str, type: str, side: str, amount: float, price: float | None = None, params: dict | None = None) -> dict:
+        self._call("create_order")
+        return self.simulator.create_order(symbol, type, side, amount, price, params)
+
+    def cancel_order(self, id: str, symbol: str | None = None, params: dict | None = None) -> dict:
+        self._call("cancel_order")
+        return self.simulator.cancel_order(id)
+
+    def fetch_open_orders(self, symbol: str | None = None, since: int | None = None, limit: int | None = None, params: dict | None = None) -> list[dict]:
+        self._call("fetch_open_orders")
+        return self.simulator.open_orders(symbol)[:limit]
+
+    def fetch_my_trades(self, symbol: str | None = None, since: int | None = None, limit: int | None = None, params: dict | None = None) -> list[dict]:
+        self._call("fetch_my_trades")
+        return self.simulator.my_trades(symbol, since)[:limit]
+
+
+_shared_market = None
+_shared_market_lock = threading.Lock()
+
+
+def shared_market() -> SimulatedMarket:
+    # The venue every engine client talks to when the configured exchange is "mock", built from
+    # the exchange.mock settings the first time it is needed
+    global _shared_market
+    with _shared_market_lock:
+        if _shared_market is None:
+            settings = config_manager.get_snapshot().as_dict().get("exchange", {}).get(NAME, {})
+            _shared_market = SimulatedMarket(settings)
+        return _shared_market
+
+
+def reset_shared_market(settings: dict | None = None) -> SimulatedMarket:
+    # Starts the venue over, from these settings or the configured ones
+    global _shared_market
+    with _shared_market_lock:
+        _shared_market = SimulatedMarket(settings) if settings is not None else None
+    return shared_market()
+
+
+def _format(value: float, step: float) -> str:
+    decimals = max(0, -int(math.floor(math.log10(step))))
+    return f"{value:.{decimals}f}"
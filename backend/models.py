@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, DateTime, Float, Boolean, Index, literal_column, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB
@@ -34,6 +34,12 @@ class WebhookLog(Base):
     payload = Column(JSONB)
     status = Column(String)
 
+    # Keyset pagination walks these newest-first, optionally within one status
+    __table_args__ = (
+        Index("ix_webhook_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_webhook_logs_status_timestamp_id", "status", "timestamp", "id"),
+    )
+
 class PositionGroup(Base):
     __tablename__ = "position_groups"
 
@@ -52,6 +58,18 @@ class PositionGroup(Base):
     owner = relationship("User", back_populates="position_groups")
     pyramids = relationship("Pyramid", back_populates="position_group")
 
+    __table_args__ = (
+        # Open-group lookup for every signal; closed groups pile up and are excluded from the index
+        Index(
+            "ix_position_groups_open_lookup", "owner_id", "pair", "timeframe",
+            postgresql_where=text("status != 'Closed'"), sqlite_where=text("status != 'Closed'"),
+        ),
+        # Live group counts per owner (execution pool, reconciliation)
+        Index("ix_position_groups_owner_status", "owner_id", "status"),
+        # Newest-first position group pages per owner
+        Index("ix_position_groups_owner_id", "owner_id", "id"),
+    )
+
 class Pyramid(Base):
     __tablename__ = "pyramids"
 
@@ -63,6 +81,10 @@ class Pyramid(Base):
     position_group = relationship("PositionGroup", back_populates="pyramids")
     dca_legs = relationship("DCALeg", back_populates="pyramid")
 
+    __table_args__ = (
+        Index("ix_pyramids_position_group_id", "position_group_id"),
+    )
+
 class DCALeg(Base):
     __tablename__ = "dca_legs"
 
@@ -79,6 +101,21 @@ class DCALeg(Base):
 
     pyramid = relationship("Pyramid", back_populates="dca_legs")
 
+    __table_args__ = (
+        Index("ix_dca_legs_pyramid_id", "pyramid_id"),
+        # Only filled legs are watched for take-profit
+        Index(
+            "ix_dca_legs_filled", "pyramid_id",
+            postgresql_where=text("status = 'Filled'"), sqlite_where=text("status = 'Filled'"),
+        ),
+        # Resting orders, matched to exchange fills by order id
+        Index(
+            "ix_dca_legs_resting_order_id", "order_id",
+            postgresql_where=text("status = 'Pending' AND order_id IS NOT NULL"),
+            sqlite_where=text("status = 'Pending' AND order_id IS NOT NULL"),
+        ),
+    )
+
 class QueuedSignal(Base):
     __tablename__ = "queued_signals"
 
@@ -96,3 +133,57 @@ class QueuedSignal(Base):
     owner_id = Column(Integer, ForeignKey("users.id"))
 
     owner = relationship("User", back_populates="queued_signals")
+
+    __table_args__ = (
+        # FIFO per owner over queued signals
+        Index("ix_queued_signals_owner_status_created", "owner_id", "status", "created_at"),
+    )
+
+class DashboardMetrics(Base):
+    # Per-user counters kept up to date by the writers, so the dashboard never scans the source tables
+    __tablename__ = "dashboard_metrics"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    active_position_groups = Column(Integer, default=0, nullable=False)
+    queued_signals = Column(Integer, default=0, nullable=False)
+    unrealized_pnl_usd = Column(Float, default=0.0, nullable=False)
+    last_webhook_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    reconciled_at = Column(DateTime(timezone=True), nullable=True)
+
+class PnlSnapshot(Base):
+    # Append-only PnL history; position_group_id is NULL for a user's total. Rows of the finest
+    # resolution are rolled up into coarser ones as they age, so each period lives in one tier only.
+    __tablename__ = "pnl_snapshots"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    resolution = Column(Integer, nullable=False) # Seconds per bucket
+    bucket = Column(BigInteger, nullable=False) # Unix time in seconds, aligned to the resolution
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    position_group_id = Column(Integer, ForeignKey("position_groups.id"), nullable=True)
+    unrealized_pnl_usd = Column(Float, nullable=True)
+    unrealized_pnl_percent = Column(Float, nullable=True)
+
+    __table_args__ = (
+        # Range queries for one series
+        Index("ix_pnl_snapshots_series", "owner_id", "position_group_id", "bucket"),
+        # Rollup and retention sweeps per tier
+        Index("ix_pnl_snapshots_resolution_bucket", "resolution", "bucket"),
+    )
+
+class FillCursor(Base):
+    # Timestamp (ms) up to which an account's trades on a symbol have been applied to its legs
+    __tablename__ = "fill_cursors"
+
+    api_key_id = Column(Integer, ForeignKey("api_keys.id", ondelete="CASCADE"), primary_key=True)
+    exchange = Column(String, primary_key=True)
+    symbol = Column(String, primary_key=True)
+    since = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# Predicates of the partial indexes above, for the queries they serve. The status is a literal rather
+# than a bound parameter: asyncpg runs prepared statements, and a generic plan for `status = $1`
+# cannot use an index that only covers `status = 'Filled'`.
+OPEN_GROUP = PositionGroup.status != literal_column("'Closed'")
+FILLED_LEG = DCALeg.status == literal_column("'Filled'")
+RESTING_LEG = DCALeg.status == literal_column("'Pending'")
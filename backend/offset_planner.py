@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import config_manager, exchange_registry, models, pnl_engine
+from .logging_config import logger
+
+# Absorbs float error when a quantity is already a whole number of amount steps
+STEP_TOLERANCE = 1e-9
+
+
+def solve(loss_usd: float, group_ids: np.ndarray, pnl_usd: np.ndarray, quantity: np.ndarray, unit_profit: np.ndarray, steps: np.ndarray):
+    # Greedy cover: winners in descending USD profit (ties by id, so plans are deterministic)
+    # are closed in turn until their realized profit covers the loss. Every winner before the
+    # covering one is closed in full, the covering one only by the quantity still needed.
+    # Quantities are multiples of the symbol's amount step (0 means no rounding).
+    # Returns the indices of the winners to close and the quantity to close for each.
+    winners = np.flatnonzero((pnl_usd > 0) & (unit_profit > 0) & (quantity > 0))
+    order = winners[np.lexsort((group_ids[winners], -pnl_usd[winners]))]
+    step, profit = steps[order], unit_profit[order]
+    rounded = step > 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        closable = np.where(rounded, np.floor(quantity[order] / step + STEP_TOLERANCE) * step, quantity[order])
+        closable_profit = closable * profit
+        covered_before = np.cumsum(closable_profit) - closable_profit
+        needed = np.clip(loss_usd - covered_before, 0, None) / profit
+        close = np.minimum(np.where(rounded, np.ceil(needed / step - STEP_TOLERANCE) * step, needed), closable)
+
+    selected = close > 0
+    return order[selected], close[selected]
+
+
+def load_candidates(db: Session, owner_id: int, capital: float) -> dict:
+    # Position size and cost basis of every live group of the owner, from the same columnar
+    # reads the PnL engine uses
+    groups = pnl_engine.load_live_groups(db, owner_id=owner_id)
+    legs = pnl_engine.load_filled_legs(db, owner_id=owner_id)
+    legs, leg_group = pnl_engine.match_legs(groups, legs)
+    count = len(groups["id"])
+    quantity = np.bincount(leg_group, weights=capital * legs["capital_weight"] / legs["fill_price"], minlength=count)
+    cost = np.bincount(leg_group, weights=capital * legs["capital_weight"], minlength=count)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Plans are projected at the price behind the last PnL cycle, so they match what the UI shows
+        price = groups["avg_entry_price"] * (1 + groups["unrealized_pnl_percent"] / 100)
+        unit_profit = np.nan_to_num(price - cost / quantity, nan=0.0)
+    return {**groups, "quantity": quantity, "price": price, "unit_profit": unit_profit}
+
+
+def amount_steps(exchange_name: str, pairs: np.ndarray) -> dict:
+    steps = {}
+    for pair in np.unique(pairs).tolist():
+        try:
+            rules = exchange_registry.get_precision_rules(exchange_name, pair)
+        except Exception:
+            logger.warning(f"No precision rules for {pair}; offset quantities will not be rounded")
+            rules = None
+        steps[pair] = (rules or {}).get("amount") or 0.0
+    return steps
+
+
+def build_plan(db: Session, loser: models.PositionGroup) -> dict:
+    # Projected partial closes that would offset the loser's USD loss. Nothing is executed here.
+    config = config_manager.load_config()
+    capital = config.get("grid_strategy", {}).get("capital")
+    loss_usd = -(loser.unrealized_pnl_usd or 0.0)
+    plan = {
+        "position_group_id": loser.id,
+        "pair": loser.pair,
+        "unrealized_pnl_percent": loser.unrealized_pnl_percent,
+        "loss_usd": max(loss_usd, 0.0),
+        "covered_usd": 0.0,
+        "fully_covered": loss_usd <= 0,
+        "actions": [],
+        "planned_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if loss_usd <= 0 or not capital:
+        return plan
+
+    candidates = load_candidates(db, loser.owner_id, capital)
+    steps = amount_steps(config.get("exchange", {}).get("name", "binance"), candidates["pair"])
+    step_per_group = np.array([steps[pair] for pair in candidates["pair"].tolist()], dtype=np.float64)
+    indices, close = solve(
+        loss_usd,
+        candidates["id"],
+        np.nan_to_num(candidates["unrealized_pnl_usd"]),
+        candidates["quantity"],
+        candidates["unit_profit"],
+        step_per_group,
+    )
+
+    realized = close * candidates["unit_profit"][indices]
+    plan["actions"] = [
+        {
+            "position_group_id": group_id,
+            "pair": pair,
+            "close_quantity": quantity,
+            "close_percent": quantity / total * 100,
+            "close_usd": quantity * price,
+            "realized_pnl_usd": profit,
+            "price": price,
+        }
+        for group_id, pair, quantity, total, price, profit in zip(
+            candidates["id"][indices].tolist(),
+            candidates["pair"][indices].tolist(),
+            close.tolist(),
+            candidates["quantity"][indices].tolist(),
+            candidates["price"][indices].tolist(),
+            realized.tolist(),
+        )
+    ]
+    plan["covered_usd"] = float(realized.sum())
+    plan["fully_covered"] = bool(plan["covered_usd"] >= loss_usd or np.isclose(plan["covered_usd"], loss_usd))
+    return plan
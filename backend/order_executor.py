@@ -0,0 +1,314 @@
+import asyncio
+import threading
+import time
+
+import ccxt.async_support as ccxt_async
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session
+
+from . import config, config_manager, event_bus, mock_exchange, models, security
+from .database import AsyncSessionLocal
+from .logging_config import logger
+
+# Jobs (placing a pyramid's orders, cancelling a closed group's) staged on a session are submitted
+# after its commit and dropped on rollback
+_PENDING_KEY = "order_executor.pending"
+
+
+class TokenBucket:
+    # Request budget of one exchange account, shared by every call made with it. Refills at
+    # `rate` tokens per second up to `capacity`; waiters are served in arrival order.
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+def parse_credentials(secret: str) -> dict:
+    # API keys are stored as "<api key>:<secret>"
+    api_key, _, api_secret = secret.partition(":")
+    return {"apiKey": api_key, "secret": api_secret} if api_secret else {"apiKey": api_key}
+
+
+class SandboxUnavailable(Exception):
+    pass
+
+
+def create_client(exchange_name: str, credentials: dict, testnet: bool):
+    if exchange_name == mock_exchange.NAME:
+        client = mock_exchange.MockExchange(credentials, market=mock_exchange.shared_market())
+    else:
+        # Throttling is done by the account's token bucket, not by ccxt
+        client = getattr(ccxt_async, exchange_name)({**credentials, "enableRateLimit": False})
+    if testnet:
+        # Never fall back to live trading: without a sandbox the exchange is refused
+        message = f"{exchange_name} has no testnet; set exchange.testnet to false to place live orders there"
+        if exchange_name != mock_exchange.NAME and not client.urls.get("test"):
+            raise SandboxUnavailable(message)
+        try:
+            client.set_sandbox_mode(True)
+        except ccxt_async.NotSupported:
+            raise SandboxUnavailable(message)
+    return client
+
+
+class ExchangeSession:
+    def __init__(self, client, bucket: TokenBucket):
+        self.client = client
+        self.bucket = bucket
+
+    async def call(self, method: str, *args, **kwargs):
+        await self.bucket.acquire()
+        return await getattr(self.client, method)(*args, **kwargs)
+
+
+class SessionPool:
+    # One authenticated client and rate budget per (ApiKey, exchange), reused across orders
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._create_lock = None
+        self._loop = None
+
+    async def get(self, api_key_id: int, encrypted_key: str, exchange_name: str, testnet: bool) -> ExchangeSession:
+        key = (api_key_id, exchange_name)
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+        if self._create_lock is None:
+            self._loop, self._create_lock = asyncio.get_running_loop(), asyncio.Lock()
+        async with self._create_lock:
+            session = self._sessions.get(key)
+            if session is None:
+                client = create_client(exchange_name, parse_credentials(security.decrypt_api_key(encrypted_key)), testnet)
+                rate = config.ORDER_RATE_PER_SECOND or 1000 / max(client.rateLimit, 1)
+                session = ExchangeSession(client, TokenBucket(rate, config.ORDER_BURST))
+                await session.call("load_markets")
+                with self._lock:
+                    self._sessions[key] = session
+                logger.info(f"Opened {exchange_name} session for API key {api_key_id}")
+        return session
+
+    def evict(self, api_key_id: int):
+        # Called when a key changes or is deleted; may run outside the event loop
+        with self._lock:
+            evicted = [self._sessions.pop(key) for key in list(self._sessions) if key[0] == api_key_id]
+        for session in evicted:
+            if self._loop is not None and not self._loop.is_closed():
+                asyncio.run_coroutine_threadsafe(session.client.close(), self._loop)
+
+    async def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            await session.client.close()
+
+
+def exchange_settings() -> tuple[str, bool]:
+    settings = config_manager.load_config().get("exchange", {})
+    return settings.get("name", "binance").lower(), settings.get("testnet", True)
+
+
+def select_api_key(db: Session, owner_id: int, exchange_name: str) -> models.ApiKey | None:
+    # A key named after the exchange wins; otherwise the user's first key
+    return db.query(models.ApiKey).filter(models.ApiKey.owner_id == owner_id).order_by(
+        func.lower(models.ApiKey.name) != exchange_name, models.ApiKey.id
+    ).first()
+
+
+def load_account(db: Session, owner_id: int) -> dict:
+    exchange_name, testnet = exchange_settings()
+    api_key = select_api_key(db, owner_id, exchange_name)
+    return {
+        "exchange_name": exchange_name,
+        "testnet": testnet,
+        "api_key": (api_key.id, api_key.encrypted_key) if api_key else None,
+    }
+
+
+def load_pyramid_orders(db: Session, pyramid_id: int) -> dict | None:
+    # Limit buy orders for the pyramid's legs that have none yet: price from the entry price and
+    # the leg's gap, size from the grid capital and the leg's weight
+    pyramid = db.get(models.Pyramid, pyramid_id)
+    if pyramid is None:
+        return None
+    position_group = pyramid.position_group
+    legs = db.query(models.DCALeg).filter(
+        models.DCALeg.pyramid_id == pyramid_id,
+        models.DCALeg.status == "Pending",
+        models.DCALeg.order_id.is_(None),
+    ).order_by(models.DCALeg.id).all()
+    capital = config_manager.load_config().get("grid_strategy", {}).get("capital")
+    return {
+        "owner_id": position_group.owner_id,
+        "position_group_id": position_group.id,
+        "pair": position_group.pair,
+        **load_account(db, position_group.owner_id),
+        "capital": capital,
+        "legs": [
+            (leg.id, pyramid.entry_price * (1 + leg.price_gap), (capital or 0) * leg.capital_weight / (pyramid.entry_price * (1 + leg.price_gap)))
+            for leg in legs
+        ],
+    }
+
+
+def record_orders(db: Session, plan: dict, updates: list[dict]):
+    # One bulk UPDATE by primary key for the whole pyramid
+    db.execute(update(models.DCALeg), updates)
+    for leg in updates:
+        event_bus.stage(db, plan["owner_id"], "leg", leg["id"], {"position_group_id": plan["position_group_id"], **leg})
+    db.commit()
+
+
+class OrderExecutor:
+    # Places the DCA orders of new pyramids and cancels those of closed groups. Jobs are queued and
+    # worked off by a few tasks; the orders of one job are sent concurrently within the account's
+    # rate budget.
+
+    def __init__(self):
+        self.sessions = SessionPool()
+        self._queue = None
+        self._loop = None
+        self._workers = []
+
+    def start(self, workers: int = config.ORDER_WORKERS):
+        if config.ORDER_EXECUTION:
+            # Fails startup with SandboxUnavailable rather than every order later
+            exchange_name, testnet = exchange_settings()
+            create_client(exchange_name, {}, testnet)
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(workers)]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        await self.sessions.close()
+
+    def submit(self, job, *args):
+        # Safe to call from any thread; job is one of the executor's coroutine methods
+        if self._loop is None:
+            logger.warning(f"Order executor is not running; {job.__name__}{args} dropped")
+            return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (job, args))
+
+    async def _work(self):
+        while True:
+            job, args = await self._queue.get()
+            try:
+                await job(*args)
+            except Exception:
+                logger.exception(f"Order job {job.__name__}{args} failed")
+
+    async def place_pyramid(self, pyramid_id: int) -> list[dict]:
+        async with AsyncSessionLocal() as db:
+            plan = await db.run_sync(load_pyramid_orders, pyramid_id)
+        if plan is None or not plan["legs"]:
+            return []
+        if plan["capital"] is None:
+            logger.warning(f"grid_strategy.capital is not configured; no orders placed for Pyramid {pyramid_id}")
+            return []
+        if plan["api_key"] is None:
+            logger.warning(f"User {plan['owner_id']} has no API key; no orders placed for Pyramid {pyramid_id}")
+            return []
+
+        try:
+            session = await self.sessions.get(*plan["api_key"], plan["exchange_name"], plan["testnet"])
+        except SandboxUnavailable as e:
+            logger.error(f"No orders placed for Pyramid {pyramid_id}: {e}")
+            return []
+        results = await asyncio.gather(
+            *(self._place_leg(session, plan["pair"], leg) for leg in plan["legs"]),
+            return_exceptions=True,
+        )
+        updates = []
+        for (leg_id, _, _), result in zip(plan["legs"], results):
+            if isinstance(result, Exception):
+                logger.error(f"Order for DCALeg {leg_id} on {plan['pair']} failed: {result}")
+                updates.append({"id": leg_id, "status": "Failed"})
+            else:
+                updates.append({"id": leg_id, "order_id": str(result["id"])})
+
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(record_orders, plan, updates)
+        logger.info(f"Placed {sum('order_id' in u for u in updates)}/{len(updates)} orders for Pyramid {pyramid_id}")
+        return updates
+
+    async def cancel_orders(self, owner_id: int, pair: str, order_ids: list[str]) -> int:
+        # Orders already filled or cancelled on the exchange count as done
+        async with AsyncSessionLocal() as db:
+            account = await db.run_sync(load_account, owner_id)
+        if account["api_key"] is None:
+            logger.warning(f"User {owner_id} has no API key; {len(order_ids)} orders on {pair} not cancelled")
+            return 0
+        try:
+            session = await self.sessions.get(*account["api_key"], account["exchange_name"], account["testnet"])
+        except SandboxUnavailable as e:
+            logger.error(f"{len(order_ids)} orders on {pair} not cancelled: {e}")
+            return 0
+        results = await asyncio.gather(
+            *(session.call("cancel_order", order_id, pair) for order_id in order_ids),
+            return_exceptions=True,
+        )
+        cancelled = 0
+        for order_id, result in zip(order_ids, results):
+            if isinstance(result, ccxt_async.OrderNotFound):
+                logger.info(f"Order {order_id} on {pair} was no longer open")
+            elif isinstance(result, Exception):
+                logger.error(f"Cancelling order {order_id} on {pair} failed: {result}")
+            else:
+                cancelled += 1
+        logger.info(f"Cancelled {cancelled}/{len(order_ids)} orders on {pair} for user {owner_id}")
+        return cancelled
+
+    async def _place_leg(self, session: ExchangeSession, pair: str, leg: tuple) -> dict:
+        leg_id, price, amount = leg
+        client = session.client
+        return await session.call(
+            "create_order", pair, "limit", "buy",
+            float(client.amount_to_precision(pair, amount)),
+            float(client.price_to_precision(pair, price)),
+            {"clientOrderId": f"ex-engine-leg-{leg_id}"},
+        )
+
+
+executor = OrderExecutor()
+
+
+def submit_after_commit(db: Session, pyramid_id: int):
+    if not config.ORDER_EXECUTION:
+        logger.info(f"Simulating order placement for Pyramid {pyramid_id}")
+        return
+    db.info.setdefault(_PENDING_KEY, []).append((executor.place_pyramid, (pyramid_id,)))
+
+
+def cancel_after_commit(db: Session, owner_id: int, pair: str, order_ids: list[str]):
+    if config.ORDER_EXECUTION and order_ids:
+        db.info.setdefault(_PENDING_KEY, []).append((executor.cancel_orders, (owner_id, pair, order_ids)))
+
+
+@event.listens_for(Session, "after_commit")
+def _submit(session: Session):
+    for job, args in session.info.pop(_PENDING_KEY, ()):
+        executor.submit(job, *args)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session: Session):
+    session.info.pop(_PENDING_KEY, None)
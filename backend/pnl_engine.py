@@ -0,0 +1,149 @@
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import dashboard_metrics, event_bus, models, pnl_history, risk_engine
+
+
+def _live_filters(pairs: set | None, owner_id: int | None) -> list:
+    filters = [models.PositionGroup.status == "Live"]
+    if pairs is not None:
+        filters.append(models.PositionGroup.pair.in_(pairs))
+    if owner_id is not None:
+        filters.append(models.PositionGroup.owner_id == owner_id)
+    return filters
+
+
+def load_live_groups(db: Session, pairs: set | None = None, owner_id: int | None = None) -> dict:
+    rows = db.query(
+        models.PositionGroup.id,
+        models.PositionGroup.owner_id,
+        models.PositionGroup.pair,
+        models.PositionGroup.avg_entry_price,
+        models.PositionGroup.unrealized_pnl_percent,
+        models.PositionGroup.unrealized_pnl_usd,
+    ).filter(*_live_filters(pairs, owner_id)).order_by(models.PositionGroup.id).all()
+    ids, owner_ids, group_pairs, avg_entry, pnl_percent, pnl_usd = zip(*rows) if rows else ((),) * 6
+    return {
+        "id": np.array(ids, dtype=np.int64),
+        "owner_id": np.array(owner_ids, dtype=np.int64),
+        "pair": np.array(group_pairs, dtype=object),
+        "avg_entry_price": np.array(avg_entry, dtype=np.float64),
+        "unrealized_pnl_percent": np.array(pnl_percent, dtype=np.float64),
+        "unrealized_pnl_usd": np.array(pnl_usd, dtype=np.float64),
+    }
+
+
+def load_filled_legs(db: Session, pairs: set | None = None, owner_id: int | None = None) -> dict:
+    rows = db.query(
+        models.Pyramid.position_group_id, models.DCALeg.fill_price, models.DCALeg.capital_weight
+    ).join(models.Pyramid, models.DCALeg.pyramid_id == models.Pyramid.id).join(
+        models.PositionGroup, models.Pyramid.position_group_id == models.PositionGroup.id
+    ).filter(
+        *_live_filters(pairs, owner_id),
+        models.FILLED_LEG,
+        models.DCALeg.fill_price != 0,
+        models.DCALeg.capital_weight != 0,
+    ).all()
+    group_ids, fill_prices, weights = zip(*rows) if rows else ((),) * 3
+    return {
+        "group_id": np.array(group_ids, dtype=np.int64),
+        "fill_price": np.array(fill_prices, dtype=np.float64),
+        "capital_weight": np.array(weights, dtype=np.float64),
+    }
+
+
+def match_legs(groups: dict, legs: dict) -> tuple[dict, np.ndarray]:
+    # Index of each leg's group in `groups` (ids sorted), for bincount reductions. Legs of a group
+    # missing from `groups` (it closed or opened between the two reads) are left out.
+    leg_group = np.searchsorted(groups["id"], legs["group_id"])
+    valid = leg_group < len(groups["id"])
+    valid[valid] = groups["id"][leg_group[valid]] == legs["group_id"][valid]
+    if not valid.all():
+        legs = {key: values[valid] for key, values in legs.items()}
+        leg_group = leg_group[valid]
+    return legs, leg_group
+
+
+def compute(groups: dict, legs: dict, prices: dict, capital: float | None) -> dict:
+    # Group-by reductions over the legs; group ids are sorted so searchsorted maps each leg to its group
+    count = len(groups["id"])
+    legs, leg_group = match_legs(groups, legs)
+    weight_sum = np.bincount(leg_group, weights=legs["capital_weight"], minlength=count)
+    weighted_entry_sum = np.bincount(leg_group, weights=legs["fill_price"] * legs["capital_weight"], minlength=count)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_entry_price = np.where(weight_sum > 0, weighted_entry_sum / weight_sum, np.nan)
+
+        unique_pairs, pair_index = np.unique(groups["pair"], return_inverse=True)
+        pair_prices = np.array([prices.get(pair) or np.nan for pair in unique_pairs], dtype=np.float64)
+        current_price = pair_prices[pair_index] if count else np.empty(0)
+
+        # Assuming a 'long' position for PnL calculation for now
+        priced = ~np.isnan(current_price) & ~np.isnan(avg_entry_price) & (avg_entry_price != 0)
+        pnl_percent = np.where(priced, (current_price - avg_entry_price) / avg_entry_price * 100, np.nan)
+
+        if capital:
+            # Each leg holds capital * capital_weight bought at its fill price
+            quantity = np.bincount(leg_group, weights=capital * legs["capital_weight"] / legs["fill_price"], minlength=count)
+            pnl_usd = np.where(priced, quantity * current_price - capital * weight_sum, np.nan)
+        else:
+            pnl_usd = np.full(count, np.nan)
+
+    return {"avg_entry_price": avg_entry_price, "unrealized_pnl_percent": pnl_percent, "unrealized_pnl_usd": pnl_usd}
+
+
+def _changed(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    return ~((old == new) | (np.isnan(old) & np.isnan(new)))
+
+
+def _nullable(values: np.ndarray) -> list:
+    return [None if np.isnan(value) else value for value in values.tolist()]
+
+
+def update_pnl(db: Session, pairs: set, prices: dict, capital: float | None = None) -> int:
+    # Two columnar reads, vectorized math, one bulk UPDATE of the groups whose values moved
+    # and one bulk insert of PnL history points
+    groups = load_live_groups(db, pairs)
+    if not len(groups["id"]):
+        return 0
+    results = compute(groups, load_filled_legs(db, pairs), prices, capital)
+
+    changed = np.zeros(len(groups["id"]), dtype=bool)
+    for column, values in results.items():
+        changed |= _changed(groups[column], values)
+    if changed.any():
+        columns = {column: _nullable(values[changed]) for column, values in results.items()}
+        db.execute(update(models.PositionGroup), [
+            {"id": group_id, **{column: columns[column][i] for column in columns}}
+            for i, group_id in enumerate(groups["id"][changed].tolist())
+        ])
+
+        old_pnl = np.nan_to_num(groups["unrealized_pnl_usd"][changed])
+        new_pnl = np.nan_to_num(results["unrealized_pnl_usd"][changed])
+        owners, owner_index = np.unique(groups["owner_id"][changed], return_inverse=True)
+        deltas = np.bincount(owner_index, weights=new_pnl - old_pnl, minlength=len(owners))
+        dashboard_metrics.record_pnl_deltas(db, dict(zip(owners.tolist(), deltas.tolist())))
+
+        for i, (group_id, owner_id) in enumerate(zip(groups["id"][changed].tolist(), groups["owner_id"][changed].tolist())):
+            if event_bus.bus.wants(owner_id):
+                event_bus.stage(db, owner_id, "position", group_id, {"id": group_id, **{column: columns[column][i] for column in columns}})
+
+    # History points are only appended for series that moved beyond the epsilon
+    pnl_history.record(db, list(zip(
+        groups["owner_id"].tolist(),
+        groups["id"].tolist(),
+        _nullable(results["unrealized_pnl_usd"]),
+        _nullable(results["unrealized_pnl_percent"]),
+    )))
+    pnl_history.record_user_totals(db, np.unique(groups["owner_id"]).tolist())
+    db.commit()
+
+    if changed.any():
+        risk_engine.book.update(zip(
+            groups["id"][changed].tolist(),
+            groups["owner_id"][changed].tolist(),
+            columns["unrealized_pnl_percent"],
+            columns["unrealized_pnl_usd"],
+        ))
+    return len(groups["id"])
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from . import config, models
+from .database import AsyncSessionLocal
+from .logging_config import logger
+
+# (resolution, retention) in seconds. Points older than a tier's retention are averaged into
+# the next tier's buckets; the last tier is simply trimmed.
+TIERS = (
+    (10, 24 * 3600),
+    (60, 7 * 24 * 3600),
+    (3600, config.PNL_HISTORY_RETENTION_DAYS * 24 * 3600),
+)
+RAW_RESOLUTION = TIERS[0][0]
+DOWNSAMPLE_INTERVAL_SECONDS = 60
+MAX_POINTS = 2000
+
+Snapshot = models.PnlSnapshot
+
+# Last point written per series: (owner_id, position_group_id) -> (bucket, usd, percent)
+_last_written = {}
+
+
+def _moved(previous, value, epsilon: float) -> bool:
+    if previous is None or value is None:
+        return (previous is None) != (value is None)
+    return abs(value - previous) > epsilon
+
+
+def record(db: Session, series: list[tuple], now: float | None = None) -> int:
+    # series: (owner_id, position_group_id, usd, percent). At most one point per series and
+    # raw bucket, and only when a value moved by more than the configured epsilon.
+    bucket = int((now or time.time()) // RAW_RESOLUTION) * RAW_RESOLUTION
+    rows = []
+    for owner_id, group_id, usd, percent in series:
+        last = _last_written.get((owner_id, group_id))
+        if last is not None and (
+            last[0] == bucket
+            or not (_moved(last[1], usd, config.PNL_HISTORY_EPSILON_USD) or _moved(last[2], percent, config.PNL_HISTORY_EPSILON_PERCENT))
+        ):
+            continue
+        rows.append({
+            "resolution": RAW_RESOLUTION,
+            "bucket": bucket,
+            "owner_id": owner_id,
+            "position_group_id": group_id,
+            "unrealized_pnl_usd": usd,
+            "unrealized_pnl_percent": percent,
+        })
+        _last_written[(owner_id, group_id)] = (bucket, usd, percent)
+    if rows:
+        db.execute(insert(Snapshot), rows)
+    return len(rows)
+
+
+def record_user_totals(db: Session, owner_ids: list[int], now: float | None = None) -> int:
+    # User totals come from the incrementally maintained dashboard snapshot
+    totals = db.query(models.DashboardMetrics.owner_id, models.DashboardMetrics.unrealized_pnl_usd).filter(
+        models.DashboardMetrics.owner_id.in_(owner_ids)
+    ).all()
+    return record(db, [(owner_id, None, usd, None) for owner_id, usd in totals], now)
+
+
+def downsample(db: Session, now: float | None = None):
+    now = now or time.time()
+    for (resolution, retention), next_tier in zip(TIERS, TIERS[1:] + (None,)):
+        if next_tier is None:
+            cutoff = int(now - retention)
+        else:
+            # Only whole buckets of the next tier are rolled up
+            next_resolution = next_tier[0]
+            cutoff = int((now - retention) // next_resolution) * next_resolution
+            next_bucket = Snapshot.bucket // next_resolution * next_resolution
+            rollup = select(
+                literal(next_resolution),
+                next_bucket,
+                Snapshot.owner_id,
+                Snapshot.position_group_id,
+                func.avg(Snapshot.unrealized_pnl_usd),
+                func.avg(Snapshot.unrealized_pnl_percent),
+            ).where(
+                Snapshot.resolution == resolution,
+                Snapshot.bucket < cutoff,
+            ).group_by(next_bucket, Snapshot.owner_id, Snapshot.position_group_id)
+            db.execute(insert(Snapshot).from_select(
+                ["resolution", "bucket", "owner_id", "position_group_id", "unrealized_pnl_usd", "unrealized_pnl_percent"],
+                rollup,
+            ))
+        removed = db.execute(delete(Snapshot).where(Snapshot.resolution == resolution, Snapshot.bucket < cutoff)).rowcount
+        if removed:
+            logger.info(f"PnL history: moved {removed} points older than {retention}s out of the {resolution}s tier")
+    db.commit()
+
+    # Forget series that have not been written within the raw tier's retention
+    stale_before = int(now - TIERS[0][1])
+    for key in [key for key, (bucket, _, _) in _last_written.items() if bucket < stale_before]:
+        del _last_written[key]
+
+
+async def downsample_task():
+    while True:
+        await asyncio.sleep(DOWNSAMPLE_INTERVAL_SECONDS)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(downsample)
+        except Exception:
+            logger.exception("PnL history downsampling failed")
+
+
+def get_series(db: Session, owner_id: int, position_group_id: int | None, start: int, end: int, max_points: int = MAX_POINTS) -> dict:
+    # Reads the finest resolution that keeps the range within max_points. Coarser tiers hold
+    # the periods already rolled up, so they never overlap the finer ones.
+    resolution = next((r for r, _ in TIERS if (end - start) / r <= max_points), TIERS[-1][0])
+    query = db.query(Snapshot.bucket, Snapshot.unrealized_pnl_usd, Snapshot.unrealized_pnl_percent).filter(
+        Snapshot.owner_id == owner_id,
+        Snapshot.position_group_id == position_group_id if position_group_id is not None else Snapshot.position_group_id.is_(None),
+        Snapshot.bucket >= start,
+        Snapshot.bucket <= end,
+    ).order_by(Snapshot.bucket)
+    points = []
+    current_bucket = None
+    for bucket, usd, percent in query:
+        if bucket // resolution * resolution == current_bucket:
+            # Finer points inside an already emitted bucket: keep the latest value
+            points[-1].update({"pnl_usd": usd, "pnl_percent": percent})
+            continue
+        current_bucket = bucket // resolution * resolution
+        points.append({"timestamp": current_bucket, "pnl_usd": usd, "pnl_percent": percent})
+    return {"resolution": resolution, "points": points}
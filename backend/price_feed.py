@@ -0,0 +1,184 @@
+import abc
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+import ccxt.pro as ccxtpro
+
+from . import config, metrics, mock_exchange, utils
+from .logging_config import logger
+
+
+class PriceFeed(abc.ABC):
+    # One async subscription per (exchange, symbol), fanning ticks out to listeners.
+    # Subclasses implement watch() as an async generator of last prices.
+    initial_backoff = 1.0
+    max_backoff = 60.0
+
+    def __init__(self):
+        self.prices = {}
+        self._listeners = []
+        self._subscriptions = {}
+
+    def add_listener(self, listener):
+        # Listeners are called inline for every tick and must not block
+        self._listeners.append(listener)
+
+    def subscriptions(self):
+        return set(self._subscriptions)
+
+    def subscribe(self, exchange_name: str, symbol: str):
+        key = (exchange_name.lower(), symbol)
+        if key not in self._subscriptions:
+            logger.info(f"Subscribing to {key[0]} {symbol} prices")
+            self._subscriptions[key] = asyncio.create_task(self._run(*key))
+
+    def unsubscribe(self, exchange_name: str, symbol: str):
+        key = (exchange_name.lower(), symbol)
+        task = self._subscriptions.pop(key, None)
+        if task:
+            logger.info(f"Unsubscribing from {key[0]} {symbol} prices")
+            task.cancel()
+        self.prices.pop(key, None)
+
+    async def close(self):
+        for key in list(self._subscriptions):
+            self.unsubscribe(*key)
+
+    @abc.abstractmethod
+    def watch(self, exchange_name: str, symbol: str):
+        ...
+
+    async def _run(self, exchange_name: str, symbol: str):
+        backoff = self.initial_backoff
+        while True:
+            try:
+                async for price in self.watch(exchange_name, symbol):
+                    backoff = self.initial_backoff
+                    self._publish(exchange_name, symbol, price)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.increment("price_feed.reconnects")
+                logger.warning(f"Price feed for {exchange_name} {symbol} failed: {e}. Reconnecting in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _publish(self, exchange_name: str, symbol: str, price: float):
+        self.prices[(exchange_name, symbol)] = price
+        metrics.increment("price_feed.ticks")
+        for listener in self._listeners:
+            try:
+                listener(exchange_name, symbol, price)
+            except Exception:
+                logger.exception(f"Price listener failed for {exchange_name} {symbol}")
+
+
+class CcxtProPriceFeed(PriceFeed):
+    # Streams tickers over the exchange's websocket API
+    def __init__(self):
+        super().__init__()
+        self._clients = {}
+
+    def _client(self, exchange_name: str):
+        if exchange_name not in self._clients:
+            if exchange_name == mock_exchange.NAME:
+                self._clients[exchange_name] = mock_exchange.MockExchange(market=mock_exchange.shared_market())
+            else:
+                self._clients[exchange_name] = getattr(ccxtpro, exchange_name)({"enableRateLimit": True})
+        return self._clients[exchange_name]
+
+    async def watch(self, exchange_name: str, symbol: str):
+        client = self._client(exchange_name)
+        while True:
+            ticker = await client.watch_ticker(symbol)
+            if ticker.get("last"):
+                yield ticker["last"]
+
+    async def close(self):
+        await super().close()
+        for client in self._clients.values():
+            await client.close()
+        self._clients = {}
+
+
+class PollingPriceFeed(PriceFeed):
+    # REST fallback for exchanges without websockets: all subscriptions of an
+    # exchange share one bulk ticker request per interval
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._snapshots = {}
+        self._locks = defaultdict(asyncio.Lock)
+
+    async def watch(self, exchange_name: str, symbol: str):
+        while True:
+            prices = await self._poll(exchange_name)
+            if symbol in prices:
+                yield prices[symbol]
+            await asyncio.sleep(self.interval)
+
+    async def _poll(self, exchange_name: str):
+        async with self._locks[exchange_name]:
+            fetched_at, prices = self._snapshots.get(exchange_name, (0.0, {}))
+            if time.monotonic() - fetched_at >= self.interval:
+                symbols = [symbol for name, symbol in self._subscriptions if name == exchange_name]
+                prices = await asyncio.to_thread(utils.get_current_prices, exchange_name, symbols)
+                self._snapshots[exchange_name] = (time.monotonic(), prices)
+            return prices
+
+
+class ReplayPriceFeed(PriceFeed):
+    # Replays recorded ticks, one JSON object per line:
+    # {"exchange": "binance", "symbol": "BTC/USDT", "price": 65000.5, "timestamp": 1700000000000}
+    def __init__(self, path: str, speed: float = 1.0):
+        super().__init__()
+        self.path = path
+        self.speed = speed
+
+    async def watch(self, exchange_name: str, symbol: str):
+        previous_timestamp = None
+        with open(self.path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                tick = json.loads(line)
+                if tick["exchange"].lower() != exchange_name or tick["symbol"] != symbol:
+                    continue
+                if previous_timestamp is not None and self.speed > 0:
+                    await asyncio.sleep(max(0, tick["timestamp"] - previous_timestamp) / 1000 / self.speed)
+                previous_timestamp = tick["timestamp"]
+                yield tick["price"]
+
+
+class FakePriceFeed(PriceFeed):
+    # In-process feed driven by push(); pushing an exception simulates a dropped connection
+    def __init__(self):
+        super().__init__()
+        self._queues = defaultdict(asyncio.Queue)
+
+    def push(self, exchange_name: str, symbol: str, price):
+        self._queues[(exchange_name.lower(), symbol)].put_nowait(price)
+
+    async def watch(self, exchange_name: str, symbol: str):
+        queue = self._queues[(exchange_name, symbol)]
+        while True:
+            price = await queue.get()
+            if isinstance(price, Exception):
+                raise price
+            yield price
+
+
+def create_feed() -> PriceFeed:
+    if config.PRICE_FEED == "replay":
+        return ReplayPriceFeed(config.PRICE_FEED_REPLAY_FILE, config.PRICE_FEED_REPLAY_SPEED)
+    if config.PRICE_FEED == "fake":
+        return FakePriceFeed()
+    if config.PRICE_FEED == "polling":
+        return PollingPriceFeed(config.PRICE_POLL_SECONDS)
+    return CcxtProPriceFeed()
+
+
+feed = create_feed()
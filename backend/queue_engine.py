@@ -0,0 +1,211 @@
+import heapq
+import itertools
+import threading
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from . import crud, event_bus, models, schemas
+from .logging_config import logger
+
+# Re-ranks smaller than this (in percentage points) are not worth a heap push and a write
+LOSS_EPSILON_PERCENT = 0.01
+
+# Heap changes staged on a session are applied after its commit and dropped on rollback; signals
+# popped in a transaction that rolls back are put back
+_PENDING_KEY = "queue_engine.pending"
+_POPPED_KEY = "queue_engine.popped"
+
+
+def rank_key(entry: dict) -> tuple:
+    # Section 5.3 ranking: deepest loss against the signal's entry price first, then the most
+    # replaced signal, then the highest expected profit, then the oldest. Unpriced signals go last.
+    loss = entry["loss_percentage"]
+    return (
+        loss is None,
+        loss if loss is not None else 0.0,
+        -entry["replacement_count"],
+        -(entry["expected_profit"] or 0.0),
+        entry["created_at"],
+    )
+
+
+def loss_percentage(entry_price, current_price):
+    if not entry_price or not current_price:
+        return None
+    return (current_price - float(entry_price)) / float(entry_price) * 100
+
+
+class QueueEngine:
+    # Queued signals per owner in a heap keyed by rank_key. A re-rank pushes a new version of the
+    # entry and stale versions are skipped when popped, so enqueue, re-rank and pop are O(log n).
+
+    def __init__(self):
+        self._heaps = {}
+        self._entries = {}
+        self._by_owner = {}
+        self._by_series = {}
+        self._by_pair = {}
+        self._prices = {}
+        self._versions = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pairs(self):
+        return [pair for pair, signal_ids in self._by_pair.items() if signal_ids]
+
+    def _push(self, signal_id: int):
+        entry = self._entries[signal_id]
+        entry["version"] = next(self._versions)
+        heap = self._heaps.setdefault(entry["owner_id"], [])
+        heapq.heappush(heap, (rank_key(entry), entry["version"], signal_id))
+        if len(heap) > 64 and len(heap) > 4 * len(self._by_owner[entry["owner_id"]]):
+            self._compact(entry["owner_id"])
+
+    def _compact(self, owner_id: int):
+        # Drops stale versions once they outnumber the live entries
+        heap = [
+            (rank_key(self._entries[signal_id]), self._entries[signal_id]["version"], signal_id)
+            for signal_id in self._by_owner[owner_id]
+        ]
+        heapq.heapify(heap)
+        self._heaps[owner_id] = heap
+
+    def _forget(self, signal_id: int):
+        entry = self._entries.pop(signal_id, None)
+        if entry is None:
+            return
+        self._by_owner[entry["owner_id"]].discard(signal_id)
+        self._by_series.pop((entry["owner_id"], entry["pair"], entry["timeframe"]), None)
+        self._by_pair.get(entry["pair"], set()).discard(signal_id)
+
+    def _entry(self, signal: models.QueuedSignal) -> dict:
+        return {
+            "owner_id": signal.owner_id,
+            "pair": signal.pair,
+            "timeframe": signal.timeframe,
+            "entry_price": (signal.payload or {}).get("tv.entry_price"),
+            "loss_percentage": signal.loss_percentage,
+            "replacement_count": signal.replacement_count or 0,
+            "expected_profit": signal.expected_profit,
+            "created_at": signal.created_at.timestamp() if signal.created_at else 0.0,
+        }
+
+    def _track(self, signal_id: int, entry: dict):
+        with self._lock:
+            self._forget(signal_id)
+            self._entries[signal_id] = entry
+            self._by_owner.setdefault(entry["owner_id"], set()).add(signal_id)
+            self._by_series[(entry["owner_id"], entry["pair"], entry["timeframe"])] = signal_id
+            self._by_pair.setdefault(entry["pair"], set()).add(signal_id)
+            self._push(signal_id)
+
+    def _rerank(self, signal_id: int, loss: float):
+        with self._lock:
+            entry = self._entries.get(signal_id)
+            if entry is not None:
+                entry["loss_percentage"] = loss
+                self._push(signal_id)
+
+    def track(self, signal: models.QueuedSignal):
+        # For signals already committed; changes made in a transaction go through enqueue
+        self._track(signal.id, self._entry(signal))
+
+    def discard(self, signal_id: int):
+        with self._lock:
+            self._forget(signal_id)
+
+    def enqueue(self, db: Session, user_id: int, pair: str, timeframe: str, payload: dict) -> models.QueuedSignal:
+        # A newer signal for an already queued pair/timeframe replaces the payload in place
+        signal_id = self._by_series.get((user_id, pair, timeframe))
+        signal = db.get(models.QueuedSignal, signal_id) if signal_id is not None else None
+        if signal is not None and signal.status == "Queued":
+            signal.payload = payload
+            signal.replacement_count = (signal.replacement_count or 0) + 1
+            signal.expected_profit = payload.get("expected_profit")
+            logger.info(f"Replaced queued signal {signal.id} for {pair} {timeframe} ({signal.replacement_count} replacements)")
+        else:
+            signal = crud.create_queued_signal(
+                db, schemas.QueuedSignalCreate(pair=pair, timeframe=timeframe, payload=payload), user_id, commit=False
+            )
+            signal.replacement_count = 0
+            signal.expected_profit = payload.get("expected_profit")
+        # Rank against the last seen price right away instead of waiting for the next tick
+        signal.loss_percentage = loss_percentage(payload.get("tv.entry_price"), self._prices.get(pair))
+        db.flush()
+        db.info.setdefault(_PENDING_KEY, []).append((self._track, signal.id, self._entry(signal)))
+        event_bus.stage(db, user_id, "queue", signal.id, {
+            "id": signal.id,
+            "pair": signal.pair,
+            "timeframe": signal.timeframe,
+            "status": signal.status,
+            "loss_percentage": signal.loss_percentage,
+            "replacement_count": signal.replacement_count,
+            "expected_profit": signal.expected_profit,
+        })
+        return signal
+
+    def pop(self, db: Session, owner_id: int) -> int | None:
+        # Takes the best-ranked signal out right away so the caller's next pop gets the one after
+        # it; it is put back if the caller's transaction rolls back
+        with self._lock:
+            heap = self._heaps.get(owner_id, [])
+            while heap:
+                _, version, signal_id = heapq.heappop(heap)
+                entry = self._entries.get(signal_id)
+                if entry is not None and entry["version"] == version:
+                    self._forget(signal_id)
+                    db.info.setdefault(_POPPED_KEY, []).append((signal_id, entry))
+                    return signal_id
+            return None
+
+    def reprice(self, db: Session, prices: dict) -> int:
+        # Re-ranks the queued signals of the pairs that moved and stores their loss percentage
+        updates = []
+        with self._lock:
+            for pair, price in prices.items():
+                if price:
+                    self._prices[pair] = price
+                for signal_id in self._by_pair.get(pair, ()):
+                    entry = self._entries[signal_id]
+                    loss = loss_percentage(entry["entry_price"], price)
+                    previous = entry["loss_percentage"]
+                    if loss is None or (previous is not None and abs(loss - previous) <= LOSS_EPSILON_PERCENT):
+                        continue
+                    updates.append({"id": signal_id, "loss_percentage": loss})
+                    event_bus.stage(db, entry["owner_id"], "queue", signal_id, updates[-1])
+        if updates:
+            db.execute(update(models.QueuedSignal), updates)
+            db.info.setdefault(_PENDING_KEY, []).extend((self._rerank, u["id"], u["loss_percentage"]) for u in updates)
+        return len(updates)
+
+    def ranked(self, owner_id: int) -> list[int]:
+        with self._lock:
+            return sorted(self._by_owner.get(owner_id, ()), key=lambda signal_id: rank_key(self._entries[signal_id]))
+
+    def rebuild(self, db: Session):
+        signals = db.query(models.QueuedSignal).filter(models.QueuedSignal.status == "Queued").all()
+        with self._lock:
+            self._heaps, self._entries, self._by_owner, self._by_series, self._by_pair = {}, {}, {}, {}, {}
+        for signal in signals:
+            self.track(signal)
+        logger.info(f"Queue engine rebuilt with {len(signals)} queued signals")
+
+
+engine = QueueEngine()
+
+
+@event.listens_for(Session, "after_commit")
+def _apply(session: Session):
+    session.info.pop(_POPPED_KEY, None)
+    for apply, signal_id, value in session.info.pop(_PENDING_KEY, ()):
+        apply(signal_id, value)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+    for signal_id, entry in session.info.pop(_POPPED_KEY, ()):
+        engine._track(signal_id, entry)
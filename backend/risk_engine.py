@@ -1,34 +1,184 @@
+import threading
+from datetime import datetime, timezone
+
+from sortedcontainers import SortedList
 from sqlalchemy.orm import Session
-from . import crud, models
-from .database import SessionLocal
+
+from . import config_manager, event_bus, models, offset_planner
 from .logging_config import logger
 
-def run_risk_engine():
-    db: Session = SessionLocal()
-    try:
-        logger.info("Running risk engine...")
-        # TODO: Get these values from config
-        loss_threshold_percent = -0.05 
-        
-        losing_groups = db.query(models.PositionGroup).filter(
-            models.PositionGroup.status == "Live",
-            # TODO: Add a proper PnL calculation
-            # models.PositionGroup.unrealized_pnl_percent < loss_threshold_percent
-        ).all()
-
-        if not losing_groups:
-            logger.info("No losing positions found.")
+BY_PERCENT = "percent"
+BY_USD = "usd"
+
+
+class RiskBook:
+    # Live groups per owner ordered by unrealized PnL (percent and USD), updated with every PnL
+    # change, so worst-loser and top-k queries are O(log n) instead of a table scan
+
+    def __init__(self):
+        self._groups = {}
+        self._rankings = {}
+        self._dirty_owners = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._groups)
+
+    def _ranking(self, owner_id: int, by: str) -> SortedList:
+        return self._rankings.setdefault(owner_id, {BY_PERCENT: SortedList(), BY_USD: SortedList()})[by]
+
+    def _discard(self, group_id: int):
+        previous = self._groups.pop(group_id, None)
+        if previous is None:
             return
+        owner_id, percent, usd = previous
+        if percent is not None:
+            self._ranking(owner_id, BY_PERCENT).discard((percent, group_id))
+        if usd is not None:
+            self._ranking(owner_id, BY_USD).discard((usd, group_id))
+        self._dirty_owners.add(owner_id)
+
+    def update(self, rows):
+        # rows: (group_id, owner_id, unrealized_pnl_percent, unrealized_pnl_usd)
+        with self._lock:
+            for group_id, owner_id, percent, usd in rows:
+                self._discard(group_id)
+                self._groups[group_id] = (owner_id, percent, usd)
+                if percent is not None:
+                    self._ranking(owner_id, BY_PERCENT).add((percent, group_id))
+                if usd is not None:
+                    self._ranking(owner_id, BY_USD).add((usd, group_id))
+                self._dirty_owners.add(owner_id)
+
+    def remove(self, group_ids):
+        with self._lock:
+            for group_id in group_ids:
+                self._discard(group_id)
+
+    def worst_loser(self, owner_id: int, by: str = BY_PERCENT):
+        with self._lock:
+            ranking = self._ranking(owner_id, by)
+            if not ranking or ranking[0][0] >= 0:
+                return None
+            value, group_id = ranking[0]
+            return group_id, value
+
+    def top_losers(self, owner_id: int, k: int, by: str = BY_PERCENT) -> list[tuple]:
+        with self._lock:
+            ranking = self._ranking(owner_id, by)
+            end = min(k, ranking.bisect_left((0.0, -1)))
+            return [(group_id, value) for value, group_id in ranking.islice(0, end)]
+
+    def top_winners(self, owner_id: int, k: int, by: str = BY_PERCENT) -> list[tuple]:
+        with self._lock:
+            ranking = self._ranking(owner_id, by)
+            start = max(ranking.bisect_right((0.0, float("inf"))), len(ranking) - k)
+            return [(group_id, value) for value, group_id in ranking.islice(start, len(ranking), reverse=True)]
+
+    def counts(self, owner_id: int) -> dict:
+        with self._lock:
+            ranking = self._ranking(owner_id, BY_PERCENT)
+            return {
+                "losers": ranking.bisect_left((0.0, -1)),
+                "winners": len(ranking) - ranking.bisect_right((0.0, float("inf"))),
+            }
+
+    def take_dirty_owners(self) -> set:
+        with self._lock:
+            owners, self._dirty_owners = self._dirty_owners, set()
+            return owners
+
+    def rebuild(self, db: Session):
+        rows = db.query(
+            models.PositionGroup.id,
+            models.PositionGroup.owner_id,
+            models.PositionGroup.unrealized_pnl_percent,
+            models.PositionGroup.unrealized_pnl_usd,
+        ).filter(models.PositionGroup.status == "Live").all()
+        with self._lock:
+            self._groups, self._rankings = {}, {}
+        self.update(rows)
+        logger.info(f"Risk book rebuilt with {len(rows)} live groups")
+
+
+book = RiskBook()
+
+# Published per owner for the dashboard: Disabled, Idle or Active
+_status = {}
+_triggered_owners = set()
+
+
+def risk_settings() -> dict:
+    settings = config_manager.load_config().get("risk_management", {})
+    return {
+        "enabled": settings.get("risk_engine_enabled", False),
+        # A group losing more than max_loss_per_trade percent activates the engine
+        "loss_threshold_percent": -abs(settings.get("max_loss_per_trade", 5)),
+    }
+
+
+def evaluate(owner_ids) -> set:
+    # Re-checks the threshold for owners whose rankings changed. Returns the owners that crossed
+    # into Active or whose worst loser changed while Active.
+    settings = risk_settings()
+    triggered = set()
+    for owner_id in owner_ids:
+        previous = _status.get(owner_id, {})
+        worst = book.worst_loser(owner_id)
+        if not settings["enabled"]:
+            state = "Disabled"
+        elif worst is not None and worst[1] <= settings["loss_threshold_percent"]:
+            state = "Active"
+        else:
+            state = "Idle"
+        _status[owner_id] = {
+            **previous,
+            "state": state,
+            "loss_threshold_percent": settings["loss_threshold_percent"],
+            "worst_loser": {"position_group_id": worst[0], "unrealized_pnl_percent": worst[1]} if worst else None,
+            **book.counts(owner_id),
+        }
+        if state == "Active" and (previous.get("state") != "Active" or previous.get("worst_loser") != _status[owner_id]["worst_loser"]):
+            triggered.add(owner_id)
+        if _status[owner_id] != previous:
+            event_bus.bus.publish(owner_id, "risk", owner_id, dict(_status[owner_id]))
+    _triggered_owners.update(triggered)
+    return triggered
+
+
+def get_status(owner_id: int) -> dict:
+    return _status.get(owner_id) or {"state": "Disabled" if not risk_settings()["enabled"] else "Idle"}
+
+
+def take_triggered_owners() -> set:
+    global _triggered_owners
+    owners, _triggered_owners = _triggered_owners, set()
+    return owners
+
+
+def run_risk_engine(db: Session, owner_ids):
+    for owner_id in owner_ids:
+        logger.info(f"Running risk engine for user {owner_id}...")
 
         # Selection Logic (Section 4.4)
         # 1. Select the losing trade with the highest loss percent
-        # TODO: Sort by unrealized_pnl_percent
-        worst_loser = losing_groups[0]
-        
-        logger.info(f"Worst loser selected: PositionGroup {worst_loser.id}")
+        worst = book.worst_loser(owner_id)
+        if worst is None or get_status(owner_id)["state"] != "Active":
+            logger.info("No losing positions past the threshold.")
+            continue
+        worst_loser = db.get(models.PositionGroup, worst[0])
+
+        logger.info(f"Worst loser selected: PositionGroup {worst_loser.id} at {worst[1]:.2f}%")
+        _status[owner_id]["last_run"] = datetime.now(timezone.utc).isoformat()
+
+        # Offset Logic (Section 4.5): the projected plan is published for the dashboard
+        plan = offset_planner.build_plan(db, worst_loser)
+        _status[owner_id]["projected_plan"] = plan
+        event_bus.bus.publish(owner_id, "risk", owner_id, dict(_status[owner_id]))
+        logger.info(
+            f"Offset plan for PositionGroup {worst_loser.id}: {len(plan['actions'])} partial closes covering "
+            f"{plan['covered_usd']:.2f} of {plan['loss_usd']:.2f} USD"
+        )
 
         # Offset Execution Logic (Section 4.5)
-        # TODO: Implement this
-        
-    finally:
-        db.close()
+        # TODO: Place the planned partial closes
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, SerializeAsAny
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, List, Optional, Tuple
 
 class ApiKeyBase(BaseModel):
     name: str
@@ -25,6 +25,13 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: str | None = None
 
+class AuthenticatedUser(BaseModel):
+    id: int
+    username: str
+
+    class Config:
+        from_attributes = True
+
 class UserBase(BaseModel):
     username: str
 
@@ -87,7 +94,7 @@ class PositionGroupUpdate(PositionGroupBase):
     unrealized_pnl_usd: Optional[float] = None
     closed_at: Optional[datetime] = None
 
-class PositionGroup(PositionGroupBase):
+class PositionGroupSummary(PositionGroupBase):
     id: int
     status: str
     avg_entry_price: Optional[float] = None
@@ -96,13 +103,20 @@ class PositionGroup(PositionGroupBase):
     created_at: datetime
     closed_at: Optional[datetime] = None
     owner_id: int
-    pyramids: List[Pyramid] = []
     pyramids_count: int = 0
     dca_legs_count: int = 0
 
     class Config:
         from_attributes = True
 
+class PositionGroup(PositionGroupSummary):
+    pyramids: List[Pyramid] = []
+
+class PositionGroupPaginated(BaseModel):
+    # Summary pages hold PositionGroupSummary items, full pages PositionGroup items
+    position_groups: List[SerializeAsAny[PositionGroupSummary]]
+    next_cursor: Optional[str] = None
+
 class QueuedSignalBase(BaseModel):
     pair: str
     timeframe: str
@@ -133,6 +147,7 @@ class QueuedSignal(QueuedSignalBase):
         from_attributes = True
 
 class WebhookLog(BaseModel):
+    id: int
     timestamp: datetime
     payload: dict
     status: str
@@ -143,6 +158,8 @@ class WebhookLog(BaseModel):
 class WebhookLogPaginated(BaseModel):
     logs: List[WebhookLog]
     total: int
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = None
 
 class User(UserBase):
     id: int
@@ -151,4 +168,74 @@ class User(UserBase):
     queued_signals: list[QueuedSignal] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Engine configuration (backend/config.json). Unknown keys are kept so the file can grow
+# ahead of the schema.
+class MockExchangeSettings(BaseModel):
+    # Simulated venue used when the exchange name is "mock"; see mock_exchange.SimulatedMarket
+    symbols: Optional[List[str]] = None
+    precision: Optional[Dict[str, float]] = None
+    default_price: float = 100.0
+    price_paths: Dict[str, List[Tuple[float, float]]] = {}
+    loop: bool = False
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    error_rate: float = 0.0
+    errors: Dict[str, float] = {}
+    error_class: str = "NetworkError"
+    tick_seconds: float = 1.0
+    seed: Optional[int] = None
+
+    class Config:
+        extra = "allow"
+
+class ExchangeSettings(BaseModel):
+    name: str = "binance"
+    testnet: bool = True
+    mock: Optional[MockExchangeSettings] = None
+
+    class Config:
+        extra = "allow"
+
+class ExecutionPoolSettings(BaseModel):
+    max_open_groups: int = 10
+
+    class Config:
+        extra = "allow"
+
+class DCALevel(BaseModel):
+    price_gap: float
+    capital_weight: float
+    tp_target: float
+
+class GridStrategySettings(BaseModel):
+    capital: Optional[float] = None
+    dca_config: List[DCALevel] = []
+
+    class Config:
+        extra = "allow"
+
+class RiskManagementSettings(BaseModel):
+    risk_engine_enabled: bool = False
+    activation_threshold: Optional[float] = None
+    max_loss_per_trade: float = 5
+
+    class Config:
+        extra = "allow"
+
+class WebhookSettings(BaseModel):
+    secret: Optional[str] = None
+
+    class Config:
+        extra = "allow"
+
+class EngineConfig(BaseModel):
+    exchange: ExchangeSettings = ExchangeSettings()
+    execution_pool: ExecutionPoolSettings = ExecutionPoolSettings()
+    grid_strategy: GridStrategySettings = GridStrategySettings()
+    risk_management: RiskManagementSettings = RiskManagementSettings()
+    webhook: WebhookSettings = WebhookSettings()
+
+    class Config:
+        extra = "allow"
@@ -0,0 +1,144 @@
+from sqlalchemy.orm import Session
+
+from . import config_manager, crud, dashboard_metrics, event_bus, models, order_executor, queue_engine, schemas, utils
+from .logging_config import logger
+
+
+class SignalRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def get_precision_rules(payload: dict):
+    exchange_name = payload.get("tv.exchange", "binance") # Default to binance for now
+    symbol = payload.get("tv.symbol", "BTC/USDT") # Default to BTC/USDT for now
+    return utils.get_precision_rules(exchange_name, symbol)
+
+
+def process_signal(db: Session, payload: dict, user_id: int, precision_rules: dict | None):
+    # Validates a webhook signal and opens or extends its PositionGroup in one unit of work.
+    # precision_rules are looked up by the caller so no exchange I/O happens inside the transaction.
+    status_message = "Webhook received and validated"
+    status_code = 200
+
+    exchange_name = payload.get("tv.exchange", "binance")
+    symbol = payload.get("tv.symbol", "BTC/USDT")
+
+    if not precision_rules:
+        status_message = f"Could not fetch precision rules for {exchange_name} and {symbol}"
+        status_code = 400
+    else:
+        if "trade_price" in payload and not utils.validate_precision(payload["trade_price"], precision_rules["price"]):
+            status_message = "Invalid precision for trade_price"
+            status_code = 400
+
+        if "trade_quantity" in payload and not utils.validate_precision(payload["trade_quantity"], precision_rules["amount"]):
+            status_message = "Invalid precision for trade_quantity"
+            status_code = 400
+
+    # Everything below is written as one unit of work and committed once
+    crud.create_webhook_log(db, payload, status_message, commit=False)
+    dashboard_metrics.record_webhook(db, user_id)
+
+    if status_code != 200:
+        db.commit()
+        raise SignalRejected(status_code, status_message)
+
+    # Milestone 2 Logic: Position and Pyramid Handling
+    if not all([payload.get("tv.symbol"), payload.get("tv.timeframe"), payload.get("tv.entry_price")]):
+        db.commit()
+        raise SignalRejected(400, "Missing required fields in webhook payload")
+
+    result = open_position(db, payload, user_id)
+    db.commit()
+    return result
+
+
+def max_open_groups() -> int:
+    return config_manager.load_config().get("execution_pool", {}).get("max_open_groups", 10)
+
+
+def dca_config():
+    # Leg layout of new pyramids from the config snapshot, the defaults when none is configured
+    return config_manager.load_config().get("grid_strategy", {}).get("dca_config") or config_manager.DEFAULT_CONFIG["grid_strategy"]["dca_config"]
+
+
+def count_live_groups(db: Session, user_id: int) -> int:
+    return db.query(models.PositionGroup).filter(
+        models.PositionGroup.owner_id == user_id,
+        models.PositionGroup.status == "Live"
+    ).count()
+
+
+def find_open_group(db: Session, user_id: int, pair, timeframe) -> models.PositionGroup | None:
+    return db.query(models.PositionGroup).filter(
+        models.PositionGroup.pair == pair,
+        models.PositionGroup.timeframe == timeframe,
+        models.PositionGroup.owner_id == user_id,
+        models.OPEN_GROUP,
+    ).first()
+
+
+def lock_execution_pool(db: Session, user_id: int):
+    # Serializes pool checks for a user across signal partitions until the caller's transaction ends
+    db.query(models.User.id).filter(models.User.id == user_id).with_for_update().scalar()
+
+
+def open_position(db: Session, payload: dict, user_id: int) -> dict:
+    # Opens or extends the PositionGroup for a validated signal, or queues it when the pool is full.
+    # Part of the caller's unit of work; the caller commits.
+    pair = payload.get("tv.symbol")
+    timeframe = payload.get("tv.timeframe")
+    entry_price = payload.get("tv.entry_price")
+
+    # Check for existing PositionGroup
+    position_group = find_open_group(db, user_id, pair, timeframe)
+
+    if not position_group:
+        # Check execution pool
+        lock_execution_pool(db, user_id)
+        if count_live_groups(db, user_id) >= max_open_groups():
+            logger.info(f"Execution pool is full. Queuing signal for {pair} {timeframe}")
+            queue_engine.engine.enqueue(db, user_id, pair, timeframe, payload)
+            return {"message": "Signal queued due to full execution pool"}
+
+        # Create a new PositionGroup
+        logger.info(f"Creating new PositionGroup for {pair} {timeframe}")
+        position_group_schema = schemas.PositionGroupCreate(pair=pair, timeframe=timeframe, status="Live")
+        position_group = crud.create_position_group(db, position_group_schema, user_id, commit=False)
+
+    # Create a new Pyramid for this signal
+    logger.info(f"Creating new Pyramid for PositionGroup {position_group.id}")
+    pyramid_schema = schemas.PyramidCreate(position_group_id=position_group.id, entry_price=entry_price)
+
+    # DCA legs follow the configured grid
+    pyramid = crud.create_pyramid_with_legs(db, pyramid_schema, dca_config())
+
+    # The legs' orders are placed once the caller's transaction has committed
+    order_executor.submit_after_commit(db, pyramid.id)
+
+    return {"message": "Webhook processed and position updated"}
+
+
+def promote_queued_signals(db: Session, user_id: int) -> int:
+    # Fills free execution pool slots with the best-ranked queued signals; the caller commits
+    promoted = 0
+    lock_execution_pool(db, user_id)
+    free_slots = max_open_groups() - count_live_groups(db, user_id)
+    while free_slots > 0:
+        signal_id = queue_engine.engine.pop(db, user_id)
+        if signal_id is None:
+            break
+        queued_signal = db.get(models.QueuedSignal, signal_id)
+        if queued_signal is None or queued_signal.status != "Queued":
+            continue
+        logger.info(f"Promoting queued signal {queued_signal.id} for {queued_signal.pair} {queued_signal.timeframe}")
+        queued_signal.status = "Processed"
+        dashboard_metrics.record_queued_signals(db, user_id, -1)
+        event_bus.stage(db, user_id, "queue", queued_signal.id, {"id": queued_signal.id, "status": "Processed"})
+        open_position(db, queued_signal.payload, user_id)
+        promoted += 1
+        free_slots -= 1
+    return promoted
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import zlib
+
+import redis.asyncio as redis
+from redis.exceptions import ResponseError
+
+from . import config, metrics, signal_processor, tasks
+from .database import AsyncSessionLocal
+from .logging_config import logger
+
+# Signals are partitioned by hash(owner, pair, timeframe) across several streams. Each partition
+# is drained by exactly one worker at a time (guarded by a lease), which keeps strict ordering
+# per key while unrelated keys are processed in parallel.
+STREAM_PREFIX = "ex_engine:signals"
+DEAD_LETTER_STREAM = "ex_engine:signals:dead"
+CONSUMER_GROUP = "signal-workers"
+LEASE_PREFIX = "ex_engine:signals:lease"
+LEASE_TTL_MS = 15000
+READ_BLOCK_MS = 5000
+READ_COUNT = 50
+RETRY_DELAY_SECONDS = 1
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+_RENEW_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+class LeaseLost(Exception):
+    pass
+
+
+redis_client = redis.from_url(config.REDIS_URL, encoding="utf-8", decode_responses=True)
+
+
+def stream_name(partition: int) -> str:
+    return f"{STREAM_PREFIX}:{partition}"
+
+
+def partition_for(user_id: int, pair, timeframe) -> int:
+    key = f"{user_id}|{pair}|{timeframe}".encode()
+    return zlib.crc32(key) % config.SIGNAL_QUEUE_PARTITIONS
+
+
+async def enqueue(raw_payload: bytes, payload: dict, user_id: int) -> str:
+    stream = stream_name(partition_for(user_id, payload.get("tv.symbol"), payload.get("tv.timeframe")))
+    message_id = await redis_client.xadd(stream, {
+        "user_id": user_id,
+        "payload": raw_payload.decode(),
+    })
+    metrics.increment("signal_queue.enqueued")
+    return message_id
+
+
+async def ensure_group(stream: str):
+    try:
+        await redis_client.xgroup_create(stream, CONSUMER_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def process_entry(message_id: str, fields: dict):
+    payload = json.loads(fields["payload"])
+    user_id = int(fields["user_id"])
+    precision_rules = await asyncio.to_thread(signal_processor.get_precision_rules, payload)
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.run_sync(signal_processor.process_signal, payload, user_id, precision_rules)
+        except signal_processor.SignalRejected as e:
+            logger.warning(f"Queued signal {message_id} rejected: {e.detail}")
+            metrics.increment("signal_queue.rejected")
+            return
+    tasks.watch_pair(payload.get("tv.symbol"))
+    metrics.increment("signal_queue.processed")
+
+
+async def acknowledge(stream: str, message_id: str):
+    # Processed entries are removed so the stream length is the queue depth
+    await redis_client.xack(stream, CONSUMER_GROUP, message_id)
+    await redis_client.xdel(stream, message_id)
+
+
+async def renew_lease(lease_key: str) -> bool:
+    # Extends the lease only if this worker still holds it; doubles as the ownership check
+    return bool(await redis_client.eval(_RENEW_LEASE, 1, lease_key, WORKER_ID, LEASE_TTL_MS))
+
+
+async def keep_lease(lease_key: str):
+    # Renews the lease in the background while a batch is processed, so slow entries do not outlive it
+    while True:
+        await asyncio.sleep(LEASE_TTL_MS / 1000 / 3)
+        if not await renew_lease(lease_key):
+            return
+
+
+async def run_partition_worker(partition: int):
+    stream = stream_name(partition)
+    lease_key = f"{LEASE_PREFIX}:{partition}"
+    # The consumer name is per partition, so a new lease holder picks up its predecessor's pending entries
+    consumer = f"partition-{partition}"
+    attempts = {}
+    while True:
+        try:
+            held = await redis_client.set(lease_key, WORKER_ID, nx=True, px=LEASE_TTL_MS)
+            if not held:
+                held = await renew_lease(lease_key)
+            if not held:
+                await asyncio.sleep(LEASE_TTL_MS / 1000 / 3)
+                continue
+
+            await ensure_group(stream)
+            # Re-deliver our own unacknowledged entries first, then block for new ones
+            response = await redis_client.xreadgroup(CONSUMER_GROUP, consumer, {stream: "0"}, count=READ_COUNT)
+            if not response or not response[0][1]:
+                response = await redis_client.xreadgroup(
+                    CONSUMER_GROUP, consumer, {stream: ">"}, count=READ_COUNT, block=READ_BLOCK_MS
+                )
+            renewer = asyncio.create_task(keep_lease(lease_key))
+            try:
+                for _, entries in response or []:
+                    for message_id, fields in entries:
+                        # Another worker may have taken the partition over; never process or ack its entries
+                        if not await renew_lease(lease_key):
+                            raise LeaseLost(message_id)
+                        try:
+                            await process_entry(message_id, fields)
+                        except Exception:
+                            attempts[message_id] = attempts.get(message_id, 0) + 1
+                            if attempts[message_id] < config.SIGNAL_QUEUE_MAX_ATTEMPTS:
+                                # Stop the partition and retry the same entry to keep ordering
+                                raise
+                            logger.exception(f"Moving signal {message_id} to the dead-letter stream after {attempts[message_id]} attempts")
+                            await redis_client.xadd(DEAD_LETTER_STREAM, {**fields, "stream": stream, "message_id": message_id})
+                            metrics.increment("signal_queue.dead_lettered")
+                        attempts.pop(message_id, None)
+                        if not await renew_lease(lease_key):
+                            raise LeaseLost(message_id)
+                        await acknowledge(stream, message_id)
+            finally:
+                renewer.cancel()
+        except asyncio.CancelledError:
+            raise
+        except LeaseLost as e:
+            logger.warning(f"Signal worker lost the lease on partition {partition} at {e}; leaving the rest to its new holder")
+        except Exception:
+            logger.exception(f"Signal worker for partition {partition} failed, retrying")
+            await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+
+def start_workers():
+    return [asyncio.create_task(run_partition_worker(partition)) for partition in range(config.SIGNAL_QUEUE_PARTITIONS)]
+
+
+async def get_queue_stats() -> dict:
+    partitions = []
+    now_ms = int(time.time() * 1000)
+    for partition in range(config.SIGNAL_QUEUE_PARTITIONS):
+        stream = stream_name(partition)
+        depth = await redis_client.xlen(stream)
+        oldest = await redis_client.xrange(stream, count=1) if depth else []
+        pending = 0
+        if depth:
+            for group in await redis_client.xinfo_groups(stream):
+                if group["name"] == CONSUMER_GROUP:
+                    pending = group["pending"]
+        # Stream ids start with the enqueue time in milliseconds
+        lag_seconds = (now_ms - int(oldest[0][0].split("-")[0])) / 1000 if oldest else 0.0
+        partitions.append({"partition": partition, "depth": depth, "pending": pending, "lag_seconds": lag_seconds})
+    return {
+        "depth": sum(p["depth"] for p in partitions),
+        "max_lag_seconds": max((p["lag_seconds"] for p in partitions), default=0.0),
+        "dead_letter_depth": await redis_client.xlen(DEAD_LETTER_STREAM),
+        "partitions": partitions,
+    }
@@ -1,63 +1,160 @@
 import asyncio
+import time
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from . import crud, models, utils, risk_engine
-from .database import SessionLocal
+from . import config_manager, crud, event_bus, metrics, models, pnl_engine, queue_engine, risk_engine, signal_processor, tp_index, price_feed
+from .database import AsyncSessionLocal, SessionLocal
 from .logging_config import logger
 
+# Ticks arriving within this window are coalesced into one PnL/TP pass
+PRICE_TICK_BATCH_SECONDS = 0.2
+SUBSCRIPTION_SYNC_SECONDS = 30
+RISK_ENGINE_MIN_INTERVAL_SECONDS = 1
+
+_dirty_pairs = set()
+_price_updated = asyncio.Event()
+_risk_triggered = asyncio.Event()
+
+def get_exchange_name() -> str:
+    return config_manager.load_config().get("exchange", {}).get("name", "binance")
+
+def on_price_tick(exchange_name: str, symbol: str, price: float):
+    _dirty_pairs.add(symbol)
+    _price_updated.set()
+
+def watch_pair(pair: str):
+    price_feed.feed.subscribe(get_exchange_name(), pair)
+
+async def get_watched_pairs() -> set:
+    # Every pair with a live group or a pending take-profit needs a price subscription
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.PositionGroup.pair).where(models.PositionGroup.status == "Live").distinct()
+        )
+        pairs = set(result.scalars())
+    pairs.update(tp_index.index.pairs())
+    pairs.update(queue_engine.engine.pairs())
+    return pairs
+
+async def sync_price_subscriptions(exchange_name: str):
+    wanted = {(exchange_name.lower(), pair) for pair in await get_watched_pairs()}
+    for key in price_feed.feed.subscriptions() - wanted:
+        price_feed.feed.unsubscribe(*key)
+    for key in wanted:
+        price_feed.feed.subscribe(*key)
+
+def update_pnl(db: Session, pairs: set, prices: dict) -> int:
+    # USD PnL needs the capital behind each group; without it only the percentage is computed
+    capital = config_manager.load_config().get("grid_strategy", {}).get("capital")
+    return pnl_engine.update_pnl(db, pairs, prices, capital)
+
+def evaluate_take_profits(db: Session, pair: str, current_price: float) -> list[int]:
+    # Only legs whose trigger price was crossed by this price update are visited
+    leg_ids = tp_index.index.crossed(pair, current_price)
+    if not leg_ids:
+        return []
+    for leg_id in leg_ids:
+        logger.info(f"Take-profit hit for DCALeg {leg_id} at price {current_price}")
+    # TODO: Placeholder for order placement logic to close the position
+    db.query(models.DCALeg).filter(
+        models.DCALeg.id.in_(leg_ids),
+        models.DCALeg.status == "Filled",
+    ).update({"status": "Hit TP"}, synchronize_session=False)
+    if event_bus.bus.wants(None):
+        for leg_id, group_id, owner_id in db.query(
+            models.DCALeg.id, models.PositionGroup.id, models.PositionGroup.owner_id
+        ).join(models.Pyramid, models.DCALeg.pyramid_id == models.Pyramid.id).join(
+            models.PositionGroup, models.Pyramid.position_group_id == models.PositionGroup.id
+        ).filter(models.DCALeg.id.in_(leg_ids), models.DCALeg.status == "Hit TP"):
+            event_bus.stage(db, owner_id, "leg", leg_id, {"id": leg_id, "position_group_id": group_id, "status": "Hit TP"})
+    db.commit()
+    tp_index.index.remove(leg_ids)
+    return leg_ids
+
+def close_finished_groups(db: Session, leg_ids: list[int]) -> dict:
+    # Groups whose filled legs have all hit TP are closed and their pool slots refilled from the queue
+    closed = crud.close_finished_position_groups(db, leg_ids)
+    promoted = 0
+    for owner_id in {pg.owner_id for pg in closed}:
+        promoted += signal_processor.promote_queued_signals(db, owner_id)
+    db.commit()
+    for pg in closed:
+        logger.info(f"Closed PositionGroup {pg.id} for {pg.pair} {pg.timeframe}")
+    return {"groups_closed": len(closed), "signals_promoted": promoted}
+
+def process_price_updates(db: Session, pairs: set, prices: dict) -> dict:
+    position_groups = update_pnl(db, pairs, prices)
+    hit_leg_ids = []
+    for pair in pairs:
+        if prices.get(pair):
+            hit_leg_ids += evaluate_take_profits(db, pair, prices[pair])
+    stats = close_finished_groups(db, hit_leg_ids) if hit_leg_ids else {"groups_closed": 0, "signals_promoted": 0}
+    signals_reranked = queue_engine.engine.reprice(db, prices)
+    db.commit()
+    return {"position_groups": position_groups, "legs_hit": len(hit_leg_ids), "signals_reranked": signals_reranked, **stats}
+
+def run_in_session(unit_of_work, *args):
+    # Runs a sync unit of work on its own session. Called through asyncio.to_thread, so the PnL
+    # arrays, index walks and ORM I/O of a cycle do not hold up the event loop.
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        return unit_of_work(db, *args)
+    finally:
+        db.close()
+
 async def check_take_profits():
+    # Driven by the price feed: each batch of ticks updates PnL and TP for the pairs that moved
+    global _dirty_pairs
+    price_feed.feed.add_listener(on_price_tick)
+    last_subscription_sync = 0.0
     while True:
-        db: Session = SessionLocal()
+        exchange_name = get_exchange_name()
+        try:
+            if time.monotonic() - last_subscription_sync >= SUBSCRIPTION_SYNC_SECONDS:
+                await sync_price_subscriptions(exchange_name)
+                last_subscription_sync = time.monotonic()
+        except Exception:
+            logger.exception("Failed to sync price subscriptions")
+
         try:
-            logger.info("Checking for take-profit opportunities and updating PnL...")
-
-            # Update PnL for live position groups
-            live_position_groups = db.query(models.PositionGroup).filter(models.PositionGroup.status == "Live").all()
-            for pg in live_position_groups:
-                filled_legs = []
-                total_capital_allocated = 0.0
-                weighted_entry_sum = 0.0
-
-                for pyramid in pg.pyramids:
-                    for leg in pyramid.dca_legs:
-                        if leg.status == "Filled" and leg.fill_price and leg.capital_weight:
-                            filled_legs.append(leg)
-                            total_capital_allocated += leg.capital_weight # Assuming capital_weight is a proportion of total capital
-                            weighted_entry_sum += leg.fill_price * leg.capital_weight
-                
-                if filled_legs and total_capital_allocated > 0:
-                    pg.avg_entry_price = weighted_entry_sum / total_capital_allocated
-                else:
-                    pg.avg_entry_price = None
-
-                current_price = utils.get_current_price("binance", pg.pair) # TODO: Get exchange from config
-                if current_price and pg.avg_entry_price:
-                    # Assuming a 'long' position for PnL calculation for now
-                    pg.unrealized_pnl_percent = ((current_price - pg.avg_entry_price) / pg.avg_entry_price) * 100
-                    # For USD PnL, we need the total position size, which is not yet in the model
-                    # For now, we'll leave unrealized_pnl_usd as None or a placeholder
-                    pg.unrealized_pnl_usd = None # TODO: Calculate based on total position size
-                else:
-                    pg.unrealized_pnl_percent = None
-                    pg.unrealized_pnl_usd = None
-                db.commit()
-
-            # Check for take-profit opportunities
-            open_legs = db.query(models.DCALeg).filter(models.DCALeg.status == "Filled").all()
-            for leg in open_legs:
-                position_group = leg.pyramid.position_group
-                current_price = utils.get_current_price("binance", position_group.pair) # TODO: Get exchange from config
-                if current_price and leg.fill_price:
-                    tp_price = leg.fill_price * (1 + leg.tp_target)
-                    if current_price >= tp_price:
-                        logger.info(f"Take-profit hit for DCALeg {leg.id} at price {current_price}")
-                        # TODO: Placeholder for order placement logic to close the position
-                        leg.status = "Hit TP"
-                        db.commit()
-        finally:
-            db.close()
-        await asyncio.sleep(10) # Check every 10 seconds
+            await asyncio.wait_for(_price_updated.wait(), timeout=SUBSCRIPTION_SYNC_SECONDS)
+            await asyncio.sleep(PRICE_TICK_BATCH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _price_updated.clear()
+
+        try:
+            pairs, _dirty_pairs = _dirty_pairs, set()
+            if not pairs:
+                continue
+            prices = {pair: price_feed.feed.prices.get((exchange_name.lower(), pair)) for pair in pairs}
+
+            cycle_started = time.perf_counter()
+            remote_calls_before = metrics.get("exchange.remote_calls")
+            stats = await asyncio.to_thread(run_in_session, process_price_updates, pairs, prices)
+            metrics.record_cycle(
+                "take_profit",
+                time.perf_counter() - cycle_started,
+                remote_calls=metrics.get("exchange.remote_calls") - remote_calls_before,
+                pairs=len(pairs),
+                legs=len(tp_index.index),
+                **stats,
+            )
+            # Thresholds are only re-checked for owners whose PnL ranking changed
+            if risk_engine.evaluate(risk_engine.book.take_dirty_owners()):
+                _risk_triggered.set()
+        except Exception:
+            logger.exception("Failed to process price updates")
 
 async def run_risk_engine_task():
+    # Runs when an owner's worst loser crosses the loss threshold, at most once per second
     while True:
-        risk_engine.run_risk_engine()
-        await asyncio.sleep(60) # Run every 60 seconds
\ No newline at end of file
+        await _risk_triggered.wait()
+        _risk_triggered.clear()
+        owner_ids = risk_engine.take_triggered_owners()
+        try:
+            # In a worker thread: building the offset plan may load markets from the exchange
+            await asyncio.to_thread(run_in_session, risk_engine.run_risk_engine, owner_ids)
+        except Exception:
+            logger.exception("Risk engine run failed")
+        await asyncio.sleep(RISK_ENGINE_MIN_INTERVAL_SECONDS)
@@ -0,0 +1,76 @@
+import threading
+
+from sortedcontainers import SortedList
+from sqlalchemy.orm import Session
+
+from . import models
+from .logging_config import logger
+
+
+def filled_legs_query(db: Session):
+    return db.query(
+        models.DCALeg.id, models.PositionGroup.pair, models.DCALeg.fill_price, models.DCALeg.tp_target
+    ).join(models.Pyramid, models.DCALeg.pyramid_id == models.Pyramid.id).join(
+        models.PositionGroup, models.Pyramid.position_group_id == models.PositionGroup.id
+    ).filter(
+        models.FILLED_LEG,
+        models.DCALeg.fill_price.isnot(None),
+    )
+
+
+class TakeProfitIndex:
+    # Per-pair sorted TP trigger prices of Filled legs, so a price update only visits crossed legs
+
+    def __init__(self):
+        self._triggers_by_pair = {}
+        self._legs = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._legs)
+
+    def pairs(self):
+        return [pair for pair, triggers in self._triggers_by_pair.items() if triggers]
+
+    def add(self, leg_id: int, pair: str, fill_price: float, tp_target: float | None):
+        trigger_price = fill_price * (1 + (tp_target or 0))
+        with self._lock:
+            self._discard(leg_id)
+            self._triggers_by_pair.setdefault(pair, SortedList()).add((trigger_price, leg_id))
+            self._legs[leg_id] = (pair, trigger_price)
+
+    def remove(self, leg_ids):
+        with self._lock:
+            for leg_id in leg_ids:
+                self._discard(leg_id)
+
+    def crossed(self, pair: str, price: float) -> list[int]:
+        with self._lock:
+            triggers = self._triggers_by_pair.get(pair)
+            if not triggers:
+                return []
+            # Everything up to the first trigger above the price has been crossed
+            end = triggers.bisect_right((price, float("inf")))
+            return [leg_id for _, leg_id in triggers.islice(0, end)]
+
+    def rebuild(self, db: Session):
+        rows = filled_legs_query(db).all()
+        triggers_by_pair = {}
+        legs = {}
+        for leg_id, pair, fill_price, tp_target in rows:
+            trigger_price = fill_price * (1 + (tp_target or 0))
+            triggers_by_pair.setdefault(pair, []).append((trigger_price, leg_id))
+            legs[leg_id] = (pair, trigger_price)
+        with self._lock:
+            self._triggers_by_pair = {pair: SortedList(triggers) for pair, triggers in triggers_by_pair.items()}
+            self._legs = legs
+        logger.info(f"Take-profit index rebuilt with {len(legs)} legs across {len(triggers_by_pair)} pairs")
+
+    def _discard(self, leg_id: int):
+        entry = self._legs.pop(leg_id, None)
+        if entry:
+            pair, trigger_price = entry
+            self._triggers_by_pair[pair].discard((trigger_price, leg_id))
+
+
+index = TakeProfitIndex()
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+from . import config, schemas
+from .logging_config import logger
+
+REDIS_KEY_PREFIX = "ex_engine:user"
+
+
+class UserCache:
+    # Bounded LRU of authenticated users keyed by token subject, optionally shared through Redis.
+    # Entries never outlive the token they were cached for.
+
+    def __init__(self, max_size: int, ttl_seconds: float, redis_url: str | None = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = redis.Redis.from_url(redis_url, decode_responses=True) if redis_url else None
+
+    def get(self, username: str) -> schemas.AuthenticatedUser | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry:
+                user, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(username)
+                    return user
+                del self._entries[username]
+        if self._redis is None:
+            return None
+        try:
+            cached = self._redis.get(f"{REDIS_KEY_PREFIX}:{username}")
+        except redis.RedisError as e:
+            logger.warning(f"User cache lookup in Redis failed: {e}")
+            return None
+        if cached is None:
+            return None
+        entry = json.loads(cached)
+        user = schemas.AuthenticatedUser(**entry["user"])
+        self._store(username, user, min(entry["expires_at"], now + self.ttl_seconds))
+        return user
+
+    def set(self, username: str, user: schemas.AuthenticatedUser, token_expires_at: float | None = None):
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        self._store(username, user, expires_at)
+        if self._redis is not None:
+            ttl_ms = int((expires_at - time.time()) * 1000)
+            if ttl_ms > 0:
+                try:
+                    self._redis.set(
+                        f"{REDIS_KEY_PREFIX}:{username}",
+                        json.dumps({"user": user.model_dump(), "expires_at": expires_at}),
+                        px=ttl_ms,
+                    )
+                except redis.RedisError as e:
+                    logger.warning(f"User cache write to Redis failed: {e}")
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+        if self._redis is not None:
+            try:
+                self._redis.delete(f"{REDIS_KEY_PREFIX}:{username}")
+            except redis.RedisError as e:
+                logger.warning(f"User cache invalidation in Redis failed: {e}")
+
+    def _store(self, username: str, user: schemas.AuthenticatedUser, expires_at: float):
+        with self._lock:
+            self._entries[username] = (user, expires_at)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+cache = UserCache(
+    config.USER_CACHE_SIZE,
+    config.USER_CACHE_TTL_SECONDS,
+    config.REDIS_URL if config.USER_CACHE_REDIS else None,
+)
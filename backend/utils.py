@@ -1,19 +1,13 @@
 import ccxt
 from ccxt.base import errors
 import math
+from concurrent.futures import ThreadPoolExecutor
+
+from . import exchange_registry, metrics
 
 def get_precision_rules(exchange_name: str, symbol: str):
     try:
-        exchange_class = getattr(ccxt, exchange_name.lower())
-        exchange = exchange_class()
-        markets = exchange.load_markets()
-        market = markets.get(symbol)
-        if not market:
-            return None
-        return {
-            "price": market["precision"]["price"],
-            "amount": market["precision"]["amount"],
-        }
+        return exchange_registry.get_precision_rules(exchange_name, symbol)
     except (errors.ExchangeError, errors.BadSymbol):
         return None
 
@@ -26,11 +20,33 @@ def validate_precision(value, precision):
         return len(value_str.split(".")[1]) <= decimal_places
     return True
 
+MAX_CONCURRENT_TICKER_FETCHES = 8
+
 def get_current_price(exchange_name: str, symbol: str) -> float | None:
     try:
-        exchange_class = getattr(ccxt, exchange_name.lower())
-        exchange = exchange_class()
+        exchange = exchange_registry.get_client(exchange_name)
+        metrics.increment("exchange.remote_calls")
         ticker = exchange.fetch_ticker(symbol)
         return ticker["last"]
     except (errors.ExchangeError, errors.BadSymbol):
-        return None
\ No newline at end of file
+        return None
+
+def get_current_prices(exchange_name: str, symbols) -> dict[str, float]:
+    requested = set(symbols)
+    symbols = sorted(requested)
+    if not symbols:
+        return {}
+    exchange = exchange_registry.get_client(exchange_name)
+    if exchange.has.get("fetchTickers"):
+        try:
+            metrics.increment("exchange.remote_calls")
+            tickers = exchange.fetch_tickers(symbols)
+            return {symbol: ticker["last"] for symbol, ticker in tickers.items() if symbol in requested and ticker.get("last")}
+        except errors.BadSymbol:
+            # One unknown symbol fails the whole batch, fall back to per-symbol fetches
+            pass
+        except errors.ExchangeError:
+            return {}
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_TICKER_FETCHES, len(symbols))) as pool:
+        prices = pool.map(lambda symbol: get_current_price(exchange_name, symbol), symbols)
+        return {symbol: price for symbol, price in zip(symbols, prices) if price}
@@ -0,0 +1,55 @@
+import { useEffect, useRef } from 'react';
+
+export interface EngineEvent {
+  topic: string;
+  key?: number;
+  data?: any;
+}
+
+const RECONNECT_DELAY_MS = 2000;
+
+// Subscribes to the engine's WebSocket push channel. Events arrive in batches; a "resync"
+// event (and every reconnect) means updates may have been missed and the page should reload.
+const useEventStream = (topics: string[], onEvents: (events: EngineEvent[]) => void) => {
+  const handler = useRef(onEvents);
+  handler.current = onEvents;
+  const topicList = topics.join(',');
+
+  useEffect(() => {
+    let socket: WebSocket | null = null;
+    let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+    let closed = false;
+
+    const connect = () => {
+      const token = localStorage.getItem('access_token');
+      if (!token) {
+        return;
+      }
+      const params = new URLSearchParams({ token, topics: topicList });
+      socket = new WebSocket(`ws://localhost:8001/ws/events/?${params.toString()}`);
+      socket.onopen = () => handler.current([{ topic: 'resync' }]);
+      socket.onmessage = (message) => {
+        const { events } = JSON.parse(message.data);
+        if (events.length > 0) {
+          handler.current(events);
+        }
+      };
+      socket.onclose = () => {
+        if (!closed) {
+          reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      if (reconnectTimer) {
+        clearTimeout(reconnectTimer);
+      }
+      socket?.close();
+    };
+  }, [topicList]);
+};
+
+export default useEventStream;
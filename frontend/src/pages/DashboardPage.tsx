@@ -33,6 +33,7 @@ import {
 } from '@mui/material';
 import { Link } from 'react-router-dom';
 import EditIcon from '@mui/icons-material/Edit';
+import useEventStream, { type EngineEvent } from '../hooks/useEventStream';
 import DeleteIcon from '@mui/icons-material/Delete';
 
 interface ApiKey {
@@ -169,15 +170,20 @@ const DashboardPage: React.FC = () => {
       fetchApiKeys();
       fetchWebhookLogs();
       fetchDashboardMetrics();
-
-      const metricsInterval = setInterval(fetchDashboardMetrics, 5000); // Refresh every 5 seconds
-
-      return () => {
-        clearInterval(metricsInterval);
-      };
     }
   }, [localStorage.getItem('access_token'), webhookPage, webhookRowsPerPage]);
 
+  // Metrics and webhook logs are re-read when the engine reports a change instead of on a timer
+  useEventStream(['dashboard', 'risk', 'webhook_log'], (events: EngineEvent[]) => {
+    const topics = new Set(events.map((event) => event.topic));
+    if (topics.has('resync') || topics.has('dashboard') || topics.has('risk')) {
+      fetchDashboardMetrics();
+    }
+    if (topics.has('resync') || topics.has('webhook_log')) {
+      fetchWebhookLogs();
+    }
+  });
+
   const onAddSubmit = async (data: any) => {
     setServerError('');
     try {
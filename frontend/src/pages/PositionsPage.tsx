@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import {
   Container,
@@ -13,9 +13,15 @@ import {
   Paper,
   Collapse,
   IconButton,
+  Button,
+  FormControl,
+  InputLabel,
+  MenuItem,
+  Select,
 } from '@mui/material';
 import KeyboardArrowDownIcon from '@mui/icons-material/KeyboardArrowDown';
 import KeyboardArrowUpIcon from '@mui/icons-material/KeyboardArrowUp';
+import useEventStream, { type EngineEvent } from '../hooks/useEventStream';
 
 interface DCALeg {
   id: number;
@@ -41,13 +47,49 @@ interface PositionGroup {
   unrealized_pnl_percent: number | null;
   unrealized_pnl_usd: number | null;
   tp_mode: string;
-  pyramids: Pyramid[];
   pyramids_count: number;
   dca_legs_count: number;
 }
 
-const Row: React.FC<{ row: PositionGroup }> = ({ row }) => {
+interface PositionGroupPage {
+  position_groups: PositionGroup[];
+  next_cursor: string | null;
+}
+
+const STATUS_FILTERS: Record<string, string[]> = {
+  Live: ['Live'],
+  Closed: ['Closed'],
+  All: [],
+};
+
+const Row: React.FC<{ row: PositionGroup; legRevision: number }> = ({ row, legRevision }) => {
   const [open, setOpen] = useState(false);
+  const [pyramids, setPyramids] = useState<Pyramid[] | null>(null);
+
+  const fetchPyramids = async () => {
+    try {
+      const token = localStorage.getItem('access_token');
+      const response = await axios.get(`http://localhost:8001/position-groups/${row.id}/pyramids/`, {
+        headers: {
+          Authorization: `Bearer ${token}`,
+        },
+      });
+      setPyramids(response.data);
+    } catch (err) {
+      console.error('Failed to fetch pyramids:', err);
+    }
+  };
+
+  // Legs are only fetched when a row is expanded, and again when one of them changes
+  useEffect(() => {
+    if (open) {
+      fetchPyramids();
+    } else {
+      setPyramids(null);
+    }
+  }, [open, legRevision]);
+
+  const toggle = () => setOpen(!open);
 
   const pnlColor = row.unrealized_pnl_percent !== null
     ? (row.unrealized_pnl_percent >= 0 ? 'green' : 'red')
@@ -60,7 +102,7 @@ const Row: React.FC<{ row: PositionGroup }> = ({ row }) => {
           <IconButton
             aria-label="expand row"
             size="small"
-            onClick={() => setOpen(!open)}
+            onClick={toggle}
           >
             {open ? <KeyboardArrowUpIcon /> : <KeyboardArrowDownIcon />}
           </IconButton>
@@ -86,7 +128,8 @@ const Row: React.FC<{ row: PositionGroup }> = ({ row }) => {
               <Typography variant="h6" gutterBottom component="div">
                 Pyramids
               </Typography>
-              {row.pyramids.map((pyramid) => (
+              {pyramids === null && <Typography>Loading...</Typography>}
+              {(pyramids || []).map((pyramid) => (
                 <Box key={pyramid.id} sx={{ mb: 2 }}>
                   <Typography variant="subtitle1">Pyramid #{pyramid.id} (Entry: {pyramid.entry_price})</Typography>
                   <Table size="small" aria-label="dca legs">
@@ -125,32 +168,121 @@ const Row: React.FC<{ row: PositionGroup }> = ({ row }) => {
 
 const PositionsPage: React.FC = () => {
   const [positionGroups, setPositionGroups] = useState<PositionGroup[]>([]);
+  const [olderGroups, setOlderGroups] = useState<PositionGroup[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [statusFilter, setStatusFilter] = useState('Live');
+  const [legRevisions, setLegRevisions] = useState<Record<number, number>>({});
+  // Once older pages are loaded the cursor belongs to them, not to the refreshed first page
+  const pagingStarted = useRef(false);
 
-  useEffect(() => {
-    const fetchPositionGroups = async () => {
-      try {
-        const token = localStorage.getItem('access_token');
-        const response = await axios.get('http://localhost:8001/position-groups/', {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
-        });
-        setPositionGroups(response.data);
-      } catch (err) {
-        console.error('Failed to fetch position groups:', err);
+  const fetchPage = async (cursor: string | null): Promise<PositionGroupPage> => {
+    const token = localStorage.getItem('access_token');
+    const params = new URLSearchParams({ summary: 'true' });
+    STATUS_FILTERS[statusFilter].forEach((status) => params.append('status', status));
+    if (cursor) {
+      params.append('cursor', cursor);
+    }
+    const response = await axios.get(`http://localhost:8001/position-groups/?${params.toString()}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+    return response.data;
+  };
+
+  // Only the newest page is reloaded; older pages are loaded on request
+  const fetchPositionGroups = async () => {
+    try {
+      const page = await fetchPage(null);
+      setPositionGroups(page.position_groups);
+      if (!pagingStarted.current) {
+        setNextCursor(page.next_cursor);
       }
-    };
+    } catch (err) {
+      console.error('Failed to fetch position groups:', err);
+    }
+  };
 
+  useEffect(() => {
+    pagingStarted.current = false;
+    setOlderGroups([]);
+    setNextCursor(null);
     fetchPositionGroups();
-    const interval = setInterval(fetchPositionGroups, 5000);
-    return () => clearInterval(interval);
-  }, []);
+  }, [statusFilter]);
+
+  const shownIds = new Set(positionGroups.map((row) => row.id));
+  const rows = [...positionGroups, ...olderGroups.filter((row) => !shownIds.has(row.id))];
+
+  // Pushed diffs are merged into the rows on screen; a group that is new or moved out of the
+  // selected status reloads the first page
+  useEventStream(['position', 'leg'], (events: EngineEvent[]) => {
+    const changes: Record<number, Partial<PositionGroup>> = {};
+    const legGroups = new Set<number>();
+    let reload = false;
+    events.forEach((event) => {
+      if (event.topic === 'resync') {
+        reload = true;
+      } else if (event.topic === 'position') {
+        changes[event.data.id] = { ...changes[event.data.id], ...event.data };
+        const wanted = STATUS_FILTERS[statusFilter];
+        if (event.data.status && wanted.length > 0 && !wanted.includes(event.data.status)) {
+          reload = true;
+        }
+      } else if (event.topic === 'leg') {
+        legGroups.add(event.data.position_group_id);
+      }
+    });
+    const known = new Set(rows.map((row) => row.id));
+    // PnL-only diffs for groups beyond the loaded pages are ignored; new groups carry a status
+    if (Object.keys(changes).some((id) => !known.has(Number(id)) && changes[Number(id)].status)) {
+      reload = true;
+    }
+    const merge = (groups: PositionGroup[]) => groups.map((row) => (changes[row.id] ? { ...row, ...changes[row.id] } : row));
+    setPositionGroups(merge);
+    setOlderGroups(merge);
+    if (legGroups.size > 0) {
+      setLegRevisions((current) => {
+        const next = { ...current };
+        legGroups.forEach((id) => {
+          next[id] = (next[id] || 0) + 1;
+        });
+        return next;
+      });
+    }
+    if (reload) {
+      fetchPositionGroups();
+    }
+  });
+
+  const loadMore = async () => {
+    try {
+      pagingStarted.current = true;
+      const page = await fetchPage(nextCursor);
+      setOlderGroups([...olderGroups, ...page.position_groups]);
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      console.error('Failed to fetch position groups:', err);
+    }
+  };
 
   return (
     <Container component="main" maxWidth="lg" sx={{ mt: 4, mb: 4 }}>
       <Typography component="h1" variant="h4" gutterBottom>
         Positions
       </Typography>
+      <FormControl size="small" sx={{ mb: 2, minWidth: 160 }}>
+        <InputLabel id="status-filter-label">Status</InputLabel>
+        <Select
+          labelId="status-filter-label"
+          value={statusFilter}
+          label="Status"
+          onChange={(e) => setStatusFilter(e.target.value)}
+        >
+          {Object.keys(STATUS_FILTERS).map((status) => (
+            <MenuItem key={status} value={status}>{status}</MenuItem>
+          ))}
+        </Select>
+      </FormControl>
       <TableContainer component={Paper}>
         <Table aria-label="collapsible table">
           <TableHead>
@@ -167,12 +299,17 @@ const PositionsPage: React.FC = () => {
             </TableRow>
           </TableHead>
           <TableBody>
-            {positionGroups.map((row) => (
-              <Row key={row.id} row={row} />
+            {rows.map((row) => (
+              <Row key={row.id} row={row} legRevision={legRevisions[row.id] || 0} />
             ))}
           </TableBody>
         </Table>
       </TableContainer>
+      {nextCursor && (
+        <Box sx={{ mt: 2, textAlign: 'center' }}>
+          <Button onClick={loadMore}>Load more</Button>
+        </Box>
+      )}
     </Container>
   );
 };
@@ -33,6 +33,7 @@ interface Config {
     max_open_groups: number;
   };
   grid_strategy: {
+    capital?: number;
     dca_config: Array<{
       price_gap: number;
       capital_weight: number;
@@ -237,6 +238,13 @@ const SettingsPage: React.FC = () => {
           <Grid item xs={12}>
             <Paper sx={{ p: 3 }}>
               <Typography variant="h6" gutterBottom>Grid Strategy - DCA Configuration</Typography>
+              <Controller
+                name="grid_strategy.capital"
+                control={control}
+                render={({ field }) => (
+                  <TextField {...field} type="number" fullWidth label="Capital per Position Group (USD)" margin="normal" />
+                )}
+              />
               <Grid container spacing={2}>
                 {config.grid_strategy.dca_config.map((dca, index) => (
                   <Grid item xs={12} sm={6} md={4} lg={2.4} key={index}>